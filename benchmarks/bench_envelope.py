@@ -0,0 +1,69 @@
+"""
+Envelope benchmark
+
+Compares the time of es.analysis.Envelope with calculating each window of the envelope with a Python list
+comprehension over the audio data normalized to float64 (how envelopes were calculated before they were vectorized),
+and checks that the envelopes are identical.
+
+Usage:
+    python benchmarks/bench_envelope.py [--length 3600] [--sample-rate 48000]
+"""
+
+import argparse
+import time
+
+import estimpy as es
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks calculating envelopes of audio')
+    parser.add_argument('-l', '--length', type=float, default=3600, help='The length of the audio (in seconds, '
+                                                                         'default: %(default)s)')
+    parser.add_argument('-r', '--sample-rate', type=int, default=48000, help='The sample rate of the audio (default: '
+                                                                             '%(default)s)')
+    args = parser.parse_args()
+
+    # Time the calculation rather than loading cached envelopes
+    es.cfg['cache.enabled'] = False
+
+    window_size = es.cfg['analysis.window-size']
+    step_size = es.cfg['analysis.window-overlap']
+
+    rng = np.random.default_rng(0)
+    audio_data = rng.integers(-2 ** 15, 2 ** 15, (2, round(args.length * args.sample_rate)), dtype=np.int16)
+    es_audio = es.audio.Audio(audio_data=audio_data, sample_rate=args.sample_rate, bit_depth=16)
+
+    for mode in [es.analysis.EnvelopeModes.PEAK, es.analysis.EnvelopeModes.RMS]:
+        time_start = time.perf_counter()
+        baseline_envelope_data = get_envelope_data(es_audio=es_audio, mode=mode, window_size=window_size,
+                                                   step_size=step_size)
+        baseline_time = time.perf_counter() - time_start
+
+        time_start = time.perf_counter()
+        envelope_data = es.analysis.Envelope(es_audio=es_audio, mode=mode, window_size=window_size,
+                                             step_size=step_size).envelope_data
+        envelope_time = time.perf_counter() - time_start
+
+        print(f'{mode} ({args.length:g} s stereo at {args.sample_rate} Hz): list comprehension {baseline_time:.2f} s, '
+              f'Envelope {envelope_time:.3f} s, speedup {baseline_time / envelope_time:.0f}x')
+
+        assert np.array_equal(envelope_data, baseline_envelope_data), f'The {mode} envelopes are not identical'
+
+
+def get_envelope_data(es_audio: es.audio.Audio, mode: es.analysis.EnvelopeModes, window_size: int,
+                      step_size: int) -> np.ndarray:
+    """Calculates an envelope one window at a time (the baseline)"""
+    audio_data = np.divide(es_audio.data_raw, 2 ** (es_audio.bit_depth - 1))
+    audio_data = np.abs(audio_data) if mode == es.analysis.EnvelopeModes.PEAK else np.square(audio_data)
+
+    def window_function(window: np.ndarray):
+        return np.max(window) if mode == es.analysis.EnvelopeModes.PEAK else np.sqrt(np.mean(window))
+
+    return np.array([[window_function(audio_data[j, i:i + window_size])
+                      for i in range(0, es_audio.sample_count, step_size)]
+                     for j in range(es_audio.channels)])
+
+
+if __name__ == '__main__':
+    main()
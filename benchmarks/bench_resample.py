@@ -0,0 +1,81 @@
+"""
+Resampling benchmark
+
+Compares the time and peak memory of es.audio.resample_audio_data() with resampling the whole audio in one
+scipy.signal.resample_poly() call using the ratio of the least common multiple of the sample rates (how audio was
+resampled before the multi-stage, chunked resampler).
+
+Usage:
+    python benchmarks/bench_resample.py [--length 600] [--rates 44100:9000 44100:8999]
+"""
+
+import argparse
+import math
+import time
+import tracemalloc
+
+import estimpy as es
+import numpy as np
+import scipy
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks resampling audio')
+    parser.add_argument('-l', '--length', type=float, default=600, help='The length of the audio (in seconds, '
+                                                                        'default: %(default)s)')
+    parser.add_argument('-r', '--rates', nargs='+', default=['44100:9000', '44100:8999', '44100:4000', '48000:16000'],
+                        help='The sample rates to resample from and to (default: %(default)s)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    for rates in args.rates:
+        sample_rate, new_sample_rate = (int(rate) for rate in rates.split(':'))
+        audio_data = rng.uniform(-1, 1, (2, round(args.length * sample_rate))).astype(np.float32)
+
+        # Import any modules and design any cached filters before they are timed
+        for function in (resample_poly, es.audio.resample_audio_data):
+            function(audio_data[:, :sample_rate], sample_rate, new_sample_rate)
+
+        baseline_data, baseline_time, baseline_memory = measure(resample_poly, audio_data, sample_rate,
+                                                                new_sample_rate)
+        data, resample_time, resample_memory = measure(es.audio.resample_audio_data, audio_data, sample_rate,
+                                                       new_sample_rate)
+
+        # The resamplers use different filters, so compare the signals rather than expecting identical samples
+        sample_count = min(baseline_data.shape[1], data.shape[1])
+        difference = np.sqrt(np.mean(np.square(baseline_data[:, :sample_count] - data[:, :sample_count]))) / \
+            np.sqrt(np.mean(np.square(baseline_data[:, :sample_count])))
+
+        print(f'{sample_rate} Hz -> {new_sample_rate} Hz ({args.length:g} s stereo): '
+              f'resample_poly {baseline_time:.2f} s ({baseline_memory:.0f} MB), '
+              f'resample_audio_data {resample_time:.2f} s ({resample_memory:.0f} MB), '
+              f'speedup {baseline_time / resample_time:.1f}x, relative RMS difference {difference:.2e}')
+
+
+def measure(function, *args) -> tuple:
+    """
+    :return tuple: The result of the function, the time it took (in seconds), and the peak memory it allocated (in
+                   megabytes)
+    """
+    tracemalloc.start()
+    time_start = time.perf_counter()
+
+    result = function(*args)
+
+    duration = time.perf_counter() - time_start
+    _, memory_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, duration, memory_peak / 2 ** 20
+
+
+def resample_poly(audio_data: np.ndarray, sample_rate: int, new_sample_rate: int) -> np.ndarray:
+    """Resamples audio data in a single polyphase stage (the baseline)"""
+    lcm = math.lcm(sample_rate, new_sample_rate)
+
+    return scipy.signal.resample_poly(audio_data, up=lcm // sample_rate, down=lcm // new_sample_rate, axis=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Video rendering benchmark
+
+Measures the frames per second at which frames of a video of synthetic audio are rendered with the matplotlib renderer
+(VideoVisualization.draw_frame(), or make_frame() and drawing the figure in earlier versions) and the NumPy renderer
+(VideoVisualization.composite_frame()).
+Optionally also measures the matplotlib renderer of another version of estimpy (e.g. the version before the artists of
+the frames were reused), and prints the speedup of each renderer over it.
+
+Usage:
+    python benchmarks/bench_video.py [--size 1920x1080] [--frames 100] [--baseline PATH]
+
+    To measure an earlier version, check it out into another directory, e.g.:
+    git worktree add ../estimpy-baseline <revision>
+    python benchmarks/bench_video.py --baseline ../estimpy-baseline
+
+    The figures are made with the default backend of estimpy (as earlier versions require), so set
+    QT_QPA_PLATFORM=offscreen if there is no display.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import estimpy as es
+import matplotlib.pyplot
+import numpy as np
+
+# Sample rate and length (in seconds) of the synthetic audio
+_SAMPLE_RATE = 44100
+_LENGTH = 60
+
+# Frame rate of the video
+_FPS = 30
+
+# The DPI at which videos are exported (see es.export)
+_DPI = 8
+
+_RENDERERS = ['matplotlib', 'numpy']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks rendering the frames of videos')
+    parser.add_argument('-s', '--size', default='1920x1080', help='The size of the frames (default: %(default)s)')
+    parser.add_argument('-f', '--frames', type=int, default=100, help='The number of frames to render (default: '
+                                                                      '%(default)s)')
+    parser.add_argument('-b', '--baseline', help='The path of another version of estimpy to compare with')
+    parser.add_argument('--renderer', choices=_RENDERERS, help='Only measure a single renderer and print its frames '
+                                                               'per second (used to measure the baseline)')
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.split('x'))
+
+    if args.renderer is not None:
+        print(get_fps(renderer=args.renderer, width=width, height=height, frame_count=args.frames))
+        return
+
+    baseline_fps = None
+
+    if args.baseline is not None:
+        # Measure the baseline in a separate process which imports estimpy from its path
+        environment = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            [os.path.abspath(args.baseline), *filter(None, [os.environ.get('PYTHONPATH')])]))
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--size', args.size, '--frames',
+                                 str(args.frames), '--renderer', 'matplotlib'],
+                                env=environment, stdout=subprocess.PIPE, text=True, check=True)
+        baseline_fps = float(result.stdout.strip().splitlines()[-1])
+
+        print(f'Baseline matplotlib renderer: {baseline_fps:.1f} fps')
+
+    for renderer in _RENDERERS:
+        fps = get_fps(renderer=renderer, width=width, height=height, frame_count=args.frames)
+
+        print(f'{renderer} renderer: {fps:.1f} fps' +
+              (f' (speedup {fps / baseline_fps:.1f}x)' if baseline_fps is not None else ''))
+
+
+def get_audio() -> es.audio.Audio:
+    """
+    :return es.audio.Audio: Stereo 16-bit audio of noise and tones with amplitudes which change over time
+    """
+    rng = np.random.default_rng(0)
+    times = np.arange(_SAMPLE_RATE * _LENGTH) / _SAMPLE_RATE
+
+    amplitudes = np.stack([0.5 + 0.4 * np.sin(2 * np.pi * times / 7), 0.5 + 0.4 * np.cos(2 * np.pi * times / 3)])
+    audio_data = amplitudes * (0.5 * np.sin(2 * np.pi * np.array([[440], [1000]]) * times) +
+                               0.3 * rng.uniform(-1, 1, amplitudes.shape))
+
+    return es.audio.Audio(audio_data=np.round(audio_data * 32767).astype(np.int16), sample_rate=_SAMPLE_RATE,
+                          bit_depth=16)
+
+
+def get_fps(renderer: str, width: int, height: int, frame_count: int) -> float:
+    """
+    :param str renderer: The renderer (matplotlib or numpy)
+    :param int width: The width of the frames
+    :param int height: The height of the frames
+    :param int frame_count: The number of frames to render
+    :return float: The number of frames rendered per second
+    """
+    visualization = es.visualization.VideoVisualization(es_audio=get_audio(), fps=_FPS)
+    visualization.make_figure()
+    visualization.resize_figure(width=width, height=height, dpi=_DPI)
+    figure = matplotlib.pyplot.gcf()
+
+    def render_frame(frame: int) -> None:
+        if renderer == 'numpy':
+            visualization.composite_frame(frame)
+        elif hasattr(visualization, 'draw_frame'):
+            visualization.draw_frame(frame)
+        else:
+            # Earlier versions drew the whole figure for each frame
+            visualization.make_frame(frame)
+            figure.canvas.draw()
+
+    # Consecutive frames from the middle of the video, after a first frame which analyzes the audio (and for the
+    # NumPy renderer, draws the layers of the figure which don't change)
+    frame_start = (len(visualization.frames) - frame_count) // 2
+    render_frame(frame_start - 1)
+
+    time_start = time.perf_counter()
+
+    for frame in range(frame_start, frame_start + frame_count):
+        render_frame(frame)
+
+    return frame_count / (time.perf_counter() - time_start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Video renderer parity check
+
+Renders frames of a video of synthetic audio by drawing the whole figure with matplotlib, and with the matplotlib
+renderer (VideoVisualization.draw_frame()) and the NumPy renderer (VideoVisualization.composite_frame()), and checks
+that the pixels of the frames of each renderer only differ from the drawn figure by a small tolerance.
+
+Usage:
+    python benchmarks/check_video_renderers.py [--size 1920x1080] [--frames 10]
+"""
+
+import argparse
+import sys
+
+import estimpy as es
+import matplotlib
+import matplotlib.pyplot
+import numpy as np
+
+# Sample rate and length (in seconds) of the synthetic audio
+_SAMPLE_RATE = 44100
+_LENGTH = 30
+
+# Maximum difference of any color channel of any pixel (from 0 to 255). The renderers only differ at the antialiased
+# edges of the amplitude envelopes.
+_PIXEL_DIFFERENCE_MAX = 40
+
+# Maximum mean difference of the color channels of the pixels
+_PIXEL_DIFFERENCE_MEAN_MAX = 0.1
+
+# The DPI at which videos are exported (see es.export)
+_DPI = 8
+
+
+_RENDERERS = ['matplotlib', 'numpy']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks that the video renderers match drawing the whole figure')
+    parser.add_argument('-s', '--size', default='1920x1080', help='The size of the frames (default: %(default)s)')
+    parser.add_argument('-f', '--frames', type=int, default=10, help='The number of frames to check (default: '
+                                                                     '%(default)s)')
+    args = parser.parse_args()
+
+    # Draw the frames without displaying them
+    matplotlib.use('Agg')
+
+    width, height = (int(value) for value in args.size.split('x'))
+    fps = es.cfg['visualization.video.export.fps']
+
+    visualization = es.visualization.VideoVisualization(es_audio=get_audio(), fps=fps)
+    visualization.make_figure()
+    visualization.resize_figure(width=width, height=height, dpi=_DPI)
+    figure = matplotlib.pyplot.gcf()
+
+    difference_max = {renderer: 0 for renderer in _RENDERERS}
+    difference_means = {renderer: [] for renderer in _RENDERERS}
+
+    # Frames spread across the audio, with the start and end of the envelopes in the window of the first and last
+    for frame in np.linspace(0, len(visualization.frames) - 1, args.frames).astype(int):
+        rendered_pixels = {'numpy': visualization.composite_frame(frame).astype(int),
+                           'matplotlib': visualization.draw_frame(frame).astype(int)}
+
+        # The matplotlib renderer excludes the artists which change with each frame from the drawn figure, so they are
+        # included again to draw the whole figure, and excluded again afterward so the cached background is reused
+        animated_artists = visualization._get_animated_artists()
+        for artist in animated_artists:
+            artist.set_animated(False)
+
+        visualization.make_frame(frame)
+        figure.canvas.draw()
+        drawn_pixels = np.asarray(figure.canvas.buffer_rgba())[:, :, :3].astype(int)
+
+        for artist in animated_artists:
+            artist.set_animated(True)
+
+        for renderer in _RENDERERS:
+            differences = np.abs(rendered_pixels[renderer] - drawn_pixels)
+            difference_max[renderer] = max(difference_max[renderer], differences.max())
+            difference_means[renderer].append(differences.mean())
+
+            print(f'Frame {frame} ({renderer} renderer): max difference {differences.max()}, mean difference '
+                  f'{differences.mean():.4f}')
+
+    passed = True
+
+    for renderer in _RENDERERS:
+        renderer_passed = difference_max[renderer] <= _PIXEL_DIFFERENCE_MAX and \
+            max(difference_means[renderer]) <= _PIXEL_DIFFERENCE_MEAN_MAX
+        passed = passed and renderer_passed
+
+        print(f'{renderer} renderer: max difference {difference_max[renderer]} (tolerance {_PIXEL_DIFFERENCE_MAX}), '
+              f'max mean difference {max(difference_means[renderer]):.4f} (tolerance {_PIXEL_DIFFERENCE_MEAN_MAX}): '
+              f'{"passed" if renderer_passed else "failed"}')
+
+    sys.exit(0 if passed else 1)
+
+
+def get_audio() -> es.audio.Audio:
+    """
+    :return es.audio.Audio: Stereo 16-bit audio of noise and tones with amplitudes which change over time, with a
+                            silent gap
+    """
+    rng = np.random.default_rng(0)
+    times = np.arange(_SAMPLE_RATE * _LENGTH) / _SAMPLE_RATE
+
+    amplitudes = np.stack([0.5 + 0.4 * np.sin(2 * np.pi * times / 7), 0.5 + 0.4 * np.cos(2 * np.pi * times / 3)])
+    amplitudes[:, (times > 12) & (times < 14)] = 0
+
+    audio_data = amplitudes * (0.5 * np.sin(2 * np.pi * np.array([[440], [1000]]) * times) +
+                               0.3 * rng.uniform(-1, 1, amplitudes.shape))
+
+    return es.audio.Audio(audio_data=np.round(audio_data * 32767).astype(np.int16), sample_rate=_SAMPLE_RATE,
+                          bit_depth=16)
+
+
+if __name__ == '__main__':
+    main()
@@ -181,6 +181,6 @@ _check_dependencies()
 
 load_config('default')
 
-from . import utils, metadata, audio, analysis, player, visualization, export
+from . import utils, metadata, audio, cache, analysis, player, visualization, export
 
 trigger_event('config.updated')
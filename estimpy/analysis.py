@@ -1,32 +1,82 @@
 """A module for analysis of audio data"""
+import concurrent.futures
+import contextlib
+import copy
 import enum
 import math
+import mmap
+import multiprocessing
+import multiprocessing.shared_memory
+import os
+import tempfile
 import typing
+import weakref
 
 import estimpy as es
 import numpy as np
 import scipy
 
+# Number of samples of each channel to reduce at a time when calculating envelopes (small enough for the samples and
+# any temporary arrays to stay in the CPU cache)
+_ENVELOPE_CHUNK_SIZE = 65536
+
+# Minimum size of the blocks into which audio data is split to calculate envelopes (if the greatest common divisor of
+# the window size and step size is smaller, the windows are reduced directly since tiny blocks are slow and use a lot
+# of memory)
+_ENVELOPE_BLOCK_SIZE_MIN = 16
+
+# Number of frames of each channel to transform at a time when generating spectrograms (limits the size of the
+# temporary arrays of the segments and their transforms)
+_SPECTROGRAM_BLOCK_FRAMES = 256
+
+# Fraction of analysis.spectrogram.memory-max to use for each tile of memory mapped spectrograms when they are
+# calculated or read
+_SPECTROGRAM_TILE_MEMORY_FRACTION = 0.25
+
+# Minimum number of samples of audio (of all channels) to analyze in worker processes (starting the processes takes
+# longer than analyzing shorter audio)
+_ANALYSIS_PROCESSES_SAMPLES_MIN = 2 ** 26
+
+# Maximum number of frames of each channel from which to autoscale the maximum frequency of spectrograms (frames are
+# evenly subsampled from longer audio)
+_FREQUENCY_MAX_FRAMES = 8192
+
+
+class AnalysisStages(enum.StrEnum):
+    ENVELOPES = 'envelopes'
+    ENVELOPE_PYRAMID = 'envelope_pyramid'
+    SPECTROGRAM = 'spectrogram'
+
 
 class EnvelopeModes(enum.StrEnum):
+    MAX = 'max'
+    MEAN = 'mean'
+    MIN = 'min'
     PEAK = 'peak'
     RMS = 'rms'
 
 
 class Envelope:
     def __init__(self, es_audio: es.audio.Audio, mode: EnvelopeModes = EnvelopeModes.PEAK,
-                 start: int = 0, end: int = None, padding: int = 0, window_size: int = None, step_size: int = None):
+                 start: int = 0, end: int = None, padding: int = 0, window_size: int = None, step_size: int = None,
+                 envelope_data: np.ndarray = None):
+        """
+        :param es.audio.Audio es_audio:
+        :param EnvelopeModes mode:
+        :param int start: The first sample of the envelope
+        :param int end: The sample at which to end the envelope. If not specified, uses the end of the audio.
+        :param int padding: The number of zero values to add before and after the envelope
+        :param int window_size: The number of samples in each window. If not specified, uses analysis.window-size.
+        :param int step_size: The number of samples between the start of each window. If not specified, uses
+                              analysis.window-overlap.
+        :param np.ndarray envelope_data: The envelope values of the windows (without padding) if they have already been
+                                         calculated (see envelopes()). If not specified, they are calculated from the
+                                         audio.
+        """
         self._mode = mode
         self._envelope_data = None
         self._times = None
 
-        audio_data = es_audio.data
-
-        if mode == EnvelopeModes.PEAK:
-            audio_data = np.abs(audio_data)
-        elif mode == EnvelopeModes.RMS:
-            audio_data = np.square(audio_data)
-
         if end is None:
             end = es_audio.sample_count
 
@@ -39,17 +89,26 @@ class Envelope:
         if start > es_audio.sample_count or end > es_audio.sample_count:
             raise Exception('Invalid start or end time for envelope.')
 
-        def window_function(window: np.ndarray):
-            if mode == EnvelopeModes.PEAK:
-                return np.max(window)
-            elif mode == EnvelopeModes.RMS:
-                return np.sqrt(np.mean(window))
-            else:
-                return 0
+        cache_key = es.cache.get_analysis_key(es_audio, 'envelope', mode=mode, start=start, end=end, padding=padding,
+                                              window_size=window_size, step_size=step_size)
+        cached_envelope = es.cache.load(cache_key) if envelope_data is None else None
+
+        if cached_envelope is not None:
+            cached_arrays, _ = cached_envelope
+            self._envelope_data = cached_arrays['envelope_data']
+            self._times = cached_arrays['times']
+            return
+
+        if envelope_data is None:
+            # Only read the samples covered by the windows (the last window may extend past the end)
+            audio_data = es_audio.data_raw[:, start:min(end + window_size, es_audio.sample_count)]
 
-        self._envelope_data = np.array([[window_function(audio_data[j, i:i + window_size])
-                                         for i in range(start, end, step_size)]
-                                        for j in range(es_audio.channels)])
+            envelope_data = self._get_envelopes_data(audio_data=audio_data, modes=[mode], window_size=window_size,
+                                                     step_size=step_size,
+                                                     window_count=len(range(0, end - start, step_size)),
+                                                     scale=2 ** (es_audio.bit_depth - 1))[mode]
+
+        self._envelope_data = envelope_data
 
         envelope_samples = self._envelope_data.size if es_audio.channels == 1 else self._envelope_data.shape[1]
 
@@ -61,6 +120,8 @@ class Envelope:
         if padding > 0:
             self._envelope_data = Envelope.pad_envelope_data(self._envelope_data, np.zeros(padding))
 
+        es.cache.save(cache_key, {'envelope_data': self._envelope_data, 'times': self._times})
+
     @property
     def envelope_data(self) -> np.ndarray:
         return self._envelope_data
@@ -81,58 +142,402 @@ class Envelope:
             padding_data = np.tile(padding_data, (envelope_data.shape[0], 1))
             return np.concatenate((padding_data, envelope_data, padding_data), axis=1)
 
+    @classmethod
+    def _get_envelopes_data(cls, audio_data: np.ndarray, modes: typing.Iterable[EnvelopeModes], window_size: int,
+                            step_size: int, window_count: int, scale: float = 1,
+                            dtype: np.dtype = np.float64) -> typing.Dict[EnvelopeModes, np.ndarray]:
+        """Calculates envelopes of each channel of audio data for windows starting every step_size samples.
+        The audio data is split into blocks whose size is the greatest common divisor of window_size and step_size,
+        so each sample is only read once for all envelopes and each window combines the reductions of its blocks. If
+        the greatest common divisor is small (see _ENVELOPE_BLOCK_SIZE_MIN), each window is reduced directly instead.
+        The blocks are reduced in the domain of the audio data (e.g. integers for Audio.data_raw), and only the
+        values of the blocks are scaled, so the audio data is never normalized.
+        :param np.ndarray audio_data: A 2-dimensional array of audio samples with channels as rows
+        :param typing.Iterable[EnvelopeModes] modes: The envelopes to calculate
+        :param int window_size: The number of samples in each window
+        :param int step_size: The number of samples between the start of each window
+        :param int window_count: The number of windows
+        :param float scale: The value by which to divide the audio samples to normalize them
+        :param np.dtype dtype: The data type of the envelopes. float64 envelopes are identical to reducing each window
+                               of the audio data normalized to float64.
+        :return typing.Dict[EnvelopeModes, np.ndarray]: A 2-dimensional array of envelope values with channels as rows
+                                                       for each mode
+        """
+        channels, sample_count = audio_data.shape
+        dtype = np.dtype(dtype)
+
+        # Windows which extend past the end of the audio data are truncated and are calculated separately
+        full_window_count = min(window_count, max(0, (sample_count - window_size) // step_size + 1))
+
+        block_size = math.gcd(window_size, step_size)
+
+        # If the blocks would be tiny, each window is reduced directly as a single block (the blocks then overlap)
+        if block_size < _ENVELOPE_BLOCK_SIZE_MIN:
+            block_size, block_step = window_size, step_size
+            window_blocks = step_blocks = 1
+            block_count = full_window_count
+        else:
+            block_step = block_size
+            window_blocks = window_size // block_size
+            step_blocks = step_size // block_size
+            block_count = (full_window_count - 1) * step_blocks + window_blocks if full_window_count > 0 else 0
+
+        # The block statistics needed for each mode, and how to combine the values of the blocks of a window
+        block_statistics = {
+            EnvelopeModes.MAX: (['maximum'], np.maximum),
+            EnvelopeModes.MEAN: (['sum'], np.add),
+            EnvelopeModes.MIN: (['minimum'], np.minimum),
+            EnvelopeModes.PEAK: (['minimum', 'maximum'], np.maximum),
+            EnvelopeModes.RMS: (['sum_of_squares'], np.add),
+        }
+
+        block_data = _get_block_statistics(
+            audio_data=audio_data, block_size=block_size, block_count=block_count,
+            statistics={statistic for mode in modes for statistic in block_statistics[mode][0]}, scale=scale,
+            dtype=dtype, block_step=block_step)
+
+        envelopes_data = {}
+
+        for mode in modes:
+            if mode == EnvelopeModes.PEAK:
+                # The maximum absolute value is the larger of the maximum and the negated minimum (avoids a copy)
+                block_values = np.maximum(block_data['maximum'], -block_data['minimum'])
+            else:
+                block_values = block_data[block_statistics[mode][0][0]]
+
+            # Views of the values of the nth block of each window
+            window_block_values = [block_values[:, i:i + (full_window_count - 1) * step_blocks + 1:step_blocks]
+                                   for i in range(window_blocks)]
+
+            # Combine the blocks of each window pairwise, which is the same order numpy sums the samples of a window
+            combine = block_statistics[mode][1]
+            while len(window_block_values) > 1:
+                window_block_values = [combine(*window_block_values[i:i + 2]) if i + 1 < len(window_block_values)
+                                       else window_block_values[i] for i in range(0, len(window_block_values), 2)]
+
+            envelope_data = np.empty((channels, window_count), dtype=dtype)
+            envelope_data[:, :full_window_count] = window_block_values[0][:, :full_window_count]
+
+            if mode == EnvelopeModes.MEAN:
+                envelope_data[:, :full_window_count] /= window_size
+            elif mode == EnvelopeModes.RMS:
+                envelope_data[:, :full_window_count] = np.sqrt(envelope_data[:, :full_window_count] / window_size)
+
+            # There are only a few truncated windows, so their sums are accumulated in double precision
+            for i in range(full_window_count, window_count):
+                window = np.divide(audio_data[:, i * step_size:i * step_size + window_size], scale, dtype=dtype)
+
+                if mode == EnvelopeModes.MAX:
+                    envelope_data[:, i] = np.max(window, axis=1)
+                elif mode == EnvelopeModes.MEAN:
+                    envelope_data[:, i] = np.mean(window, axis=1, dtype=np.float64)
+                elif mode == EnvelopeModes.MIN:
+                    envelope_data[:, i] = np.min(window, axis=1)
+                elif mode == EnvelopeModes.PEAK:
+                    envelope_data[:, i] = np.max(np.abs(window), axis=1)
+                else:
+                    envelope_data[:, i] = np.sqrt(np.mean(np.square(window, dtype=np.float64), axis=1))
+
+            envelopes_data[mode] = envelope_data
+
+        return envelopes_data
+
+
+class EnvelopePyramid:
+    def __init__(self, es_audio: es.audio.Audio, block_size: int = None):
+        """Peak (minimum and maximum) and RMS envelopes of audio at power-of-two decimation levels, which can be
+        queried at the resolution needed to render any time range (see get_envelope())
+        :param es_audio:
+        :param block_size: The number of samples in each block of the finest level. If not specified, uses
+                           analysis.window-overlap from the configuration (the step size of Envelope).
+        """
+        self._block_size = block_size if block_size is not None else es.cfg['analysis.window-overlap']
+        self._sample_count = es_audio.sample_count
+        self._sample_rate = es_audio.sample_rate
+
+        # The minimum, maximum, and sum of squares of the samples of each block of each level
+        self._minimums = []  # type: list[np.ndarray]
+        self._maximums = []  # type: list[np.ndarray]
+        self._sums_of_squares = []  # type: list[np.ndarray]
+
+        cache_key = es.cache.get_analysis_key(es_audio, 'envelope_pyramid', block_size=self._block_size)
+        cached_pyramid = es.cache.load(cache_key)
+
+        if cached_pyramid is not None:
+            cached_arrays, cached_meta = cached_pyramid
+            for level in range(cached_meta['levels']):
+                self._minimums.append(cached_arrays[f'minimums_{level}'])
+                self._maximums.append(cached_arrays[f'maximums_{level}'])
+                self._sums_of_squares.append(cached_arrays[f'sums_of_squares_{level}'])
+            return
+
+        self._add_finest_level(es_audio.data_raw, scale=2 ** (es_audio.bit_depth - 1), dtype=es_audio.dtype)
+
+        # Each level combines pairs of blocks from the previous level until a level has a single block
+        while self._maximums[-1].shape[1] > 1:
+            block_starts = np.arange(0, self._maximums[-1].shape[1], 2)
+            self._minimums.append(np.minimum.reduceat(self._minimums[-1], block_starts, axis=1))
+            self._maximums.append(np.maximum.reduceat(self._maximums[-1], block_starts, axis=1))
+            self._sums_of_squares.append(np.add.reduceat(self._sums_of_squares[-1], block_starts, axis=1))
+
+        cached_arrays = {}
+        for level in range(self.levels):
+            cached_arrays[f'minimums_{level}'] = self._minimums[level]
+            cached_arrays[f'maximums_{level}'] = self._maximums[level]
+            cached_arrays[f'sums_of_squares_{level}'] = self._sums_of_squares[level]
+
+        es.cache.save(cache_key, cached_arrays, {'levels': self.levels})
+
+    @property
+    def block_size(self) -> int:
+        """
+        :return int: The number of samples in each block of the finest level
+        """
+        return self._block_size
+
+    @property
+    def levels(self) -> int:
+        """
+        :return int: The number of levels. Each block of a level combines two blocks of the previous level.
+        """
+        return len(self._maximums)
+
+    def get_envelope(self, start: float, end: float, points: int) -> \
+            typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the envelopes of a time range using the coarsest level with at least the requested number of
+        points in the range. Since the points are the blocks of a level, the envelopes are stable as the range moves.
+        :param float start: The start time (in seconds)
+        :param float end: The end time (in seconds)
+        :param int points: The minimum number of points (e.g. the number of pixel columns the range is rendered to).
+                           Fewer points are returned if the finest level has fewer blocks in the range.
+        :return typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The time of the center of each point,
+                                                                            and 2-dimensional arrays of the minimum,
+                                                                            maximum, and RMS of each point with
+                                                                            channels as rows
+        """
+        i_start = max(0, min(self._sample_count, math.floor(start * self._sample_rate)))
+        i_end = max(i_start, min(self._sample_count, math.ceil(end * self._sample_rate)))
+
+        # Choose the coarsest level with blocks no larger than the number of samples per point
+        samples_per_point = (i_end - i_start) / max(1, points)
+        level = max(0, min(self.levels - 1, math.floor(math.log2(max(1.0, samples_per_point / self.block_size)))))
+        level_block_size = self.block_size * 2 ** level
+
+        i_block_start = i_start // level_block_size
+        i_block_end = max(i_block_start, math.ceil(i_end / level_block_size))
+
+        # The last block of the audio may be shorter than the others
+        block_boundaries = np.minimum(np.arange(i_block_start, i_block_end + 1) * level_block_size, self._sample_count)
+        block_sample_counts = np.diff(block_boundaries)
+
+        times = (block_boundaries[:-1] + block_sample_counts / 2) / self._sample_rate
+        rms = np.sqrt(self._sums_of_squares[level][:, i_block_start:i_block_end] / np.maximum(block_sample_counts, 1))
+
+        return (times,
+                self._minimums[level][:, i_block_start:i_block_end],
+                self._maximums[level][:, i_block_start:i_block_end],
+                rms.astype(self._maximums[level].dtype, copy=False))
+
+    def _add_finest_level(self, audio_data: np.ndarray, scale: float, dtype: np.dtype) -> None:
+        sample_count = audio_data.shape[1]
+        full_block_count = sample_count // self.block_size
+        statistics = {'minimum', 'maximum', 'sum_of_squares'}
+
+        block_data = _get_block_statistics(audio_data=audio_data, block_size=self.block_size,
+                                           block_count=full_block_count, statistics=statistics, scale=scale,
+                                           dtype=dtype)
+
+        if sample_count > full_block_count * self.block_size:
+            # The last block only contains the remaining samples
+            last_block_data = _get_block_statistics(audio_data=audio_data[:, full_block_count * self.block_size:],
+                                                    block_size=sample_count - full_block_count * self.block_size,
+                                                    block_count=1, statistics=statistics, scale=scale, dtype=dtype)
+
+            for statistic in statistics:
+                block_data[statistic] = np.concatenate((block_data[statistic], last_block_data[statistic]), axis=1)
+
+        self._minimums.append(block_data['minimum'])
+        self._maximums.append(block_data['maximum'])
+        # Sums of squares have double precision since they are combined for long time ranges
+        self._sums_of_squares.append(block_data['sum_of_squares'])
+
+
+class SpectralEdgeEstimator:
+    def __init__(self):
+        """Estimates the highest frequency with significant content in a spectrogram from the spectral edge
+        frequencies of its time bins. Blocks of time bins can be added as they are calculated, and only three values
+        are stored for each time bin, so the spectrogram of long audio doesn't need to be kept in memory.
+        """
+        # The total magnitude and the indices of the 80% and 95% spectral edge frequencies of each time bin
+        self._totals = []  # type: list[np.ndarray]
+        self._edge80_indices = []  # type: list[np.ndarray]
+        self._edge95_indices = []  # type: list[np.ndarray]
+
+    def add(self, spectrogram_data: np.ndarray) -> None:
+        """Adds time bins of a spectrogram
+        :param np.ndarray spectrogram_data: A linear spectrogram with frequencies as rows and times as columns, or a
+                                            3-dimensional array of spectrograms with channels as the first dimension
+        """
+        if len(spectrogram_data.shape) == 2:
+            spectrogram_data = spectrogram_data.reshape(1, *spectrogram_data.shape)
+
+        # Calculate the cumulative sum of frequency magnitude at all time bins
+        spectral_cumsum = np.cumsum(spectrogram_data, axis=1)
+        totals = spectral_cumsum[:, -1:, :]
+
+        # Since the cumulative sums are non-decreasing, the index of the first frequency which reaches a fraction of
+        # the total is the number of frequencies below it
+        self._totals.append(totals.reshape(-1))
+        self._edge80_indices.append(np.count_nonzero(spectral_cumsum < 0.8 * totals, axis=1).reshape(-1))
+        self._edge95_indices.append(np.count_nonzero(spectral_cumsum < 0.95 * totals, axis=1).reshape(-1))
+
+    def get_frequency_index(self) -> int | None:
+        """
+        :return int | None: The index of the frequency of either the 95th percentile of the 80% spectral edge
+                            frequencies or the 50th percentile of the 95% spectral edge frequencies, or None if no
+                            time bins have any signal
+        """
+        totals = np.concatenate(self._totals) if self._totals else np.zeros(0)
+        edge80_indices = np.concatenate(self._edge80_indices) if self._edge80_indices else np.zeros(0, dtype=int)
+        edge95_indices = np.concatenate(self._edge95_indices) if self._edge95_indices else np.zeros(0, dtype=int)
+
+        # Ignore times with no signal
+        signal_times = totals != 0
+        totals = totals[signal_times]
+
+        # Ignore times in the bottom 10% of signal magnitude
+        included_times = np.ones(totals.size, dtype=bool)
+        included_times[np.argsort(totals)[:math.floor(0.1 * totals.size)]] = False
+
+        if not np.any(included_times):
+            return None
+
+        return max(math.floor(np.percentile(edge80_indices[signal_times][included_times], 95)),
+                   math.floor(np.percentile(edge95_indices[signal_times][included_times], 50)))
+
 
 class SpectrogramFrequencyMaxMethods(enum.StrEnum):
     SPECTRAL_EDGE = 'spectral_edge'
     POWER_THRESHOLD = 'power_threshold'
 
+class SpectrogramQuantization(enum.StrEnum):
+    NONE = 'none'
+    FLOAT16 = 'float16'
+    UINT8 = 'uint8'
+
 class SpectrogramScaling(enum.StrEnum):
     LINEAR = 'linear'
     DB = 'db'
 
 class Spectrogram:
-    def __init__(self, es_audio: es.audio.Audio, frequency_min: int = None, frequency_max: int = None):
+    def __init__(self, es_audio: es.audio.Audio, frequency_min: int = None, frequency_max: int = None,
+                 resample: bool = None):
         """
         :param es_audio:
         :param frequency_min:
         :param frequency_max:
+        :param resample: Whether to calculate the spectrogram from the audio resampled to the lowest sample rate which
+                         covers the maximum frequency (otherwise the bins up to the maximum frequency are kept from the
+                         spectrogram at the sample rate of the audio). If not specified, the audio is resampled unless
+                         the maximum frequency is autoscaled, since autoscaling already calculates the spectrogram at
+                         the sample rate of the audio.
         """
-        audio_data = es_audio.data
         sample_rate = es_audio.sample_rate
 
         self._frequencies = None
         self._times = None
         self._spectrogram_data = None
+        self._shared_spectrogram_data = None  # type: _MappedFileArray | _SharedFileArray | None
         self._frequency_min = frequency_min if frequency_min is not None else \
             es.cfg['analysis.spectrogram.frequency-min']
-        self._frequency_max = frequency_max if frequency_max is not None else \
-            es.cfg['analysis.spectrogram.frequency-max'] if es.cfg['analysis.spectrogram.frequency-max'] is not None else \
-                self._get_frequency_max(audio_data=audio_data, sample_rate=sample_rate) \
+
+        cache_key = self._get_cache_key(es_audio=es_audio, frequency_min=self._frequency_min,
+                                        frequency_max=frequency_max, resample=resample)
+        cached_spectrogram = es.cache.load(cache_key)
+
+        if cached_spectrogram is not None:
+            cached_arrays, cached_meta = cached_spectrogram
+            self._frequency_max = cached_meta['frequency_max']
+            self._frequencies = cached_arrays['frequencies']
+            self._times = cached_arrays['times']
+            self._spectrogram_data = cached_arrays['spectrogram_data']
+            return
 
         window_size = es.cfg['analysis.window-size']
         window_overlap = es.cfg['analysis.window-overlap']
 
+        self._frequency_max = frequency_max if frequency_max is not None else \
+            es.cfg['analysis.spectrogram.frequency-max']
+
+        if resample is None:
+            resample = self._frequency_max is not None
+
+        if self._frequency_max is None:
+            self._frequency_max, autoscale_spectrogram = self._autoscale_frequency_max(
+                es_audio=es_audio, frequency_min=self.frequency_min)
+
+            if autoscale_spectrogram is not None:
+                self._frequencies, self._times, self._spectrogram_data = autoscale_spectrogram
+
         # If max frequency is less than our nyquist limit, resample the audio data
         # to limit the processing and memory requirements of the spectrogram
-        if self.frequency_max < math.floor(sample_rate / 2):
+        if resample and self.frequency_max < math.floor(sample_rate / 2):
             # Calculate new sample rate from max frequency using nyquist rule
             new_sample_rate = round(self.frequency_max * 2)
+
+            # The sample rate only needs to cover the max frequency, so a slightly higher rate with a simpler
+            # resampling ratio may be used. Audio loaded from a file is resampled the same way (rather than decoded
+            # again at the new sample rate), so the spectrogram is the same whether or not it is calculated by the
+            # worker processes of analyze(). The raw audio data is resampled and only the resampled data is
+            # normalized, so the normalized data of the whole audio is never generated.
+            tolerance = es.cfg['audio.resample.tolerance']
+            up, down = es.audio.get_resample_factors(sample_rate, new_sample_rate, tolerance=tolerance)
+            audio_data = np.divide(es.audio.resample_audio_data(es_audio.data_raw, sample_rate, new_sample_rate,
+                                                                tolerance=tolerance),
+                                   2 ** (es_audio.bit_depth - 1), dtype=es_audio.dtype)
+            new_sample_rate = sample_rate * up / down
+
             resample_factor = sample_rate / new_sample_rate
-            audio_data = es.audio.resample_audio_data(audio_data, sample_rate, new_sample_rate)
 
             sample_rate = new_sample_rate
             window_size = math.floor(window_size / resample_factor)
             window_overlap = math.floor(window_overlap / resample_factor)
+        elif self._spectrogram_data is None:
+            # Normalize the audio data without storing it in the instance of the audio
+            audio_data = es_audio.get_data()
+
+        if self._spectrogram_data is None:
+            self._frequencies, self._times, self._spectrogram_data = self.generate_spectrogram_data(
+                audio_data=audio_data,
+                sample_rate=sample_rate,
+                window_size=window_size,
+                window_overlap=window_overlap,
+                frequency_min=self.frequency_min,
+                frequency_max=self.frequency_max
+            )
 
-        self._frequencies, self._times, self._spectrogram_data = self.generate_spectrogram_data(
-            audio_data=audio_data,
-            sample_rate=sample_rate,
-            window_size=window_size,
-            window_overlap=window_overlap,
-            frequency_min=self.frequency_min,
-            frequency_max=self.frequency_max
-        )
+        es.cache.save(cache_key,
+                      {'frequencies': self._frequencies, 'times': self._times,
+                       'spectrogram_data': self._spectrogram_data},
+                      {'frequency_max': self._frequency_max})
+
+        # Writing the cache entry reads the whole spectrogram, so release it if it is memory mapped
+        _release_memory_mapped_pages(self._spectrogram_data)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+
+        # Shared spectrogram data is pickled as its file rather than copied (see share())
+        if self._shared_spectrogram_data is not None:
+            state['_spectrogram_data'] = None
+
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
 
+        if self._shared_spectrogram_data is not None:
+            self._spectrogram_data = self._shared_spectrogram_data.array
 
     @property
     def frequencies(self) -> np.ndarray[typing.Type[float]]:
@@ -155,6 +560,13 @@ class Spectrogram:
         """
         return self._frequency_max
 
+    @property
+    def memory_mapped(self) -> bool:
+        """
+        :return bool: Whether the spectrogram data is memory mapped from a file (rather than stored in memory)
+        """
+        return _get_memory_map(self._spectrogram_data) is not None
+
     @property
     def spectrogram_data(self) -> np.ndarray[typing.Type[float]]:
         """
@@ -169,11 +581,97 @@ class Spectrogram:
         """
         return self._times
 
+    @property
+    def vmax(self) -> float:
+        """
+        :return float: The value of the spectrogram data which corresponds to the top of the dynamic range (0 dB)
+        """
+        if np.issubdtype(self._spectrogram_data.dtype, np.integer):
+            return np.iinfo(self._spectrogram_data.dtype).max
+
+        return 0
+
+    @property
+    def vmin(self) -> float:
+        """
+        :return float: The value of the spectrogram data which corresponds to the bottom of the dynamic range
+        """
+        if np.issubdtype(self._spectrogram_data.dtype, np.integer):
+            return 0
+
+        return -es.cfg['visualization.style.spectrogram.dynamic-range']
+
+    def get_channel_data(self, channel: int, frame_count_max: int = None) -> np.ndarray[typing.Type[float]]:
+        """Gets the spectrogram of a channel, reducing the number of frames if the spectrogram is memory mapped so
+        it can be rendered without reading the whole spectrogram into memory
+        :param int channel: The channel of the spectrogram
+        :param int frame_count_max: The maximum number of frames to return from a memory mapped spectrogram. Adjacent
+                                    frames are combined using their maximum values.
+        :return np.ndarray[typing.Type[float]]: The spectrogram of the channel
+        """
+        channel_data = self._spectrogram_data[channel, :, :]
+        frame_count = channel_data.shape[-1]
+
+        if not self.memory_mapped or frame_count_max is None or frame_count <= frame_count_max:
+            return channel_data
+
+        group_size = math.ceil(frame_count / frame_count_max)
+        group_count = math.ceil(frame_count / group_size)
+        reduced_data = np.empty((channel_data.shape[0], group_count), dtype=channel_data.dtype)
+
+        # Read tiles of whole groups of frames, releasing the pages of each tile once it is reduced
+        tile_groups = max(1, _get_tile_frame_count(shape=channel_data.shape, dtype=channel_data.dtype) // group_size)
+
+        for i_group_start in range(0, group_count, tile_groups):
+            i_group_end = min(i_group_start + tile_groups, group_count)
+            tile_data = channel_data[:, i_group_start * group_size:i_group_end * group_size]
+            np.maximum.reduceat(tile_data, np.arange(0, tile_data.shape[-1], group_size), axis=-1,
+                                out=reduced_data[:, i_group_start:i_group_end])
+            _release_memory_mapped_pages(channel_data)
+
+        return reduced_data
+
+    def share(self) -> 'Spectrogram':
+        """Returns an instance which is pickled with the path of a file the spectrogram data is memory mapped from
+        rather than the data, so other processes (e.g. workers rendering video segments) read the same data from the
+        file without copying it. The file of memory mapped spectrogram data (its tiles or its cache entry) is shared as
+        it is, and spectrogram data in memory is copied into a temporary file. The data may be larger than memory.
+        :return Spectrogram: The shared instance, whose shared data is released by unshare() once no other process
+                             uses it
+        """
+        spectrogram = copy.copy(self)
+        spectrogram._shared_spectrogram_data = _MappedFileArray.from_array(self._spectrogram_data)
+
+        if spectrogram._shared_spectrogram_data is None:
+            spectrogram._shared_spectrogram_data = _SharedFileArray.copy(self._spectrogram_data)
+
+        spectrogram._spectrogram_data = spectrogram._shared_spectrogram_data.array
+
+        return spectrogram
+
+    def unshare(self) -> None:
+        """Releases the shared spectrogram data of an instance returned by share(), removing it if it is a copy. The
+        instance can't be used afterwards.
+        :return None:
+        """
+        if self._shared_spectrogram_data is None:
+            return
+
+        self._spectrogram_data = None
+        self._shared_spectrogram_data.close()
+
+        if isinstance(self._shared_spectrogram_data, _SharedFileArray):
+            self._shared_spectrogram_data.unlink()
+
+        self._shared_spectrogram_data = None
+
     @classmethod
     def generate_spectrogram_data(cls, audio_data: np.ndarray, sample_rate: int, window_function: str = None,
                                   window_size: int = None, window_overlap: int = None, nfft: int = None,
                                   frequency_min: float = None, frequency_max: float = None,
-                                  scaling: SpectrogramScaling = SpectrogramScaling.DB) -> \
+                                  scaling: SpectrogramScaling = SpectrogramScaling.DB, workers: int = None,
+                                  frame_step: int = 1, memory_max: float = None,
+                                  quantization: SpectrogramQuantization = None) -> \
                                       typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
         :param audio_data:
@@ -185,6 +683,15 @@ class Spectrogram:
         :param frequency_min:
         :param frequency_max:
         :param scaling:
+        :param workers: The number of threads with which to calculate blocks of frames. If not specified, uses
+                        analysis.spectrogram.workers from the configuration. The result does not depend on the number
+                        of threads.
+        :param frame_step: Only calculate every nth frame (e.g. to estimate the spectrum of long audio)
+        :param memory_max: The maximum size of the spectrogram to store in memory (in megabytes). Larger spectrograms
+                           are written to a memory mapped temporary file one tile of frames at a time. If not
+                           specified, uses analysis.spectrogram.memory-max from the configuration.
+        :param quantization: The data type in which to store a spectrogram in decibels (see _quantize_decibels()). If
+                             not specified, uses analysis.spectrogram.quantization from the configuration.
         :return:
         """
         frequencies = None
@@ -206,6 +713,22 @@ class Spectrogram:
         if frequency_min is None:
             frequency_min = es.cfg['analysis.spectrogram.frequency-min']
 
+        if workers is None:
+            workers = es.cfg['analysis.spectrogram.workers']
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if memory_max is None:
+            memory_max = es.cfg['analysis.spectrogram.memory-max']
+
+        if quantization is None:
+            quantization = es.cfg['analysis.spectrogram.quantization']
+
+        # Only spectrograms in decibels are quantized
+        quantization = SpectrogramQuantization(quantization) if scaling == SpectrogramScaling.DB else \
+            SpectrogramQuantization.NONE
+
         if frequency_max is None:
             # If frequency max is not defined in config, use the nyquist limit (this function does not autoscale)
             frequency_max = es.cfg['analysis.spectrogram.frequency-max']\
@@ -213,97 +736,258 @@ class Spectrogram:
 
         nfft = max(nfft, window_size)
 
-        # Multichannel
-        for i in range(audio_data.shape[0]):
-            frequencies, times, spectrogram_channel = scipy.signal.spectrogram(
-                audio_data[i, :].T,
-                fs=sample_rate,
-                window=window_function,
-                nperseg=window_size,
-                noverlap=window_overlap,
-                nfft=nfft,
-                scaling='spectrum',
-                mode='magnitude'
-            )
-            # Convert channel to 3d matrix with the first dimension as the channel_id
-            spectrogram_channel = spectrogram_channel.reshape(1, *spectrogram_channel.shape)
+        # Process a single channel as multichannel audio with one channel
+        channels_data = audio_data.reshape(1, -1) if len(audio_data.shape) == 1 else audio_data
+        channels, sample_count = channels_data.shape
+
+        # The segments can't be longer than the audio (same as scipy.signal.spectrogram)
+        window_size = min(window_size, sample_count)
+        step_size = window_size - window_overlap
+
+        if step_size < 1:
+            raise Exception('Window overlap must be less than the window size.')
+
+        # The STFT is calculated the same way as scipy.signal.spectrogram(scaling='spectrum', mode='magnitude'), so the
+        # window and scale have the precision of the audio data
+        complex_dtype = np.result_type(channels_data, np.complex64)
+        window = scipy.signal.get_window(window_function, window_size)
+        if np.result_type(window, np.complex64) != complex_dtype:
+            window = window.astype(complex_dtype)
+        scale = np.sqrt(1.0 / window.sum() ** 2)
+        window = window.real
+
+        times = np.arange(window_size / 2, sample_count - window_size / 2 + 1, step_size)[::frame_step] / \
+            float(sample_rate)
+
+        # Only the bins which correspond to the desired frequency range are stored
+        frequency_bins = _get_frequency_bins(nfft=nfft, sample_rate=sample_rate, frequency_min=frequency_min,
+                                             frequency_max=frequency_max)
+        frequencies = scipy.fft.rfftfreq(nfft, 1 / sample_rate)[frequency_bins]
+
+        # Overlapping segments of all channels (no data is copied)
+        segments = np.lib.stride_tricks.sliding_window_view(
+            channels_data, window_size, axis=-1)[:, ::step_size * frame_step, :]
+
+        spectrogram_shape = (channels, len(frequencies), segments.shape[1])
+        spectrogram_dtype = _get_quantized_dtype(quantization) if quantization != SpectrogramQuantization.NONE \
+            else window.dtype
+        spectrogram_data = _allocate_spectrogram_data(shape=spectrogram_shape, dtype=spectrogram_dtype,
+                                                      memory_max=memory_max)
+
+        def transform_block(i_segment_start: int) -> None:
+            block_segments = segments[:, i_segment_start:i_segment_start + _SPECTROGRAM_BLOCK_FRAMES, :]
+
+            # Remove the mean of each segment and apply the window
+            block_segments = block_segments - np.mean(block_segments, axis=-1, keepdims=True)
+            block_segments *= window
+
+            block_stft = scipy.fft.rfft(block_segments, n=nfft)
+            block_stft *= scale
+
+            block_spectrogram_data = spectrogram_data[
+                :, :, i_segment_start:i_segment_start + block_segments.shape[1]].transpose(0, 2, 1)
+
+            # Quantized blocks are calculated at full precision before they are stored
+            block_magnitudes = block_spectrogram_data if quantization == SpectrogramQuantization.NONE else None
+            block_magnitudes = np.abs(block_stft[:, :, frequency_bins], out=block_magnitudes)
+
+            if scaling == SpectrogramScaling.DB:
+                es.utils.log10_quiet(block_magnitudes, out=block_magnitudes)
+                block_magnitudes *= 20
+
+            if quantization != SpectrogramQuantization.NONE:
+                _quantize_decibels(block_magnitudes, quantization=quantization, out=block_spectrogram_data)
+
+        # Transform blocks of segments of all channels at a time, writing the magnitudes of the bins in the frequency
+        # range directly into the spectrogram. Each block is calculated independently, so blocks can be calculated
+        # in parallel (numpy and scipy.fft release the GIL) without changing the result.
+        block_starts = range(0, segments.shape[1], _SPECTROGRAM_BLOCK_FRAMES)
+
+        # A memory mapped spectrogram is calculated in tiles of blocks. Each tile is written to the file and released
+        # from memory before the next one is calculated. Segments are taken from the whole audio, so the frames at the
+        # edges of each tile overlap the neighboring tiles the same as any other frames.
+        if _get_memory_map(spectrogram_data) is not None:
+            tile_blocks = max(1, _get_tile_frame_count(shape=spectrogram_shape, dtype=spectrogram_dtype) //
+                              _SPECTROGRAM_BLOCK_FRAMES)
+        else:
+            tile_blocks = len(block_starts)
 
-            if spectrogram_data is None:
-                spectrogram_data = spectrogram_channel
-            else:
-                # Append all channels on to the first
-                spectrogram_data = np.append(spectrogram_data, spectrogram_channel, axis=0)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) if workers > 1 and len(block_starts) > 1 \
+                else contextlib.nullcontext() as executor:
+            for i_tile_start in range(0, len(block_starts), max(1, tile_blocks)):
+                tile_block_starts = block_starts[i_tile_start:i_tile_start + tile_blocks]
 
-        # Trim spectrogram to only include specified frequency range
-        # Find the indicies which correspond to the desired frequency range
-        frequency_step = frequencies[1] - frequencies[0]
-        i_frequency_min = math.floor(frequency_min / frequency_step)
-        i_frequency_max = min(math.ceil(frequency_max / frequency_step) + 1, len(frequencies) - 1)
+                if executor is not None:
+                    # Consume the results to raise any exceptions
+                    list(executor.map(transform_block, tile_block_starts))
+                else:
+                    for i_segment_start in tile_block_starts:
+                        transform_block(i_segment_start)
 
-        frequencies = frequencies[i_frequency_min:i_frequency_max]
+                _release_memory_mapped_pages(spectrogram_data)
 
-        # Trim spectrogram to the desired frequency range
         if len(audio_data.shape) == 1:
-            spectrogram_data = spectrogram_data[i_frequency_min:i_frequency_max, :]
+            spectrogram_data = spectrogram_data[0]
+
+        return frequencies, times, spectrogram_data
+
+    @classmethod
+    def _autoscale_frequency_max(cls, es_audio: es.audio.Audio, frequency_min: float) -> \
+            typing.Tuple[float, typing.Tuple[np.ndarray, np.ndarray, np.ndarray] | None]:
+        """Estimates the maximum frequency of the spectrogram of audio from evenly spaced frames of the audio at its
+        sample rate (all frames unless the audio is long)
+        :param es.audio.Audio es_audio: The audio
+        :param float frequency_min: The minimum frequency of the spectrogram
+        :return typing.Tuple[float, typing.Tuple[np.ndarray, np.ndarray, np.ndarray] | None]: The maximum frequency,
+            and the frequencies, times and data of the spectrogram at the sample rate of the audio up to the maximum
+            frequency if the one used for autoscaling has all frames (otherwise None)
+        """
+        sample_rate = es_audio.sample_rate
+        window_size = es.cfg['analysis.window-size']
+        window_overlap = es.cfg['analysis.window-overlap']
+
+        step_size = window_size - window_overlap
+        frame_count = max(0, es_audio.sample_count - window_size) // step_size + 1
+        frame_step = math.ceil(frame_count / _FREQUENCY_MAX_FRAMES)
+
+        if frame_step > 1:
+            # Only the subsampled frames are normalized. They are concatenated so their spectrogram is calculated from
+            # adjacent frames without overlap, which is the same as the subsampled frames of the whole spectrogram.
+            frames = np.lib.stride_tricks.sliding_window_view(
+                es_audio.data_raw, window_size, axis=-1)[:, ::step_size * frame_step, :]
+            audio_data = np.divide(frames.reshape(es_audio.channels, -1), 2 ** (es_audio.bit_depth - 1),
+                                   dtype=es_audio.dtype)
+            window_overlap = 0
         else:
-            spectrogram_data = spectrogram_data[:, i_frequency_min:i_frequency_max, :]
+            # Normalize the audio data without storing it in the instance of the audio
+            audio_data = es_audio.get_data()
+
+        # Use the same parameters as the spectrogram at the sample rate so it can be reused if it has all frames
+        frequencies, times, spectrogram_data = cls.generate_spectrogram_data(
+            audio_data=audio_data,
+            sample_rate=sample_rate,
+            window_size=window_size,
+            window_overlap=window_overlap,
+            frequency_min=frequency_min,
+            frequency_max=math.floor(sample_rate / 2),
+            scaling=SpectrogramScaling.LINEAR
+        )
 
-        if scaling == SpectrogramScaling.DB:
-            spectrogram_data = 20 * es.utils.log10_quiet(spectrogram_data)
+        frequency_max = cls._get_frequency_max(frequencies=frequencies, spectrogram_data=spectrogram_data,
+                                               sample_rate=sample_rate)
 
-        return frequencies, times, spectrogram_data
+        if frame_step > 1:
+            return frequency_max, None
+
+        # The bins up to the maximum frequency are a subset of the bins of the spectrogram used for autoscaling, so
+        # they are kept and only need to be converted to decibels
+        nfft = max(es.cfg['analysis.spectrogram.nfft'], window_size)
+        frequency_bins = _get_frequency_bins(nfft=nfft, sample_rate=sample_rate, frequency_min=frequency_min,
+                                             frequency_max=frequency_max)
+        frequency_count = frequency_bins.stop - frequency_bins.start
+        frequencies = frequencies[:frequency_count]
+        spectrogram_data = spectrogram_data[..., :frequency_count, :]
+
+        # The spectrogram in decibels is stored the same way as by generate_spectrogram_data(), so it is converted one
+        # tile of frames at a time and memory mapped if it is larger than analysis.spectrogram.memory-max
+        quantization = SpectrogramQuantization(es.cfg['analysis.spectrogram.quantization'])
+        decibel_data = _allocate_spectrogram_data(
+            shape=spectrogram_data.shape,
+            dtype=_get_quantized_dtype(quantization) if quantization != SpectrogramQuantization.NONE else
+            spectrogram_data.dtype,
+            memory_max=es.cfg['analysis.spectrogram.memory-max'])
+
+        frame_count = spectrogram_data.shape[-1]
+        tile_frames = _get_tile_frame_count(shape=spectrogram_data.shape, dtype=spectrogram_data.dtype)
+
+        for i_frame_start in range(0, frame_count, tile_frames):
+            tile_decibels = es.utils.log10_quiet(spectrogram_data[..., i_frame_start:i_frame_start + tile_frames])
+            tile_decibels *= 20
+            _quantize_decibels(tile_decibels, quantization=quantization,
+                               out=decibel_data[..., i_frame_start:i_frame_start + tile_frames])
+
+            _release_memory_mapped_pages(spectrogram_data)
+            _release_memory_mapped_pages(decibel_data)
+
+        return frequency_max, (frequencies, times, decibel_data)
 
     @classmethod
-    def _get_frequency_max(cls, audio_data: np.ndarray, sample_rate: int,
+    def _from_channels(cls, spectrograms: typing.Sequence['Spectrogram'], spectrogram_data: np.ndarray) -> 'Spectrogram':
+        """Combines the spectrograms of the channels of audio (e.g. calculated in separate processes)
+        :param typing.Sequence[Spectrogram] spectrograms: The spectrogram of each channel, with the same frequencies
+                                                         and times
+        :param np.ndarray spectrogram_data: The combined spectrogram data of the channels
+        :return Spectrogram:
+        """
+        spectrogram = cls.__new__(cls)
+        spectrogram._frequency_min = spectrograms[0].frequency_min
+        spectrogram._frequency_max = spectrograms[0].frequency_max
+        spectrogram._frequencies = spectrograms[0].frequencies
+        spectrogram._times = spectrograms[0].times
+        spectrogram._spectrogram_data = spectrogram_data
+        spectrogram._shared_spectrogram_data = None
+
+        return spectrogram
+
+    @classmethod
+    def _get_cache_key(cls, es_audio: es.audio.Audio, frequency_min: float, frequency_max: float | None,
+                       resample: bool = None) -> str | None:
+        """
+        :param es.audio.Audio es_audio: The audio of the spectrogram
+        :param float frequency_min: The minimum frequency of the spectrogram
+        :param float | None frequency_max: The maximum frequency of the spectrogram (None if it is autoscaled)
+        :param bool resample: Whether the spectrogram is calculated from resampled audio (see Spectrogram())
+        :return str | None: The cache key of the spectrogram
+        """
+        if resample is None:
+            resample = (frequency_max if frequency_max is not None else
+                        es.cfg['analysis.spectrogram.frequency-max']) is not None
+
+        # Spectrograms quantized to integers depend on the dynamic range
+        quantization = SpectrogramQuantization(es.cfg['analysis.spectrogram.quantization'])
+        dynamic_range = es.cfg['visualization.style.spectrogram.dynamic-range'] \
+            if quantization == SpectrogramQuantization.UINT8 else None
+
+        return es.cache.get_analysis_key(es_audio, 'spectrogram', frequency_min=frequency_min,
+                                         frequency_max=frequency_max, resample=resample, dynamic_range=dynamic_range)
+
+    @classmethod
+    def _get_frequency_max(cls, frequencies: np.ndarray, spectrogram_data: np.ndarray, sample_rate: int,
                            method: SpectrogramFrequencyMaxMethods = None,
                            padding_factor: float = None, pretty_mode: bool = True):
+        """Estimates the highest frequency with significant content in a spectrogram
+        :param np.ndarray frequencies: The frequencies of the spectrogram
+        :param np.ndarray spectrogram_data: A linear spectrogram (e.g. of a subset of the frames of the audio)
+        :param int sample_rate: The sample rate of the audio of the spectrogram
+        :param SpectrogramFrequencyMaxMethods method:
+        :param float padding_factor:
+        :param bool pretty_mode: Round the frequency to a pretty value
+        :return float:
+        """
         if method is None:
             method = SpectrogramFrequencyMaxMethods(es.cfg['analysis.spectrogram.frequency-max-method'])
 
         if padding_factor is None:
             padding_factor = es.cfg['analysis.spectrogram.frequency-max-padding-factor']
 
-        frequencies, times, spectrogram_data = cls.generate_spectrogram_data(audio_data, sample_rate,
-                                                                             scaling=SpectrogramScaling.LINEAR)
-        if len(spectrogram_data.shape) > 2:
-            # Reshape spectrogram data to append all channels onto first
-            # (since we want to determine the max frequency across all channels)
-            spectrogram_data = spectrogram_data.transpose(1, 0, 2).reshape(spectrogram_data.shape[1], -1)
-
         frequency_max_index = frequencies.size - 1
 
         if method == SpectrogramFrequencyMaxMethods.SPECTRAL_EDGE:
             # Spectral edge frequency method
-            # Calculate the cumulative sum of frequency magnitude at all time bins
-            spectral_cumsum = np.cumsum(spectrogram_data, axis=0)
-
-            # Remove times with no signal
-            zero_times = np.where(spectral_cumsum[frequency_max_index, :] == 0)
-            spectral_cumsum = np.delete(spectral_cumsum, zero_times, axis=1)
-
-            # Remove times in the bottom 10% of signal magnitude
-            # Get the list of time indices sorted by total frequency magnitude at that time
-            sorted_times = np.argsort(spectral_cumsum[frequency_max_index, :])
-            spectral_cumsum = np.delete(spectral_cumsum, sorted_times[range(math.floor(0.1 * spectral_cumsum.shape[1]))], axis=1)
-
-            # Initialize vectors to store spectral edge frequency indicies for each time bin
-            spec_edge80_indices = np.zeros(spectral_cumsum.shape[1])
-            spec_edge95_indices = np.zeros(spectral_cumsum.shape[1])
-
-            for i_t in range(spectral_cumsum.shape[1]):
-                # Calculate the 80% and 95% spectral edge frequencies for each time bin
-                spec_edge80_indices[i_t] = np.argmax(
-                    spectral_cumsum[:, i_t] >= 0.8 * spectral_cumsum[frequency_max_index, i_t])
-                spec_edge95_indices[i_t] = np.argmax(
-                    spectral_cumsum[:, i_t] >= 0.95 * spectral_cumsum[frequency_max_index, i_t])
-
-            # Identify the frequency index of either the 95th percentile of the 80% spectral edge frequency
-            # or the 50th percentile of the 95% spectral edge frequency
-            frequency_max_index = max(
-                math.floor(np.percentile(spec_edge80_indices, 95)),
-                math.floor(np.percentile(spec_edge95_indices, 50)))
+            spectral_edge_estimator = SpectralEdgeEstimator()
+            spectral_edge_estimator.add(spectrogram_data)
+            spectral_edge_index = spectral_edge_estimator.get_frequency_index()
+
+            # If no time bins have any signal, use the highest frequency
+            if spectral_edge_index is not None:
+                frequency_max_index = spectral_edge_index
         elif method == SpectrogramFrequencyMaxMethods.POWER_THRESHOLD:
             # Power threshold method
+            if len(spectrogram_data.shape) > 2:
+                # Reshape spectrogram data to append all channels onto first
+                # (since we want to determine the max frequency across all channels)
+                spectrogram_data = spectrogram_data.transpose(1, 0, 2).reshape(spectrogram_data.shape[1], -1)
+
             # Convert to decibels. Might have zero values which could lead to divide by zero errors when taking log
             spectrogram_data = np.multiply(es.utils.log10_quiet(spectrogram_data), 20)
             # Set the power threshold to 20% of the total dynamic range
@@ -334,6 +1018,363 @@ class Spectrogram:
         return frequency_max
 
 
+class _MappedFileArray:
+    """A read-only view of an array memory mapped from a file (e.g. the samples of a memory mapped WAV file).
+    Instances are pickled as the path of the file and the layout of the view, so other processes map the same file
+    rather than copying the array."""
+    def __init__(self, file: str, offset: int, shape: typing.Tuple[int, ...], strides: typing.Tuple[int, ...],
+                 dtype: np.dtype):
+        """
+        :param str file: The path of the file
+        :param int offset: The position in the file (in bytes) of the first element of the array
+        :param typing.Tuple[int, ...] shape: The shape of the array
+        :param typing.Tuple[int, ...] strides: The strides of the array (in bytes)
+        :param np.dtype dtype: The data type of the array
+        """
+        self._file = file
+        self._offset = offset
+        self._shape = tuple(shape)
+        self._strides = tuple(strides)
+        self._dtype = np.dtype(dtype)
+
+        with open(file, 'rb') as file_handle:
+            # The memory map keeps its own handle of the file, so the file can be closed
+            self._memory_map = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._array = np.ndarray(self._shape, dtype=self._dtype, buffer=self._memory_map, offset=self._offset,
+                                 strides=self._strides)
+
+    def __getstate__(self) -> dict:
+        return {'file': self._file, 'offset': self._offset, 'shape': self._shape, 'strides': self._strides,
+                'dtype': self._dtype.str}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    @property
+    def array(self) -> np.ndarray:
+        """
+        :return np.ndarray: The array (only valid until the instance is closed)
+        """
+        return self._array
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> '_MappedFileArray | None':
+        """
+        :param np.ndarray array: An array, e.g. the raw audio data of a memory mapped WAV file (see
+                                 es.audio.decode_audio_file())
+        :return _MappedFileArray | None: An instance which maps the same elements of the same file as the array, or
+                                         None if the array is not a view of a np.memmap of a file
+        """
+        memory_mapped_array = array
+
+        # Views of a np.memmap are also np.memmap instances (with the offset of the original), so find the original
+        # np.memmap, which is the only one whose base is the memory map of the file
+        while isinstance(memory_mapped_array, np.ndarray) and not isinstance(memory_mapped_array.base, mmap.mmap):
+            memory_mapped_array = memory_mapped_array.base
+
+        if not isinstance(memory_mapped_array, np.memmap) or memory_mapped_array.filename is None:
+            return None
+
+        # The first element of the memory mapped array is at its offset in the file
+        offset = memory_mapped_array.offset + array.__array_interface__['data'][0] - \
+            memory_mapped_array.__array_interface__['data'][0]
+
+        return cls(file=memory_mapped_array.filename, offset=offset, shape=array.shape, strides=array.strides,
+                   dtype=array.dtype)
+
+    def close(self) -> None:
+        """Unmaps the array from the file. Any views of the array must be released first.
+        :return None:
+        """
+        self._array = None
+        self._memory_map.close()
+
+
+class _SharedArray:
+    """An array in shared memory. Instances are pickled as the name of the shared memory, so other processes attach
+    to the same memory rather than copying the array."""
+    def __init__(self, shape: typing.Tuple[int, ...], dtype: np.dtype, name: str = None):
+        """
+        :param typing.Tuple[int, ...] shape: The shape of the array
+        :param np.dtype dtype: The data type of the array
+        :param str name: The name of the shared memory of an existing array. If not specified, creates the shared
+                         memory of a new (uninitialized) array.
+        """
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._shared_memory = multiprocessing.shared_memory.SharedMemory(
+            name=name, create=name is None, size=max(1, math.prod(self._shape) * self._dtype.itemsize))
+        self._name = self._shared_memory.name
+        self._array = np.ndarray(self._shape, dtype=self._dtype, buffer=self._shared_memory.buf)
+
+    def __getstate__(self) -> dict:
+        return {'shape': self._shape, 'dtype': self._dtype.str, 'name': self._name}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(shape=state['shape'], dtype=state['dtype'], name=state['name'])
+
+    @property
+    def array(self) -> np.ndarray:
+        """
+        :return np.ndarray: The array (only valid until the instance is closed)
+        """
+        return self._array
+
+    @classmethod
+    def copy(cls, array: np.ndarray) -> '_SharedArray':
+        """
+        :param np.ndarray array: An array
+        :return _SharedArray: A copy of the array in shared memory
+        """
+        shared_array = cls(shape=array.shape, dtype=array.dtype)
+        np.copyto(shared_array.array, array)
+
+        return shared_array
+
+    def close(self) -> None:
+        """Detaches the instance from the shared memory. Any views of the array must be released first.
+        :return None:
+        """
+        self._array = None
+        self._shared_memory.close()
+
+    def unlink(self) -> None:
+        """Removes the shared memory once it is closed by all processes
+        :return None:
+        """
+        self._shared_memory.unlink()
+
+
+class _SharedFileArray:
+    """An array memory mapped from a temporary file. Instances are pickled as the path of the file, so other processes
+    map the same file (read-only) rather than copying the array. Unlike _SharedArray, the array doesn't need to fit in
+    memory."""
+    def __init__(self, shape: typing.Tuple[int, ...], dtype: np.dtype, file: str = None):
+        """
+        :param typing.Tuple[int, ...] shape: The shape of the array
+        :param np.dtype dtype: The data type of the array
+        :param str file: The path of the file of an existing array, which is mapped read-only. If not specified,
+                         creates the file of a new (uninitialized) array.
+        """
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        size = max(1, math.prod(self._shape) * self._dtype.itemsize)
+
+        if file is None:
+            with tempfile.NamedTemporaryFile(prefix='estimpy-', dir=es.utils.get_temp_file_path(),
+                                             delete=False) as file_handle:
+                file_handle.truncate(size)
+                # The memory map keeps its own handle of the file, so the file can be closed
+                self._memory_map = mmap.mmap(file_handle.fileno(), size)
+
+            self._file = file_handle.name
+        else:
+            with open(file, 'rb') as file_handle:
+                self._memory_map = mmap.mmap(file_handle.fileno(), size, access=mmap.ACCESS_READ)
+
+            self._file = file
+
+        self._array = np.frombuffer(self._memory_map, dtype=self._dtype,
+                                    count=math.prod(self._shape)).reshape(self._shape)
+
+    def __getstate__(self) -> dict:
+        return {'shape': self._shape, 'dtype': self._dtype.str, 'file': self._file}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(shape=state['shape'], dtype=state['dtype'], file=state['file'])
+
+    @property
+    def array(self) -> np.ndarray:
+        """
+        :return np.ndarray: The array (only valid until the instance is closed)
+        """
+        return self._array
+
+    @classmethod
+    def copy(cls, array: np.ndarray) -> '_SharedFileArray':
+        """
+        :param np.ndarray array: An array with frames as the last dimension (e.g. spectrogram data), which is copied
+                                 in tiles of frames
+        :return _SharedFileArray: A copy of the array in a temporary file
+        """
+        shared_array = cls(shape=array.shape, dtype=array.dtype)
+        tile_frame_count = max(1, _get_tile_frame_count(shape=array.shape, dtype=array.dtype))
+
+        for i_frame_start in range(0, array.shape[-1], tile_frame_count):
+            shared_array.array[..., i_frame_start:i_frame_start + tile_frame_count] = \
+                array[..., i_frame_start:i_frame_start + tile_frame_count]
+
+            # Only the pages of the tile being copied are kept in memory
+            _release_memory_mapped_pages(array)
+            _release_memory_mapped_pages(shared_array.array)
+
+        return shared_array
+
+    def close(self) -> None:
+        """Unmaps the array from the file. Any views of the array must be released first.
+        :return None:
+        """
+        self._array = None
+        self._memory_map.close()
+
+    def unlink(self) -> None:
+        """Removes the file once the instance is closed
+        :return None:
+        """
+        os.remove(self._file)
+
+
+def analyze(es_audio: es.audio.Audio, stages: typing.Iterable[AnalysisStages] = None,
+            processes: int = None) -> typing.Dict[AnalysisStages, typing.Any]:
+    """Runs stages of analysis of audio concurrently in a pool of worker processes. The raw audio data is copied once
+    into shared memory which the workers read without pickling it (or mapped by the workers from its file if it is
+    memory mapped). The spectrogram of each channel is calculated by a
+    separate worker and returned in shared memory.
+    :param es.audio.Audio es_audio: The audio to analyze
+    :param typing.Iterable[AnalysisStages] stages: The stages to run. If not specified, runs all stages.
+    :param int processes: The maximum number of worker processes. If not specified, uses analysis.processes from the
+                          configuration. With a single process (or short audio), the stages are run one after another
+                          in this process.
+    :return typing.Dict[AnalysisStages, typing.Any]: The result of each stage: a dictionary of the peak and RMS
+                                                     envelopes (see envelopes()), an EnvelopePyramid and a Spectrogram
+    """
+    stages = [AnalysisStages(stage) for stage in stages] if stages is not None else list(AnalysisStages)
+
+    if processes is None:
+        processes = es.cfg['analysis.processes']
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    frequency_min = es.cfg['analysis.spectrogram.frequency-min']
+
+    # Spectrograms are calculated for each channel unless they are cached or stored out of core (the spectrograms of
+    # the channels would be stored in shared memory), in which case they are calculated in this process while the
+    # other stages are calculated by workers
+    spectrogram_channels = []
+
+    if AnalysisStages.SPECTROGRAM in stages and \
+            es.cache.load(Spectrogram._get_cache_key(es_audio=es_audio, frequency_min=frequency_min,
+                                                     frequency_max=None)) is None and \
+            not _is_spectrogram_out_of_core(es_audio):
+        spectrogram_channels = [None] if es_audio.channels == 1 else list(range(es_audio.channels))
+
+    worker_stages = [stage for stage in stages if stage != AnalysisStages.SPECTROGRAM]
+    processes = min(processes, len(worker_stages) + len(spectrogram_channels))
+
+    if processes <= 1 or es_audio.sample_count * es_audio.channels < _ANALYSIS_PROCESSES_SAMPLES_MIN:
+        return {stage: _run_analysis_stage(es_audio=es_audio, stage=stage) for stage in stages}
+
+    # Only pass the configuration options which are not derived (derived values may not be picklable)
+    cfg = {key: es.cfg[key] for key in es.base_cfg}
+    cfg['analysis.processes'] = 1
+
+    # Share the spectrogram threads (all CPUs if not specified) between the workers rather than having each one use all
+    # of them, so the number of threads does not multiply with the number of processes
+    spectrogram_workers = cfg['analysis.spectrogram.workers'] or os.cpu_count() or 1
+    cfg['analysis.spectrogram.workers'] = max(1, spectrogram_workers // processes)
+
+    results = {}
+
+    # The properties of the audio are passed to the workers separately from the audio data. Audio data memory mapped
+    # from a file (e.g. a WAV file) is mapped by the workers from the same file, and other audio data is copied once
+    # into shared memory.
+    audio_data_raw = _MappedFileArray.from_array(es_audio.data_raw)
+
+    if audio_data_raw is None:
+        audio_data_raw = _SharedArray.copy(es_audio.data_raw)
+
+    es_audio_properties = es_audio.with_data_raw(None)
+
+    try:
+        # Spawn workers so they don't inherit the state of the GUI backend or any threads of this process
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes,
+                                                    mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=_initialize_analysis_worker,
+                                                    initargs=(cfg,)) as executor:
+            futures = {stage: executor.submit(_run_analysis_task, es_audio_properties, audio_data_raw, stage)
+                       for stage in worker_stages}
+
+            if AnalysisStages.SPECTROGRAM in stages and spectrogram_channels:
+                # The maximum frequency is autoscaled from all channels while the workers run the other stages. The
+                # spectrograms of the channels are then calculated the same way as an autoscaled spectrogram (at the
+                # sample rate of the audio).
+                frequency_max = es.cfg['analysis.spectrogram.frequency-max']
+                resample = frequency_max is not None
+
+                if frequency_max is None:
+                    frequency_max, _ = Spectrogram._autoscale_frequency_max(es_audio=es_audio,
+                                                                             frequency_min=frequency_min)
+
+                spectrogram_futures = [executor.submit(_run_analysis_task, es_audio_properties, audio_data_raw,
+                                                       AnalysisStages.SPECTROGRAM, channel, frequency_min,
+                                                       frequency_max, resample)
+                                       for channel in spectrogram_channels]
+            elif AnalysisStages.SPECTROGRAM in stages:
+                results[AnalysisStages.SPECTROGRAM] = spectrogram(es_audio=es_audio)
+                spectrogram_futures = []
+            else:
+                spectrogram_futures = []
+
+            for stage, future in futures.items():
+                results[stage] = future.result()
+
+            if spectrogram_futures:
+                results[AnalysisStages.SPECTROGRAM] = _combine_channel_spectrograms(
+                    es_audio=es_audio, channel_results=[future.result() for future in spectrogram_futures])
+    finally:
+        audio_data_raw.close()
+
+        if isinstance(audio_data_raw, _SharedArray):
+            audio_data_raw.unlink()
+
+    # Return the results in the order of the stages
+    return {stage: results[stage] for stage in stages}
+
+
+def envelopes(es_audio: es.audio.Audio, modes: typing.Iterable[EnvelopeModes] = None, start: int = 0, end: int = None,
+              padding: int = 0, window_size: int = None,
+              step_size: int = None) -> typing.Dict[EnvelopeModes, Envelope]:
+    """Calculates multiple envelopes of audio with a single pass over the audio data
+    :param es.audio.Audio es_audio:
+    :param typing.Iterable[EnvelopeModes] modes: The envelopes to calculate. If not specified, calculates the peak and
+                                                RMS envelopes.
+    :return typing.Dict[EnvelopeModes, Envelope]: The envelope of each mode (see Envelope for the other parameters)
+    """
+    modes = [EnvelopeModes.PEAK, EnvelopeModes.RMS] if modes is None else list(modes)
+    end = es_audio.sample_count if end is None else end
+    window_size = es.cfg['analysis.window-size'] if window_size is None else window_size
+    step_size = es.cfg['analysis.window-overlap'] if step_size is None else step_size
+
+    if start > es_audio.sample_count or end > es_audio.sample_count:
+        raise Exception('Invalid start or end time for envelope.')
+
+    # Envelopes which are already cached don't need to be calculated
+    uncached_modes = [mode for mode in modes if es.cache.load(es.cache.get_analysis_key(
+        es_audio, 'envelope', mode=mode, start=start, end=end, padding=padding, window_size=window_size,
+        step_size=step_size)) is None]
+
+    envelopes_data = {}
+
+    if uncached_modes:
+        # Only read the samples covered by the windows (the last window may extend past the end)
+        audio_data = es_audio.data_raw[:, start:min(end + window_size, es_audio.sample_count)]
+
+        envelopes_data = Envelope._get_envelopes_data(audio_data=audio_data, modes=uncached_modes,
+                                                      window_size=window_size, step_size=step_size,
+                                                      window_count=len(range(0, end - start, step_size)),
+                                                      scale=2 ** (es_audio.bit_depth - 1))
+
+    return {mode: Envelope(es_audio=es_audio, mode=mode, start=start, end=end, padding=padding,
+                           window_size=window_size, step_size=step_size, envelope_data=envelopes_data.get(mode))
+            for mode in modes}
+
+
+def envelope_pyramid(es_audio: es.audio.Audio, block_size: int = None) -> EnvelopePyramid:
+    return EnvelopePyramid(es_audio=es_audio, block_size=block_size)
+
+
 def peak_envelope(es_audio: es.audio.Audio, start: int = 0, end: int = None, padding: int = 0,
                   window_size: int = None, step_size: int = None) -> Envelope:
     return Envelope(es_audio=es_audio, mode=EnvelopeModes.PEAK, start=start, end=end, padding=padding,
@@ -350,6 +1391,241 @@ def spectrogram(es_audio: es.audio.Audio) -> Spectrogram:
     return Spectrogram(es_audio=es_audio)
 
 
+def _allocate_spectrogram_data(shape: typing.Tuple[int, ...], dtype: np.dtype, memory_max: float = None) -> np.ndarray:
+    """Allocates the data of a spectrogram in memory, or in a memory mapped temporary file if it is larger than the
+    maximum size
+    :param typing.Tuple[int, ...] shape: The shape of the spectrogram
+    :param np.dtype dtype: The data type of the spectrogram
+    :param float memory_max: The maximum size of the spectrogram to store in memory (in megabytes). If None, the
+                             spectrogram is always stored in memory.
+    :return np.ndarray: The (uninitialized) spectrogram data
+    """
+    if memory_max is not None and math.prod(shape) * np.dtype(dtype).itemsize > memory_max * 2 ** 20:
+        return _create_memory_mapped_array(shape=shape, dtype=dtype)
+
+    return np.empty(shape, dtype=dtype)
+
+
+def _combine_channel_spectrograms(es_audio: es.audio.Audio,
+                                  channel_results: typing.Sequence[typing.Tuple[Spectrogram, _SharedArray]]) -> \
+        Spectrogram:
+    """Combines the spectrograms of the channels of audio calculated by workers (see analyze()), then caches the
+    combined spectrogram as the spectrogram of the audio
+    :param es.audio.Audio es_audio: The audio
+    :param typing.Sequence[typing.Tuple[Spectrogram, _SharedArray]] channel_results: The spectrogram of each channel
+        (without its data) and its data in shared memory
+    :return Spectrogram:
+    """
+    channel_spectrograms = [channel_spectrogram for channel_spectrogram, _ in channel_results]
+    channel_data = [shared_data for _, shared_data in channel_results]
+
+    spectrogram_data = _allocate_spectrogram_data(
+        shape=(sum(shared_data.array.shape[0] for shared_data in channel_data),) + channel_data[0].array.shape[1:],
+        dtype=channel_data[0].array.dtype, memory_max=es.cfg['analysis.spectrogram.memory-max'])
+
+    i_channel = 0
+
+    for shared_data in channel_data:
+        channels = shared_data.array.shape[0]
+        spectrogram_data[i_channel:i_channel + channels] = shared_data.array
+        i_channel += channels
+
+        shared_data.close()
+        shared_data.unlink()
+
+    combined_spectrogram = Spectrogram._from_channels(spectrograms=channel_spectrograms,
+                                                      spectrogram_data=spectrogram_data)
+
+    es.cache.save(Spectrogram._get_cache_key(es_audio=es_audio, frequency_min=combined_spectrogram.frequency_min,
+                                             frequency_max=None),
+                  {'frequencies': combined_spectrogram.frequencies, 'times': combined_spectrogram.times,
+                   'spectrogram_data': spectrogram_data},
+                  {'frequency_max': combined_spectrogram.frequency_max})
+
+    _release_memory_mapped_pages(spectrogram_data)
+
+    return combined_spectrogram
+
+
+def _create_memory_mapped_array(shape: typing.Tuple[int, ...], dtype: np.dtype) -> np.memmap:
+    """Creates an array which is memory mapped from a temporary file. The file is removed once the array and all of its
+    views are released, so it only exists on disk while the array is in use. Other processes can map the same file
+    while it exists (see _MappedFileArray.from_array()).
+    :param typing.Tuple[int, ...] shape: The shape of the array
+    :param np.dtype dtype: The data type of the array
+    :return np.memmap: The (uninitialized) array
+    """
+    with tempfile.NamedTemporaryFile(prefix='estimpy-', dir=es.utils.get_temp_file_path(),
+                                     delete=False) as file_handle:
+        file_handle.truncate(max(1, math.prod(shape) * np.dtype(dtype).itemsize))
+
+    array = np.memmap(file_handle.name, dtype=dtype, mode='r+', shape=shape)
+
+    # The memory map is referenced by all views of the array, so it is released with the last of them
+    weakref.finalize(array.base, _remove_temp_file, file_handle.name)
+
+    return array
+
+
+def _get_block_statistics(audio_data: np.ndarray, block_size: int, block_count: int, statistics: typing.Set[str],
+                          scale: float = 1, dtype: np.dtype = None,
+                          block_step: int = None) -> typing.Dict[str, np.ndarray]:
+    """Reduces blocks of samples of each channel of audio data in a single pass. The samples are processed in chunks
+    of about _ENVELOPE_CHUNK_SIZE samples so the temporary arrays stay small. The blocks are reduced in the domain of
+    the audio data (e.g. integers), and sums are accumulated with double precision so they can't overflow.
+    :param np.ndarray audio_data: A 2-dimensional array of audio samples with channels as rows
+    :param int block_size: The number of samples in each block
+    :param int block_count: The number of blocks to reduce from the start of the audio data
+    :param typing.Set[str] statistics: The statistics to calculate for each block (minimum, maximum, sum, and/or
+                                      sum_of_squares)
+    :param float scale: The value by which to divide the audio samples to normalize them. Only the values of the blocks
+                        are scaled.
+    :param np.dtype dtype: The data type of the minimums and maximums. If not specified, uses the data type of the
+                           audio data. Sums are always float64.
+    :param int block_step: The number of samples between the start of each block. If not specified, the blocks are
+                           consecutive (i.e. block_size).
+    :return typing.Dict[str, np.ndarray]: A 2-dimensional array of the values of the blocks with channels as rows
+                                          for each statistic
+    """
+    channels = audio_data.shape[0]
+    dtype = audio_data.dtype if dtype is None else np.dtype(dtype)
+    block_step = block_size if block_step is None else block_step
+
+    block_data = {statistic: np.empty((channels, block_count),
+                                      dtype=np.float64 if statistic.startswith('sum') else audio_data.dtype)
+                  for statistic in statistics}
+
+    chunk_blocks = max(1, _ENVELOPE_CHUNK_SIZE // block_size)
+    squares = np.empty((min(chunk_blocks, block_count), block_size), dtype=np.float64) \
+        if 'sum_of_squares' in statistics else None
+
+    # Reduce each channel separately since the samples of each channel are contiguous (or evenly strided for
+    # memory-mapped files)
+    for channel in range(channels):
+        for i_block_start in range(0, block_count, chunk_blocks):
+            i_block_end = min(block_count, i_block_start + chunk_blocks)
+
+            if block_step == block_size:
+                blocks = audio_data[channel, i_block_start * block_size:i_block_end * block_size].reshape(
+                    -1, block_size)
+            else:
+                # Strided view of the blocks (no data is copied)
+                blocks = np.lib.stride_tricks.sliding_window_view(
+                    audio_data[channel, i_block_start * block_step:(i_block_end - 1) * block_step + block_size],
+                    block_size)[::block_step]
+            block_slice = (channel, slice(i_block_start, i_block_end))
+
+            if 'minimum' in statistics:
+                np.min(blocks, axis=1, out=block_data['minimum'][block_slice])
+
+            if 'maximum' in statistics:
+                np.max(blocks, axis=1, out=block_data['maximum'][block_slice])
+
+            if 'sum' in statistics:
+                np.sum(blocks, axis=1, dtype=np.float64, out=block_data['sum'][block_slice])
+
+            if 'sum_of_squares' in statistics:
+                chunk_squares = squares[:i_block_end - i_block_start]
+                np.square(blocks, out=chunk_squares, dtype=np.float64)
+                np.sum(chunk_squares, axis=1, out=block_data['sum_of_squares'][block_slice])
+
+    # Only scale the values of the blocks
+    for statistic in statistics:
+        if statistic.startswith('sum'):
+            block_data[statistic] /= scale ** (2 if statistic == 'sum_of_squares' else 1)
+        else:
+            block_data[statistic] = np.divide(block_data[statistic], scale, dtype=dtype)
+
+    return block_data
+
+
+def _get_frequency_bins(nfft: int, sample_rate: float, frequency_min: float, frequency_max: float) -> slice:
+    """
+    :param int nfft: The length of the transforms of a spectrogram
+    :param float sample_rate: The sample rate of the audio of the spectrogram
+    :param float frequency_min: The minimum frequency of the spectrogram
+    :param float frequency_max: The maximum frequency of the spectrogram
+    :return slice: The frequency bins of the transforms which are stored in the spectrogram
+    """
+    frequencies = scipy.fft.rfftfreq(nfft, 1 / sample_rate)
+    frequency_step = frequencies[1] - frequencies[0]
+
+    return slice(math.floor(frequency_min / frequency_step),
+                 min(math.ceil(frequency_max / frequency_step) + 1, len(frequencies) - 1))
+
+
+def _get_memory_map(array: np.ndarray | None) -> mmap.mmap | None:
+    """
+    :param np.ndarray | None array: An array
+    :return mmap.mmap | None: The memory map from which the array is mapped, or None if it is not memory mapped
+    """
+    while isinstance(array, np.ndarray):
+        array = array.base
+
+    # Arrays created from buffers reference them through a memoryview
+    if isinstance(array, memoryview):
+        array = array.obj
+
+    return array if isinstance(array, mmap.mmap) else None
+
+
+def _get_quantized_dtype(quantization: SpectrogramQuantization) -> np.dtype:
+    """
+    :param SpectrogramQuantization quantization: The quantization of a spectrogram
+    :return np.dtype: The data type in which the quantized spectrogram is stored
+    """
+    return np.dtype(str(quantization))
+
+
+def _get_tile_frame_count(shape: typing.Tuple[int, ...], dtype: np.dtype) -> int:
+    """
+    :param typing.Tuple[int, ...] shape: The shape of a spectrogram (with frames as the last dimension)
+    :param np.dtype dtype: The data type of the spectrogram
+    :return int: The number of frames of the spectrogram to calculate or read at a time if it is memory mapped
+    """
+    memory_max = es.cfg['analysis.spectrogram.memory-max']
+
+    if memory_max is None:
+        return shape[-1]
+
+    frame_size = math.prod(shape[:-1]) * np.dtype(dtype).itemsize
+
+    return max(1, math.floor(memory_max * 2 ** 20 * _SPECTROGRAM_TILE_MEMORY_FRACTION / frame_size))
+
+
+def _initialize_analysis_worker(cfg: dict) -> None:
+    """Initializes a worker process of analyze()
+    :param dict cfg: The configuration of the main process
+    :return None:
+    """
+    # Use the configuration of the main process, then regenerate the derived configuration values
+    es.cfg.update(cfg)
+    es.trigger_event('config.updated')
+
+
+def _is_spectrogram_out_of_core(es_audio: es.audio.Audio) -> bool:
+    """
+    :param es.audio.Audio es_audio: The audio
+    :return bool: Whether the spectrogram of the audio is estimated to be larger than analysis.spectrogram.memory-max
+                  (see Spectrogram.generate_spectrogram_data())
+    """
+    memory_max = es.cfg['analysis.spectrogram.memory-max']
+
+    if memory_max is None:
+        return False
+
+    # The number of frames and frequency bins barely change when the audio is resampled, since the window size is
+    # scaled with the sample rate
+    window_size = es.cfg['analysis.window-size']
+    frame_count = max(0, es_audio.sample_count - window_size) // (window_size - es.cfg['analysis.window-overlap']) + 1
+    frequency_count = max(es.cfg['analysis.spectrogram.nfft'], window_size) // 2 + 1
+
+    quantization = SpectrogramQuantization(es.cfg['analysis.spectrogram.quantization'])
+    dtype = _get_quantized_dtype(quantization) if quantization != SpectrogramQuantization.NONE else es_audio.dtype
+
+    return es_audio.channels * frequency_count * frame_count * dtype.itemsize > memory_max * 2 ** 20
+
+
 def _on_config_updated():
     if es.cfg['analysis.window-overlap'] is None:
         es.cfg['analysis.window-overlap'] = es.cfg['analysis.window-size'] // 2
@@ -358,4 +1634,138 @@ def _on_config_updated():
         es.cfg['analysis.spectrogram.nfft'] = es.cfg['analysis.window-size']
 
 
+def _quantize_decibels(decibels: np.ndarray, quantization: SpectrogramQuantization, dynamic_range: float = None,
+                       out: np.ndarray = None) -> np.ndarray:
+    """Quantizes a spectrogram in decibels to store it with less memory. Spectrograms quantized to float16 keep their
+    values in decibels. Spectrograms quantized to uint8 are clipped to the dynamic range, and the levels from 0 to 255
+    span it from -dynamic_range to 0 dB (see Spectrogram.vmin and Spectrogram.vmax).
+    :param np.ndarray decibels: The spectrogram in decibels
+    :param SpectrogramQuantization quantization: The quantization of the spectrogram
+    :param float dynamic_range: The dynamic range of spectrograms quantized to integers (in decibels). If not
+                                specified, uses visualization.style.spectrogram.dynamic-range from the configuration.
+    :param np.ndarray out: An array of the quantized data type in which to store the result
+    :return np.ndarray: The quantized spectrogram (the spectrogram itself if it is not quantized and out is None)
+    """
+    if quantization == SpectrogramQuantization.NONE:
+        if out is None:
+            return decibels
+
+        np.copyto(out, decibels)
+        return out
+
+    if out is None:
+        out = np.empty(decibels.shape, dtype=_get_quantized_dtype(quantization))
+
+    if quantization == SpectrogramQuantization.UINT8:
+        if dynamic_range is None:
+            dynamic_range = es.cfg['visualization.style.spectrogram.dynamic-range']
+
+        levels = np.iinfo(out.dtype).max
+
+        # Scale the dynamic range to the levels and round to the nearest level (silence is -inf dB, which is clipped)
+        decibels = np.add(decibels, dynamic_range)
+        decibels *= levels / dynamic_range
+        np.clip(decibels, 0, levels, out=decibels)
+        np.rint(decibels, out=decibels)
+
+    np.copyto(out, decibels, casting='unsafe')
+
+    return out
+
+
+def _run_analysis_stage(es_audio: es.audio.Audio, stage: AnalysisStages, frequency_min: float = None,
+                        frequency_max: float = None, resample: bool = None) -> typing.Any:
+    """Runs a stage of analysis of audio (see analyze())
+    :param es.audio.Audio es_audio: The audio
+    :param AnalysisStages stage: The stage
+    :param float frequency_min: The minimum frequency of the spectrogram
+    :param float frequency_max: The maximum frequency of the spectrogram
+    :param bool resample: Whether to calculate the spectrogram from resampled audio (see Spectrogram())
+    :return typing.Any: The result of the stage
+    """
+    if stage == AnalysisStages.ENVELOPES:
+        # The same envelopes as visualizations use
+        return envelopes(es_audio=es_audio, modes=[EnvelopeModes.PEAK, EnvelopeModes.RMS], padding=1)
+    elif stage == AnalysisStages.ENVELOPE_PYRAMID:
+        return envelope_pyramid(es_audio=es_audio)
+    elif stage == AnalysisStages.SPECTROGRAM:
+        return Spectrogram(es_audio=es_audio, frequency_min=frequency_min, frequency_max=frequency_max,
+                           resample=resample)
+
+    raise Exception(f'Invalid analysis stage "{stage}".')
+
+
+def _run_analysis_task(es_audio: es.audio.Audio, audio_data_raw: _SharedArray | _MappedFileArray,
+                       stage: AnalysisStages, channel: int = None, frequency_min: float = None,
+                       frequency_max: float = None, resample: bool = None) -> typing.Any:
+    """Runs a stage of analysis of audio in a worker process (see analyze())
+    :param es.audio.Audio es_audio: The audio without its data
+    :param _SharedArray | _MappedFileArray audio_data_raw: The raw audio data in shared memory or memory mapped from
+                                                          its file
+    :param AnalysisStages stage: The stage
+    :param int channel: The channel of the audio to analyze. If not specified, analyzes all channels.
+    :param float frequency_min: The minimum frequency of the spectrogram
+    :param float frequency_max: The maximum frequency of the spectrogram
+    :param bool resample: Whether to calculate the spectrogram from resampled audio (see Spectrogram())
+    :return typing.Any: The result of the stage. Spectrograms are returned without their data, with a copy of their
+                        data in shared memory.
+    """
+    es_audio = es_audio.with_data_raw(audio_data_raw.array)
+
+    if channel is not None:
+        es_audio = es_audio.channel(channel)
+
+    result = _run_analysis_stage(es_audio=es_audio, stage=stage, frequency_min=frequency_min,
+                                 frequency_max=frequency_max, resample=resample)
+
+    spectrogram_data = None
+
+    if stage == AnalysisStages.SPECTROGRAM:
+        spectrogram_data = _SharedArray.copy(result.spectrogram_data)
+        result._spectrogram_data = None
+
+        # Only the name of the shared memory is returned, and it isn't removed until the main process has copied it
+        # (see _combine_channel_spectrograms())
+        spectrogram_data.close()
+
+    # The shared audio data can't be detached from while any arrays view it, so the result is copied (in case any of
+    # its arrays are views of the audio data) and the views of the audio are released first
+    result = copy.deepcopy(result)
+    del es_audio
+    audio_data_raw.close()
+
+    if spectrogram_data is not None:
+        return result, spectrogram_data
+
+    return result
+
+
+def _release_memory_mapped_pages(array: np.ndarray | None) -> None:
+    """Writes any changes to a memory mapped array to its file and releases its pages from memory (they are read
+    from the file again when they are used). Does nothing if the array is not memory mapped.
+    :param np.ndarray | None array: An array
+    :return None:
+    """
+    memory_map = _get_memory_map(array)
+
+    if memory_map is None:
+        return
+
+    memory_map.flush()
+
+    # Releasing the pages isn't supported on all platforms (the operating system still releases them when needed)
+    if hasattr(mmap, 'MADV_DONTNEED'):
+        memory_map.madvise(mmap.MADV_DONTNEED)
+
+
+def _remove_temp_file(file: str) -> None:
+    """Removes a temporary file if it still exists. Files which are still in use (e.g. mapped by another process on
+    Windows) are left in the temporary directory.
+    :param str file: The path of the file
+    :return None:
+    """
+    with contextlib.suppress(OSError):
+        os.remove(file)
+
+
 es.add_event_listener('config.updated', _on_config_updated)
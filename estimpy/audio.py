@@ -1,6 +1,14 @@
 """A module to load audio files and manage audio data"""
+import copy
+import enum
+import fractions
+import functools
+import json
 import math
 import os
+import struct
+import subprocess
+import tempfile
 import typing
 
 import estimpy as es
@@ -8,17 +16,48 @@ import numpy as np
 import pydub
 import scipy
 
+# Number of frames to read from the decoder pipe at a time
+_DECODER_CHUNK_FRAMES = 1 << 16
+
+# WAVE format tags which store integer PCM samples
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Stopband attenuation (in decibels) of the anti-aliasing filters of intermediate decimation stages
+_DECIMATION_ATTENUATION = 60
+
+# Relative cost of writing each output sample of a resampling stage (compared to a filter tap)
+_RESAMPLE_STAGE_OVERHEAD = 4
+
+# Lossy codecs (ffprobe codec_name values) which ffprobe reports as floating point but should be decoded as 16-bit
+# integers (same as pydub)
+_LOSSY_CODECS = ['aac', 'ac3', 'eac3', 'mp2', 'mp3', 'opus', 'vorbis', 'wmav1', 'wmav2']
+
+
+class AudioDecoders(enum.StrEnum):
+    FFMPEG = 'ffmpeg'
+    PYDUB = 'pydub'
+
 
 class Audio:
     def __init__(self, file: str = None, format: str = None, audio_data: np.ndarray = None,
-                 sample_rate: int = None, bit_depth: int = None, metadata: dict = None):
+                 sample_rate: int = None, bit_depth: int = None, metadata: dict = None, dtype: str = None,
+                 source_channels: typing.Sequence[int] = None, start: float = None, duration: float = None):
         """
         :param file:
         :param format:
         :param audio_data:
-        :param sample_rate:
+        :param sample_rate: The sample rate of audio_data. If a file is specified, the file is resampled to this
+                            sample rate while it is decoded.
         :param bit_depth:
         :param metadata:
+        :param dtype: The data type of the normalized audio data. If not specified, uses audio.dtype from the
+                      configuration.
+        :param source_channels: The indices of the channels of the file to load. If not specified, all channels are
+                                loaded.
+        :param start: The time (in seconds) in the file from which to load audio
+        :param duration: The length (in seconds) of audio to load from the file. If not specified, the audio is loaded
+                         until the end of the file.
         """
         self._metadata = es.metadata.Metadata(metadata=metadata)
 
@@ -26,18 +65,11 @@ class Audio:
             _, format = os.path.splitext(file)
             format = format[1:]
 
-            audio_segment = pydub.AudioSegment.from_file(file)
-
-            sample_rate = audio_segment.frame_rate
-            # sample_width is the number of bytes per sample, so multiply by 8 to get bits
-            bit_depth = 8 * audio_segment.sample_width
-
-            # Convert to numpy array with each channel in its own row. Since get_array_of_samples() returns 1D
-            # interleaved vector (so [c1_1, c2_1, c1_2, c2_2, etc.]), we need to use reshape with
-            # F-contiguous ordering to get the data from each channel into its own row
-            audio_data = np.ascontiguousarray(np.array(
-                audio_segment.get_array_of_samples()).reshape((audio_segment.channels, -1),
-                                                              order='F'))
+            # Any resampling and selection of channels or a time range is done by the decoder, so samples which
+            # would be discarded are never decoded into memory
+            audio_data, sample_rate, bit_depth = decode_audio_file(file, sample_rate=sample_rate,
+                                                                   channels=source_channels, start=start,
+                                                                   duration=duration)
 
             file_metadata = es.metadata.Metadata(file=file)
             self._metadata.set_metadata(file_metadata.get_metadata())
@@ -47,12 +79,11 @@ class Audio:
 
         if audio_data is not None:
             # Since we will be frequently slicing subsets of audio data from each channel, it will be more efficient
-            # to store the audio data as C-contiguous ordering
-            audio_data_raw = np.ascontiguousarray(audio_data)
-
-            # Then, normalize audio data from 0 to 1 based upon the bitdepth of the file
-            # so divide by 2 to the power of the bit depth minus 1 (since signed int)
-            audio_data = np.divide(audio_data_raw, 2 ** (bit_depth - 1))
+            # to store the samples of each channel contiguously. Decoded files are used as returned by the decoder,
+            # which is either already laid out this way or is a strided view of a memory-mapped file that should
+            # not be read into memory.
+            audio_data_raw = audio_data if file is not None or _is_channel_contiguous(audio_data) else \
+                np.ascontiguousarray(audio_data)
 
         self._file = file  # type: str
         self._format = format  # type: str
@@ -60,10 +91,18 @@ class Audio:
         self._sample_rate = sample_rate  # type int
         self._bit_depth = bit_depth  # type: int
 
-        self._data = audio_data  # type: np.ndarray[typing.Type[float]]
+        # Normalized audio data is only generated when it is first accessed
+        self._data = None  # type: np.ndarray[typing.Type[float]] | None
         self._data_raw = audio_data_raw  # type: np.ndarray[typing.Type[int]]
-        self._channels = audio_data.shape[0] if audio_data is not None else 0  # type: int
-        self._sample_count = audio_data.shape[1] if audio_data is not None else 0  # type: int
+        self._dtype = np.dtype(dtype if dtype is not None else es.cfg['audio.dtype'])  # type: np.dtype
+        self._channels = audio_data_raw.shape[0] if audio_data_raw is not None else 0  # type: int
+        self._sample_count = audio_data_raw.shape[1] if audio_data_raw is not None else 0  # type: int
+        # Time (in seconds) of the first sample relative to the start of the file (non-zero for slices)
+        self._time_offset = start if file is not None and start is not None else 0  # type: float
+        self._source_channels = list(source_channels) if file is not None and source_channels is not None \
+            else None  # type: list[int] | None
+        # Whether only a time range of the file was loaded
+        self._partial = file is not None and (bool(start) or duration is not None)  # type: bool
 
     def __str__(self):
         return self.get_string()
@@ -88,8 +127,13 @@ class Audio:
         :return: np.ndarray[typing.Type[float]]: A 2-dimensional array of audio samples with channels as rows and time
                                                  as columns. This form of the data is floats between 0 and 1,
                                                  and is suitable for analysis and visualization.
-                                                 This array is C-contiguous.
+                                                 This array is C-contiguous. It is generated from data_raw the first
+                                                 time it is accessed. Use get_data() to normalize only a range of
+                                                 samples.
         """
+        if self._data is None and self._data_raw is not None:
+            self._data = self._normalize(self._data_raw)
+
         return self._data
 
     @property
@@ -98,10 +142,17 @@ class Audio:
         :return np.ndarray[typing.Type[int]]: A 2-dimensional array of audio samples with channels as rows and time
                                               as columns. This form of the data is integers of size specified
                                               by bit_depth, and is suitable for writing to files and realtime playback.
-                                              This array is C-contiguous.
+                                              For memory-mapped WAV files, this is a strided view of the file.
         """
         return self._data_raw
 
+    @property
+    def dtype(self) -> np.dtype:
+        """
+        :return np.dtype: The data type of the normalized audio data
+        """
+        return self._dtype
+
     @property
     def file(self) -> str:
         """
@@ -144,6 +195,57 @@ class Audio:
         """
         return self._sample_count
 
+    @property
+    def source_channels(self) -> list[int] | None:
+        """
+        :return list[int] | None: The indices of the channels of the file which were loaded, or None if all channels
+                                  were loaded
+        """
+        return self._source_channels
+
+    @property
+    def time_offset(self) -> float:
+        """
+        :return float: The time (in seconds) of the first sample relative to the start of the file. This is zero
+                       unless the instance was created with slice() or window().
+        """
+        return self._time_offset
+
+    def channel(self, channel: int) -> 'Audio':
+        """Returns a lightweight instance for a single channel of the audio which shares the buffers of this instance
+        (no audio data is copied or decoded)
+        :param int channel: The index of the channel
+        :return Audio: An instance whose data and data_raw are views of the channel of this instance's data. If the
+                       audio was loaded from a file, its source_channels select the channel from the file.
+        """
+        if not 0 <= channel < self.channels:
+            raise Exception(f'Invalid channel {channel} for audio with {self.channels} channel(s).')
+
+        # A shallow copy shares the metadata and all other properties of this instance
+        es_audio = copy.copy(self)
+        es_audio._data_raw = self._data_raw[channel:channel + 1] if self._data_raw is not None else None
+        es_audio._data = self._data[channel:channel + 1] if self._data is not None else None
+        es_audio._channels = 1
+
+        if self.file is not None:
+            es_audio._source_channels = [self.source_channels[channel] if self.source_channels is not None
+                                         else channel]
+
+        return es_audio
+
+    def get_data(self, start: int = 0, end: int = None) -> np.ndarray[typing.Type[float]]:
+        """Returns normalized audio data for a range of samples. If the normalized data for the entire file has not
+        already been generated, only the requested range is normalized.
+        :param int start: The index of the first sample
+        :param int end: The index after the last sample. If not specified, uses the end of the audio.
+        :return np.ndarray[typing.Type[float]]: A 2-dimensional array of audio samples with channels as rows and time
+                                                as columns
+        """
+        if self._data is not None:
+            return self._data[:, start:end]
+
+        return self._normalize(self._data_raw[:, start:end])
+
     def get_string(self) -> str:
         string = self.metadata.title
 
@@ -152,13 +254,54 @@ class Audio:
 
         return string
 
+    def is_partial(self) -> bool:
+        """
+        :return bool: Whether the instance only contains a time range of the file (i.e. it was loaded with a start
+                      or duration, or created with slice() or window())
+        """
+        return self._partial
+
     def resample(self, new_sample_rate: int) -> None:
-        """Resamples audio data to a new sample rate for the instance
+        """Resamples audio data to a new sample rate for the instance (see resampled())
         :param int new_sample_rate:
         :return None:
         """
-        self._data = resample_audio_data(self.sample_rate, new_sample_rate)
-        self._sample_rate = new_sample_rate
+        es_audio = self.resampled(new_sample_rate)
+
+        self._data_raw = es_audio.data_raw
+        self._data = None
+        self._sample_rate = es_audio.sample_rate
+        self._sample_count = es_audio.sample_count
+
+    def resampled(self, new_sample_rate: int) -> 'Audio':
+        """Returns a new instance of the audio at a different sample rate. If the audio was loaded from a file, the
+        same channels and time range are decoded again directly at the new sample rate. Otherwise, the audio data of
+        this instance is resampled.
+        :param int new_sample_rate:
+        :return Audio:
+        """
+        if new_sample_rate == self.sample_rate:
+            return self
+
+        es_audio = copy.copy(self)
+
+        if self.file is not None and os.path.isfile(self.file):
+            audio_data_raw, sample_rate, _ = decode_audio_file(
+                self.file,
+                sample_rate=new_sample_rate,
+                channels=self.source_channels,
+                start=self.time_offset if self.is_partial() else None,
+                duration=self.length if self.is_partial() else None)
+        else:
+            audio_data_raw, sample_rate, _ = _select_audio_data(self.data_raw, self.sample_rate, self.bit_depth,
+                                                                new_sample_rate=new_sample_rate)
+
+        es_audio._data_raw = audio_data_raw
+        es_audio._data = None
+        es_audio._sample_rate = sample_rate
+        es_audio._sample_count = audio_data_raw.shape[1]
+
+        return es_audio
 
     def save_metadata(self) -> None:
         """Save metadata to the audio file for the instance
@@ -171,6 +314,29 @@ class Audio:
 
         self.metadata.save()
 
+    def slice(self, start: float = 0, end: float = None) -> 'Audio':
+        """Returns a lightweight instance for a time range of the audio which shares the buffers of this instance
+        (no audio data is copied or decoded)
+        :param float start: The start time (in seconds) relative to the start of this instance
+        :param float end: The end time (in seconds) relative to the start of this instance. If not specified, uses the
+                          end of the audio.
+        :return Audio: An instance whose data and data_raw are views of this instance's data. Its time_offset is the
+                       start time of the slice relative to the start of the file.
+        """
+        i_start = max(0, min(self.sample_count, math.floor(start * self.sample_rate)))
+        i_end = self.sample_count if end is None else \
+            max(i_start, min(self.sample_count, math.floor(end * self.sample_rate)))
+
+        # A shallow copy shares the metadata and all other properties of this instance
+        es_audio = copy.copy(self)
+        es_audio._data_raw = self._data_raw[:, i_start:i_end] if self._data_raw is not None else None
+        es_audio._data = self._data[:, i_start:i_end] if self._data is not None else None
+        es_audio._sample_count = i_end - i_start
+        es_audio._time_offset = self.time_offset + i_start / self.sample_rate
+        es_audio._partial = self.is_partial() or i_start > 0 or i_end < self.sample_count
+
+        return es_audio
+
     def time_to_data_index(self, time: float) -> int | None:
         """Converts a time (in seconds) from the start of the audio to the corresponding time index in the audio data
         :param float time:
@@ -183,15 +349,686 @@ class Audio:
         else:
             return index
 
+    def window(self, time: float, length: float) -> 'Audio':
+        """Returns a lightweight instance for a window of the audio centered on a time (see slice()). The window is
+        shifted to remain within the bounds of the audio.
+        :param float time: The center time (in seconds) of the window
+        :param float length: The length (in seconds) of the window
+        :return Audio:
+        """
+        start = max(0.0, min(self.length - length, time - length / 2))
+
+        return self.slice(start=start, end=start + length)
+
+    def with_data_raw(self, audio_data_raw: np.ndarray | None) -> 'Audio':
+        """Returns a lightweight instance with the same properties as this instance and different raw audio data
+        (e.g. a copy of the raw audio data in shared memory)
+        :param np.ndarray | None audio_data_raw: Raw audio data with the same shape as the raw audio data of this
+                                                 instance, or None for an instance without audio data (e.g. to pass
+                                                 the properties of the audio to another process)
+        :return Audio:
+        """
+        if audio_data_raw is not None and audio_data_raw.shape != (self.channels, self.sample_count):
+            raise Exception(f'Invalid shape {audio_data_raw.shape} of raw audio data for audio with '
+                            f'{self.channels} channel(s) and {self.sample_count} sample(s).')
+
+        es_audio = copy.copy(self)
+        es_audio._data_raw = audio_data_raw
+        es_audio._data = None
+
+        return es_audio
+
+    def _normalize(self, audio_data_raw: np.ndarray) -> np.ndarray[typing.Type[float]]:
+        # Normalize audio data from 0 to 1 based upon the bitdepth of the file
+        # so divide by 2 to the power of the bit depth minus 1 (since signed int)
+        # Always store the samples of each channel contiguously, even if the raw data is a strided view
+        return np.divide(audio_data_raw, 2 ** (self.bit_depth - 1), dtype=self.dtype, order='C')
+
+
+class AudioInfo:
+    def __init__(self, file: str, sample_rate: int, channels: int, bit_depth: int, sample_count: int):
+        """Properties of an audio file which can be determined without decoding it (see probe())
+        :param file:
+        :param sample_rate:
+        :param channels:
+        :param bit_depth:
+        :param sample_count:
+        """
+        _, format = os.path.splitext(file)
+
+        self._file = file  # type: str
+        self._format = format[1:]  # type: str
+        self._sample_rate = sample_rate  # type: int
+        self._channels = channels  # type: int
+        self._bit_depth = bit_depth  # type: int
+        self._sample_count = sample_count  # type: int
+
+    @property
+    def bit_depth(self) -> int:
+        """
+        :return int: The bit depth of the raw audio data once the file is loaded
+        """
+        return self._bit_depth
+
+    @property
+    def channels(self) -> int:
+        """
+        :return int: The number of channels
+        """
+        return self._channels
+
+    @property
+    def file(self) -> str:
+        """
+        :return str: The path to the file
+        """
+        return self._file
+
+    @property
+    def format(self) -> str:
+        """
+        :return str: The format of the audio file
+        """
+        return self._format
+
+    @property
+    def length(self) -> float:
+        """
+        :return float: The length of the audio (in seconds)
+        """
+        return self.sample_count / self.sample_rate if self.sample_rate else 0
+
+    @property
+    def sample_count(self) -> int:
+        """
+        :return int: The number of samples in each channel. This is exact for WAV files and estimated from the
+                     duration reported by ffprobe for other formats.
+        """
+        return self._sample_count
+
+    @property
+    def sample_rate(self) -> int:
+        """
+        :return int:
+        """
+        return self._sample_rate
+
+
+def decode_audio_file(file: str, decoder: AudioDecoders = None, memory_map: bool = None,
+                      sample_rate: int = None, channels: typing.Sequence[int] = None,
+                      start: float = None, duration: float = None) -> typing.Tuple[np.ndarray, int, int]:
+    """Decodes an audio file into raw integer samples
+    :param str file: The path to the audio file
+    :param AudioDecoders decoder: The decoder to use. If not specified, uses audio.decoder from the configuration.
+                                  If the ffmpeg decoder fails, decoding falls back to pydub.
+    :param bool memory_map: Memory map 16 and 32-bit PCM WAV/RF64 files instead of decoding them.
+                            If not specified, uses audio.memory-map from the configuration.
+    :param int sample_rate: The sample rate to resample the audio to. If not specified, uses the sample rate of the
+                            file.
+    :param typing.Sequence[int] channels: The indices of the channels to decode. If not specified, decodes all
+                                          channels.
+    :param float start: The time (in seconds) from which to decode
+    :param float duration: The length (in seconds) of audio to decode. If not specified, decodes until the end of the
+                           file.
+    :return typing.Tuple[np.ndarray, int, int]: A 2-dimensional array of audio samples with channels as rows and time
+                                                as columns, the sample rate, and the bit depth of the samples
+    """
+    memory_map = memory_map if memory_map is not None else es.cfg['audio.memory-map']
+    channels = list(channels) if channels is not None else None
+    start = start if start else None
+
+    if memory_map:
+        memory_mapped_audio = _memory_map_wav_file(file)
+
+        # Channels and time ranges are selected as views of the memory map, but resampling requires decoding
+        if memory_mapped_audio is not None and sample_rate in [None, memory_mapped_audio[1]]:
+            return _select_audio_data(*memory_mapped_audio, channels=channels, start=start, duration=duration,
+                                      file=file)
+
+    decoder = AudioDecoders(decoder if decoder is not None else es.cfg['audio.decoder'])
+
+    # Decoded samples are cached using the contents of the file so they can be memory mapped in later runs
+    cache_key = es.cache.get_key(es.cache.get_file_hash(file), 'pcm', decoder, sample_rate, channels, start,
+                                 duration) if es.cache.is_enabled() else None
+    cached_audio = es.cache.load(cache_key)
+
+    if cached_audio is not None:
+        cached_arrays, cached_meta = cached_audio
+        return cached_arrays['audio_data'], cached_meta['sample_rate'], cached_meta['bit_depth']
+
+    audio_data, bit_depth = None, None
+
+    if decoder == AudioDecoders.FFMPEG:
+        try:
+            audio_data, sample_rate, bit_depth = _decode_audio_file_ffmpeg(
+                file, sample_rate=sample_rate, channels=channels, start=start, duration=duration)
+        except Exception as e:
+            # Some files can still be handled by pydub (e.g. files ffprobe cannot report a sample format for)
+            print(f'Warning: Could not decode "{file}" with ffmpeg, decoding with pydub instead: {e}')
+
+    if audio_data is None:
+        audio_data, sample_rate, bit_depth = _select_audio_data(
+            *_decode_audio_file_pydub(file), new_sample_rate=sample_rate, channels=channels, start=start,
+            duration=duration, file=file)
+
+    es.cache.save(cache_key, {'audio_data': audio_data}, {'sample_rate': sample_rate, 'bit_depth': bit_depth})
+
+    return audio_data, sample_rate, bit_depth
+
 
-def resample_audio_data(audio_data: np.ndarray, sample_rate: int, new_sample_rate: int) -> np.ndarray:
-    """Resamples audio data to a new sample rate
+def get_resample_factors(sample_rate: int, new_sample_rate: int | float, tolerance: float = 0) -> typing.Tuple[int, int]:
+    """Returns the smallest upsampling and downsampling factors which resample audio to a new sample rate
+    :param int sample_rate: The sample rate of the audio
+    :param int | float new_sample_rate: The new sample rate
+    :param float tolerance: The maximum relative difference between the resulting sample rate and new_sample_rate.
+                            If greater than zero, the factors of the simplest ratio whose sample rate is at least
+                            new_sample_rate and within the tolerance are returned.
+    :return typing.Tuple[int, int]: The upsampling and downsampling factors. The resulting sample rate is
+                                    sample_rate * up / down.
+    """
+    return _get_resample_factors(sample_rate, fractions.Fraction(new_sample_rate).limit_denominator(), tolerance)
+
+
+def probe(file: str) -> AudioInfo:
+    """Determines the properties of an audio file without decoding it. WAV files are read from their header,
+    and all other formats use a single ffprobe call.
+    :param str file: The path to the audio file
+    :return AudioInfo:
+    """
+    if not os.path.isfile(file):
+        raise Exception(f'Error probing "{file}": File does not exist.')
+
+    header = _read_wav_header(file)
+
+    if header is not None and header['format_tag'] == _WAVE_FORMAT_PCM and header['block_align'] > 0:
+        # Report the bit depth that the samples will have once loaded (24-bit audio is stored in 32-bit integers)
+        return AudioInfo(
+            file=file,
+            sample_rate=header['sample_rate'],
+            channels=header['channels'],
+            bit_depth=16 if header['bits_per_sample'] <= 16 else 32,
+            sample_count=header['data_size'] // header['block_align'])
+
+    stream_info = _ffprobe(file)
+
+    return AudioInfo(
+        file=file,
+        sample_rate=stream_info['sample_rate'],
+        channels=stream_info['channels'],
+        bit_depth=stream_info['bit_depth'],
+        sample_count=stream_info['sample_count'])
+
+
+def resample_audio_data(audio_data: np.ndarray, sample_rate: int, new_sample_rate: int | float,
+                        tolerance: float = 0, chunk_size: int = None) -> np.ndarray:
+    """Resamples audio data to a new sample rate. Large downsampling ratios are split into cheaper stages of integer
+    decimation followed by a final polyphase stage, and each stage is processed in overlapping chunks so memory use
+    does not grow with the length of the audio.
     :param np.ndarray audio_data: A 2-dimensional array of audio samples with channels as rows and time as columns.
     :param int sample_rate: The sample rate of audio_data
-    :param int new_sample_rate: The new sample rate
-    :return np.ndarray: audio_data resampled to the specified sample rate
+    :param int | float new_sample_rate: The new sample rate
+    :param float tolerance: The maximum relative difference between the resulting sample rate and new_sample_rate
+                            to use a simpler resampling ratio (see get_resample_factors()). If zero, the audio is
+                            resampled to exactly new_sample_rate.
+    :param int chunk_size: The number of samples of each channel to resample at a time. If not specified, uses
+                           audio.resample.chunk-size from the configuration.
+    :return np.ndarray: audio_data resampled to the specified sample rate. Integer audio data is resampled to floats.
+    """
+    chunk_size = chunk_size if chunk_size is not None else es.cfg['audio.resample.chunk-size']
+    up, down = get_resample_factors(sample_rate, new_sample_rate, tolerance=tolerance)
+    dtype = np.result_type(audio_data.dtype, np.float32)
+    sample_count = math.ceil(audio_data.shape[1] * up / down)
+
+    if up == down:
+        return np.array(audio_data, dtype=dtype)
+
+    for stage_up, stage_down, stage_filter in _get_resample_stages(up, down):
+        audio_data = _resample_chunked(audio_data, stage_up, stage_down, stage_filter.astype(dtype), chunk_size)
+
+    # Each stage rounds its number of output samples up, so multiple stages may produce an extra sample
+    return audio_data[:, :sample_count]
+
+
+def _decode_audio_file_ffmpeg(file: str, sample_rate: int = None, channels: list[int] = None,
+                              start: float = None, duration: float = None) -> typing.Tuple[np.ndarray, int, int]:
+    """Decodes an audio file by streaming raw PCM from an ffmpeg subprocess directly into a preallocated array.
+    Resampling and the selection of channels and a time range are done by ffmpeg.
+    :param str file: The path to the audio file
+    :param int sample_rate: The sample rate to resample to (see decode_audio_file())
+    :param list[int] channels: The indices of the channels to decode (see decode_audio_file())
+    :param float start: The time (in seconds) from which to decode
+    :param float duration: The length (in seconds) of audio to decode
+    :return typing.Tuple[np.ndarray, int, int]: The audio samples (channels as rows), the sample rate, and the bit depth
+    """
+    stream_info = _ffprobe(file)
+
+    file_sample_rate = stream_info['sample_rate']
+    sample_rate = sample_rate if sample_rate is not None else file_sample_rate
+    bit_depth = stream_info['bit_depth']
+    dtype = np.dtype(f'<i{bit_depth // 8}')
+
+    _validate_channels(file, channels, stream_info['channels'])
+
+    # Preallocate the output using the duration reported by ffprobe. This is exact for PCM and lossless formats,
+    # but may be off by a few frames for lossy formats, in which case the buffer is grown or trimmed below.
+    length = stream_info['sample_count'] / file_sample_rate - (start or 0)
+    length = min(length, duration) if duration is not None else length
+    capacity = max(math.ceil(length * sample_rate), 1)
+
+    channels_args = []
+    if channels is not None:
+        # The pan filter maps each selected input channel to an output channel
+        channels_args = ['-af', f'pan={len(channels)}c|' +
+                         '|'.join(f'c{i}=c{channel}' for i, channel in enumerate(channels))]
+
+    channels = len(channels) if channels is not None else stream_info['channels']
+    audio_data = np.empty((channels, capacity), dtype=dtype)
+
+    # Interleaved buffer which receives each chunk read from the pipe
+    chunk = np.empty((_DECODER_CHUNK_FRAMES, channels), dtype=dtype)
+    chunk_bytes = memoryview(chunk).cast('B')
+    frame_bytes = channels * dtype.itemsize
+
+    ffmpeg_command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin',
+        *(['-ss', str(start)] if start else []),
+        *(['-t', str(duration)] if duration is not None else []),
+        '-i', file,
+        '-vn', '-map', '0:a:0',
+        *channels_args,
+        *(['-ar', str(sample_rate)] if sample_rate != file_sample_rate else []),
+        '-f', f's{bit_depth}le', '-acodec', f'pcm_s{bit_depth}le',
+        '-'
+    ]
+
+    sample_count = 0
+
+    # The output of ffmpeg is written to a temporary file rather than a pipe, since a pipe isn't read until all
+    # samples are read and ffmpeg would block once it is full (e.g. for damaged files which log many errors)
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=stderr_file) as process:
+            pending_bytes = 0
+
+            while True:
+                bytes_read = process.stdout.readinto(chunk_bytes[pending_bytes:])
+                if not bytes_read:
+                    break
+
+                pending_bytes += bytes_read
+                chunk_frames = pending_bytes // frame_bytes
+
+                if chunk_frames == 0:
+                    continue
+
+                if sample_count + chunk_frames > capacity:
+                    capacity = max(sample_count + chunk_frames, math.ceil(1.25 * capacity))
+                    audio_data = np.concatenate(
+                        (audio_data[:, :sample_count], np.empty((channels, capacity - sample_count), dtype=dtype)),
+                        axis=1)
+
+                # Deinterleave the chunk directly into the channel rows of the output
+                audio_data[:, sample_count:sample_count + chunk_frames] = chunk[:chunk_frames].T
+                sample_count += chunk_frames
+
+                # Carry over any partial frame to the start of the chunk buffer
+                remainder_bytes = pending_bytes - chunk_frames * frame_bytes
+                if remainder_bytes:
+                    chunk_bytes[:remainder_bytes] = chunk_bytes[chunk_frames * frame_bytes:pending_bytes]
+                pending_bytes = remainder_bytes
+
+        if process.returncode != 0 or sample_count == 0:
+            stderr_file.seek(0)
+            raise Exception(f'Error decoding "{file}": {stderr_file.read().decode(errors="ignore").strip()}')
+
+    if sample_count < capacity:
+        # Trimming the view keeps the samples of each channel contiguous without another copy
+        audio_data = audio_data[:, :sample_count]
+
+    return audio_data, sample_rate, bit_depth
+
+
+def _decode_audio_file_pydub(file: str) -> typing.Tuple[np.ndarray, int, int]:
+    """Decodes an audio file using pydub
+    :param str file: The path to the audio file
+    :return typing.Tuple[np.ndarray, int, int]: The audio samples (channels as rows), the sample rate, and the bit depth
+    """
+    audio_segment = pydub.AudioSegment.from_file(file)
+
+    sample_rate = audio_segment.frame_rate
+    # sample_width is the number of bytes per sample, so multiply by 8 to get bits
+    bit_depth = 8 * audio_segment.sample_width
+
+    # Convert to numpy array with each channel in its own row. Since get_array_of_samples() returns 1D
+    # interleaved vector (so [c1_1, c2_1, c1_2, c2_2, etc.]), we need to use reshape with
+    # F-contiguous ordering to get the data from each channel into its own row
+    audio_data = np.ascontiguousarray(np.array(
+        audio_segment.get_array_of_samples()).reshape((audio_segment.channels, -1), order='F'))
+
+    return audio_data, sample_rate, bit_depth
+
+
+def _ffprobe(file: str) -> dict:
+    """Reads the properties of the first audio stream of a file with a single ffprobe call
+    :param str file: The path to the audio file
+    :return dict: A dictionary with sample_rate, channels, bit_depth (of the decoded samples), sample_count (estimated
+                  from the duration), and format_name keys
+    """
+    ffprobe_command = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'stream=codec_name,sample_fmt,sample_rate,channels,duration:format=duration,format_name',
+        '-of', 'json',
+        file
+    ]
+
+    result = subprocess.run(ffprobe_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    if result.returncode != 0:
+        raise Exception(f'Error probing "{file}": {result.stderr.decode(errors="ignore").strip()}')
+
+    probe_data = json.loads(result.stdout)
+
+    if not probe_data.get('streams'):
+        raise Exception(f'Error probing "{file}": No audio stream found.')
+
+    stream = probe_data['streams'][0]
+    file_format = probe_data.get('format', {})
+
+    sample_rate = int(stream['sample_rate'])
+    channels = int(stream['channels'])
+
+    # Use the same sample widths as pydub so decoded data is normalized identically with either decoder.
+    # 24-bit audio is stored in 32-bit integers.
+    sample_format = stream.get('sample_fmt', '').rstrip('p')
+    if sample_format in ['u8', 's16'] or stream.get('codec_name') in _LOSSY_CODECS:
+        bit_depth = 16
+    elif sample_format in ['s32', 's64', 'flt', 'dbl']:
+        bit_depth = 32
+    else:
+        raise Exception(f'Error probing "{file}": Unsupported sample format "{sample_format}".')
+
+    duration = stream.get('duration', file_format.get('duration'))
+    try:
+        sample_count = round(float(duration) * sample_rate)
+    except (TypeError, ValueError):
+        sample_count = 0
+
+    return {
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'bit_depth': bit_depth,
+        'sample_count': sample_count,
+        'format_name': file_format.get('format_name')
+    }
+
+
+@functools.lru_cache
+def _get_decimation_filter(down: int, passband: fractions.Fraction) -> np.ndarray:
+    """Designs the anti-aliasing filter of an intermediate integer decimation stage. Only the passband needs to be
+    free of aliasing, since the final stage removes everything above it.
+    :param int down: The decimation factor
+    :param fractions.Fraction passband: The highest frequency to preserve (relative to the Nyquist frequency of the
+                                        input of the stage)
+    :return np.ndarray: The filter coefficients
+    """
+    # Frequencies above the stopband alias back to frequencies above the passband
+    width = 2 * (fractions.Fraction(1, down) - passband)
+    numtaps, beta = scipy.signal.kaiserord(_DECIMATION_ATTENUATION, float(width))
+
+    fir_filter = scipy.signal.firwin(numtaps | 1, 1 / down, window=('kaiser', beta))
+    fir_filter.flags.writeable = False
+
+    return fir_filter
+
+
+@functools.lru_cache
+def _get_resample_factors(sample_rate: int, new_sample_rate: fractions.Fraction,
+                          tolerance: float) -> typing.Tuple[int, int]:
+    ratio = new_sample_rate / sample_rate
+
+    if tolerance > 0:
+        # Find the smallest downsampling factor with a ratio that is not below the requested ratio
+        for down in range(1, ratio.denominator):
+            up = math.ceil(ratio * down)
+            if up <= ratio * down * (1 + tolerance):
+                return up // math.gcd(up, down), down // math.gcd(up, down)
+
+    return ratio.numerator, ratio.denominator
+
+
+@functools.lru_cache
+def _get_resample_filter(up: int, down: int) -> np.ndarray:
+    """Designs the filter of a polyphase resampling stage. This is the same filter scipy.signal.resample_poly()
+    designs by default.
+    :param int up: The upsampling factor
+    :param int down: The downsampling factor
+    :return np.ndarray: The filter coefficients
+    """
+    max_rate = max(up, down)
+
+    fir_filter = scipy.signal.firwin(2 * 10 * max_rate + 1, 1 / max_rate, window=('kaiser', 5.0))
+    fir_filter.flags.writeable = False
+
+    return fir_filter
+
+
+@functools.lru_cache
+def _get_resample_stages(up: int, down: int) -> typing.Tuple[typing.Tuple[int, int, np.ndarray], ...]:
+    """Plans the least expensive stages to resample audio by a ratio. Stages of integer decimation by factors of down
+    are used before the final polyphase stage whenever their shorter filters reduce the total number of operations.
+    :param int up: The upsampling factor
+    :param int down: The downsampling factor
+    :return typing.Tuple[typing.Tuple[int, int, np.ndarray], ...]: The upsampling factor, downsampling factor,
+                                                                      and filter of each stage
+    """
+    ratio = fractions.Fraction(up, down)
+
+    @functools.cache
+    def plan(stage_down: int, rate: fractions.Fraction) -> typing.Tuple[float, tuple]:
+        # Operations per input sample of the final polyphase stage at a rate (relative to the input rate)
+        cost = rate * (len(_get_resample_filter(up, stage_down)) + _RESAMPLE_STAGE_OVERHEAD * up) / stage_down
+        stages = ((up, stage_down, _get_resample_filter(up, stage_down)),)
+
+        for decimation in range(2, stage_down):
+            # The decimated rate must remain above the final rate so the passband is not aliased
+            if stage_down % decimation or rate / decimation <= ratio:
+                continue
+
+            decimation_filter = _get_decimation_filter(decimation, ratio / rate)
+            decimation_cost = rate * (len(decimation_filter) + _RESAMPLE_STAGE_OVERHEAD) / decimation
+            remaining_cost, remaining_stages = plan(stage_down // decimation, rate / decimation)
+
+            if decimation_cost + remaining_cost < cost:
+                cost = decimation_cost + remaining_cost
+                stages = ((1, decimation, decimation_filter),) + remaining_stages
+
+        return cost, stages
+
+    return plan(down, fractions.Fraction(1))[1]
+
+
+def _is_channel_contiguous(audio_data: np.ndarray) -> bool:
+    """Determines whether the samples of each channel (row) of audio data are contiguous in memory
+    :param np.ndarray audio_data:
+    :return bool:
+    """
+    return audio_data.ndim == 2 and (audio_data.shape[1] <= 1 or audio_data.strides[1] == audio_data.itemsize)
+
+
+def _memory_map_wav_file(file: str) -> typing.Tuple[np.ndarray, int, int] | None:
+    """Memory maps the data chunk of a 16 or 32-bit PCM WAV/RF64 file without reading or decoding it
+    :param str file: The path to the audio file
+    :return typing.Tuple[np.ndarray, int, int] | None: A read-only strided view of the audio samples (channels as rows),
+                                                       the sample rate, and the bit depth, or None if the file cannot
+                                                       be memory mapped
+    """
+    header = _read_wav_header(file)
+
+    # Only formats whose samples can be used as-is for data_raw are supported.
+    # Other formats (e.g. 24-bit, 8-bit or floating point) are decoded instead.
+    if header is None or header['format_tag'] != _WAVE_FORMAT_PCM or header['bits_per_sample'] not in [16, 32] \
+            or header['channels'] < 1 or header['block_align'] != header['channels'] * header['bits_per_sample'] // 8:
+        return None
+
+    sample_count = header['data_size'] // header['block_align']
+
+    if sample_count == 0:
+        return None
+
+    audio_data = np.memmap(file, dtype=np.dtype(f'<i{header["bits_per_sample"] // 8}'), mode='r',
+                           offset=header['data_offset'], shape=(sample_count, header['channels']))
+
+    # Transpose the interleaved samples into a view with channels as rows
+    return audio_data.T, header['sample_rate'], header['bits_per_sample']
+
+
+def _read_wav_header(file: str) -> dict | None:
+    """Reads the format and data chunk location of a WAV, RF64, or BW64 file without reading the audio data
+    :param str file: The path to the audio file
+    :return dict | None: A dictionary with format_tag, channels, sample_rate, bits_per_sample, block_align,
+                         data_offset, and data_size keys, or None if the file is not a supported WAV file
+    """
+    try:
+        file_size = os.path.getsize(file)
+
+        with open(file, 'rb') as file_handle:
+            riff_id, _, wave_id = struct.unpack('<4sI4s', file_handle.read(12))
+
+            if riff_id not in [b'RIFF', b'RF64', b'BW64'] or wave_id != b'WAVE':
+                return None
+
+            header = {}
+            data_size_64 = None
+
+            while True:
+                chunk_header = file_handle.read(8)
+                if len(chunk_header) < 8:
+                    return None
+
+                chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+                chunk_start = file_handle.tell()
+
+                if chunk_id == b'ds64':
+                    # RF64 stores the 64-bit sizes of the file and data chunk in the ds64 chunk
+                    _, data_size_64 = struct.unpack('<QQ', file_handle.read(16))
+                elif chunk_id == b'fmt ':
+                    format_tag, channels, sample_rate, _, block_align, bits_per_sample = \
+                        struct.unpack('<HHIIHH', file_handle.read(16))
+
+                    if format_tag == _WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                        # The format tag of the sub format GUID is stored in its first two bytes
+                        _, _, _, format_tag = struct.unpack('<HHIH', file_handle.read(10))
+
+                    header.update({
+                        'format_tag': format_tag,
+                        'channels': channels,
+                        'sample_rate': sample_rate,
+                        'bits_per_sample': bits_per_sample,
+                        'block_align': block_align
+                    })
+                elif chunk_id == b'data':
+                    if 'format_tag' not in header:
+                        return None
+
+                    data_size = data_size_64 if chunk_size == 0xFFFFFFFF and data_size_64 is not None else chunk_size
+                    # Don't trust data sizes which run past the end of the file (e.g. from interrupted recordings)
+                    header['data_offset'] = chunk_start
+                    header['data_size'] = min(data_size, file_size - chunk_start)
+
+                    return header
+
+                # Chunks are padded to an even number of bytes
+                file_handle.seek(chunk_start + chunk_size + (chunk_size % 2))
+    except (OSError, struct.error):
+        return None
+
+
+def _resample_chunked(audio_data: np.ndarray, up: int, down: int, fir_filter: np.ndarray,
+                      chunk_size: int) -> np.ndarray:
+    """Resamples audio data with a polyphase filter in chunks of samples. Each chunk is resampled with enough of
+    the neighboring samples to fill the filter, so the result is the same as resampling all samples at once.
+    :param np.ndarray audio_data: The audio samples (channels as rows)
+    :param int up: The upsampling factor
+    :param int down: The downsampling factor
+    :param np.ndarray fir_filter: The filter coefficients
+    :param int chunk_size: The number of samples of each channel to resample at a time
+    :return np.ndarray: The resampled audio samples with the same data type as the filter
+    """
+    sample_count = audio_data.shape[1]
+
+    # Chunks start at multiples of down so each chunk starts on an output sample
+    chunk_size = max(down, chunk_size - chunk_size % down)
+    padding = math.ceil((math.ceil(len(fir_filter) / 2 / up) + 1) / down) * down
+
+    resampled_data = np.empty((audio_data.shape[0], math.ceil(sample_count * up / down)), dtype=fir_filter.dtype)
+
+    for i_start in range(0, sample_count, chunk_size):
+        i_end = min(i_start + chunk_size, sample_count)
+        i_padded_start = max(0, i_start - padding)
+
+        chunk = scipy.signal.resample_poly(
+            audio_data[:, i_padded_start:min(i_end + padding, sample_count)].astype(fir_filter.dtype, copy=False),
+            up=up, down=down, window=fir_filter, axis=1)
+
+        # Discard the output of the padding on each side of the chunk
+        i_resampled_start = i_start * up // down
+        i_resampled_end = math.ceil(i_end * up / down) if i_end == sample_count else i_end * up // down
+        i_chunk_start = (i_start - i_padded_start) * up // down
+
+        resampled_data[:, i_resampled_start:i_resampled_end] = \
+            chunk[:, i_chunk_start:i_chunk_start + i_resampled_end - i_resampled_start]
+
+    return resampled_data
+
+
+def _select_audio_data(audio_data: np.ndarray, sample_rate: int, bit_depth: int, new_sample_rate: int = None,
+                       channels: list[int] = None, start: float = None, duration: float = None,
+                       file: str = None) -> typing.Tuple[np.ndarray, int, int]:
+    """Selects channels and a time range of raw audio data and resamples it. This is used for audio data which was
+    not decoded by ffmpeg (i.e. memory-mapped files, the pydub decoder, or audio which was not loaded from a file).
+    :param np.ndarray audio_data: The raw audio samples (channels as rows)
+    :param int sample_rate: The sample rate of audio_data
+    :param int bit_depth: The bit depth of audio_data
+    :param int new_sample_rate: The sample rate to resample to. If not specified, the audio data is not resampled.
+    :param list[int] channels: The indices of the channels to select. If not specified, selects all channels.
+    :param float start: The time (in seconds) from which to select
+    :param float duration: The length (in seconds) of audio to select
+    :param str file: The path to the audio file (for error messages)
+    :return typing.Tuple[np.ndarray, int, int]: The selected audio samples (channels as rows), the sample rate,
+                                                and the bit depth
     """
-    lcm = math.lcm(sample_rate, new_sample_rate)
+    _validate_channels(file, channels, audio_data.shape[0])
+
+    if start or duration is not None:
+        i_start = max(0, math.floor((start or 0) * sample_rate))
+        i_end = i_start + math.floor(duration * sample_rate) if duration is not None else None
+        audio_data = audio_data[:, i_start:i_end]
+
+    if channels is not None:
+        # Selecting channels after the time range only copies the selected samples
+        audio_data = np.ascontiguousarray(audio_data[channels])
+
+    if new_sample_rate is not None and new_sample_rate != sample_rate:
+        sample_max = 2 ** (bit_depth - 1)
+        audio_data = np.clip(np.rint(resample_audio_data(audio_data, sample_rate, new_sample_rate)),
+                             -sample_max, sample_max - 1).astype(audio_data.dtype)
+        sample_rate = new_sample_rate
+
+    return audio_data, sample_rate, bit_depth
+
+
+def _validate_channels(file: str | None, channels: list[int] | None, channel_count: int) -> None:
+    """Raises an exception if any of the selected channels do not exist in audio with a number of channels
+    :param str | None file: The path to the audio file (for error messages)
+    :param list[int] | None channels: The indices of the selected channels
+    :param int channel_count: The number of channels in the audio
+    :return None:
+    """
+    if channels is None:
+        return
+
+    invalid_channels = [channel for channel in channels if not 0 <= channel < channel_count]
 
-    return np.ascontiguousarray(
-        scipy.signal.resample_poly(audio_data, up=lcm / sample_rate, down=lcm / new_sample_rate, axis=1))
+    if not channels or invalid_channels:
+        raise Exception(f'Error decoding "{file}": Invalid channel selection {channels} for audio with '
+                        f'{channel_count} channel(s).')
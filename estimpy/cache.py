@@ -0,0 +1,232 @@
+"""A module to cache decoded audio and analysis results on disk"""
+import hashlib
+import json
+import os
+import shutil
+import typing
+
+import estimpy as es
+import numpy as np
+
+# Size of the blocks used to read files when hashing their contents
+_HASH_BLOCK_SIZE = 1 << 20
+
+_ENTRIES_DIR = 'entries'
+_HASHES_DIR = 'hashes'
+_META_FILE = 'meta.json'
+
+# Configuration options which change the results of the analysis. Options which only change how the analysis is run
+# (e.g. analysis.processes, analysis.spectrogram.workers and analysis.spectrogram.memory-max) are excluded so the same
+# results are found however they were calculated.
+_ANALYSIS_CONFIG_KEYS = [
+    'analysis.window-size',
+    'analysis.window-overlap',
+    'analysis.spectrogram.frequency-min',
+    'analysis.spectrogram.frequency-max',
+    'analysis.spectrogram.frequency-max-method',
+    'analysis.spectrogram.frequency-max-padding-factor',
+    'analysis.spectrogram.nfft',
+    'analysis.spectrogram.quantization',
+    'analysis.spectrogram.window-function',
+    # The decoder may change the samples of lossy formats
+    'audio.decoder',
+    # The tolerance changes the sample rate to which audio is resampled for spectrograms
+    'audio.resample.tolerance'
+]
+
+
+def evict(size_max: float = None) -> None:
+    """Removes the least recently used entries from the cache until it does not exceed a maximum size
+    :param float size_max: The maximum size of the cache (in megabytes). If not specified, uses cache.size-max from the
+                           configuration.
+    :return None:
+    """
+    size_max = size_max if size_max is not None else es.cfg['cache.size-max']
+    entries_path = os.path.join(get_cache_path(), _ENTRIES_DIR)
+
+    if size_max is None or not os.path.isdir(entries_path):
+        return
+
+    entries = []
+    cache_size = 0
+
+    for entry_name in os.listdir(entries_path):
+        entry_path = os.path.join(entries_path, entry_name)
+        meta_file = os.path.join(entry_path, _META_FILE)
+
+        if not os.path.isfile(meta_file):
+            continue
+
+        entry_size = sum(entry.stat().st_size for entry in os.scandir(entry_path) if entry.is_file())
+        entries.append((os.path.getmtime(meta_file), entry_size, entry_path))
+        cache_size += entry_size
+
+    # Remove the least recently used entries first
+    for _, entry_size, entry_path in sorted(entries):
+        if cache_size <= size_max * 2 ** 20:
+            break
+
+        shutil.rmtree(entry_path, ignore_errors=True)
+        cache_size -= entry_size
+
+
+def get_analysis_key(es_audio: es.audio.Audio, name: str, **params: typing.Any) -> str | None:
+    """Returns the cache key for an analysis result of audio. The key includes the configuration options which change
+    the result of the analysis, but not those which only change how it is run (e.g. the number of processes).
+    :param es.audio.Audio es_audio: The audio which is analyzed
+    :param str name: The name of the analysis (e.g. envelope or spectrogram)
+    :param typing.Any params: Any additional parameters which affect the result of the analysis
+    :return str | None: The cache key, or None if the cache is disabled or the audio cannot be cached
+    """
+    audio_key = get_audio_key(es_audio)
+
+    if audio_key is None:
+        return None
+
+    analysis_cfg = {key: es.cfg[key] for key in _ANALYSIS_CONFIG_KEYS}
+
+    # The data types of analysis results follow the data type of the normalized audio data
+    return get_key(audio_key, name, es_audio.dtype.str, params, analysis_cfg)
+
+
+def get_audio_key(es_audio: es.audio.Audio) -> str | None:
+    """Returns the cache key which identifies the audio data of an instance, including the time range of slices
+    :param es.audio.Audio es_audio:
+    :return str | None: The cache key, or None if the cache is disabled or the audio was not loaded from a file
+    """
+    if not is_enabled() or es_audio is None or es_audio.file is None or not os.path.isfile(es_audio.file):
+        return None
+
+    return get_key(get_file_hash(es_audio.file), es_audio.time_offset, es_audio.sample_count,
+                   es_audio.sample_rate, es_audio.channels, es_audio.source_channels, es_audio.bit_depth)
+
+
+def get_cache_path() -> str:
+    """
+    :return str: The directory in which cached data is stored
+    """
+    return es.cfg['cache.path'] if es.cfg['cache.path'] is not None else \
+        es.utils.get_temp_file_path('estimpy-cache')
+
+
+def get_file_hash(file: str) -> str:
+    """Returns a hash of the contents of a file. Hashes are remembered using the path, size and modification time of
+    the file so the contents of unchanged files are only read once.
+    :param str file:
+    :return str:
+    """
+    file = os.path.abspath(file)
+    file_stat = os.stat(file)
+    file_signature = {'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns}
+
+    hash_file = os.path.join(get_cache_path(), _HASHES_DIR, f'{get_key(file)}.json')
+
+    try:
+        with open(hash_file, 'r') as file_handle:
+            hash_data = json.load(file_handle)
+
+        if hash_data['signature'] == file_signature:
+            return hash_data['hash']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    file_hash = hashlib.blake2b(digest_size=20)
+
+    with open(file, 'rb') as file_handle:
+        while block := file_handle.read(_HASH_BLOCK_SIZE):
+            file_hash.update(block)
+
+    hash_data = {'signature': file_signature, 'hash': file_hash.hexdigest()}
+
+    os.makedirs(os.path.dirname(hash_file), exist_ok=True)
+    with open(hash_file, 'w') as file_handle:
+        json.dump(hash_data, file_handle)
+
+    return hash_data['hash']
+
+
+def get_key(*parts: typing.Any) -> str:
+    """Returns a cache key for any number of JSON serializable parts
+    :param typing.Any parts:
+    :return str:
+    """
+    return hashlib.blake2b(json.dumps(parts, sort_keys=True, default=_json_default).encode(),
+                           digest_size=20).hexdigest()
+
+
+def is_enabled() -> bool:
+    """
+    :return bool: Whether the cache is enabled
+    """
+    return bool(es.cfg['cache.enabled'])
+
+
+def load(key: str | None) -> typing.Tuple[typing.Dict[str, np.ndarray], dict] | None:
+    """Loads an entry from the cache. Arrays are memory mapped rather than read into memory.
+    :param str | None key: The cache key of the entry
+    :return typing.Tuple[typing.Dict[str, np.ndarray], dict] | None: A dictionary of the arrays of the entry and the
+                                                                      metadata of the entry, or None if the entry is
+                                                                      not cached
+    """
+    if key is None or not is_enabled():
+        return None
+
+    entry_path = _get_entry_path(key)
+    meta_file = os.path.join(entry_path, _META_FILE)
+
+    try:
+        with open(meta_file, 'r') as file_handle:
+            meta = json.load(file_handle)
+
+        arrays = {name: np.load(os.path.join(entry_path, f'{name}.npy'), mmap_mode='r') for name in meta['arrays']}
+
+        # Update the modification time of the entry to track when it was last used
+        os.utime(meta_file)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return arrays, meta['meta']
+
+
+def save(key: str | None, arrays: typing.Dict[str, np.ndarray], meta: dict = None) -> None:
+    """Saves an entry to the cache, then removes the least recently used entries if the cache exceeds its maximum size
+    :param str | None key: The cache key of the entry
+    :param typing.Dict[str, np.ndarray] arrays: The arrays to store in the entry
+    :param dict meta: JSON serializable metadata to store with the entry
+    :return None:
+    """
+    if key is None or not is_enabled():
+        return
+
+    entry_path = _get_entry_path(key)
+    entry_path_temp = f'{entry_path}.{os.getpid()}.tmp'
+
+    try:
+        os.makedirs(entry_path_temp, exist_ok=True)
+
+        for name, array in arrays.items():
+            np.save(os.path.join(entry_path_temp, f'{name}.npy'), array)
+
+        with open(os.path.join(entry_path_temp, _META_FILE), 'w') as file_handle:
+            json.dump({'arrays': list(arrays.keys()), 'meta': meta if meta is not None else {}}, file_handle,
+                      default=_json_default)
+
+        # Entries are written to a temporary directory and renamed so partially written entries are never loaded
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path, ignore_errors=True)
+        os.replace(entry_path_temp, entry_path)
+    except OSError as e:
+        print(f'Warning: Could not save cache entry: {e}')
+        shutil.rmtree(entry_path_temp, ignore_errors=True)
+        return
+
+    evict()
+
+
+def _get_entry_path(key: str) -> str:
+    return os.path.join(get_cache_path(), _ENTRIES_DIR, key)
+
+
+def _json_default(value: typing.Any) -> typing.Any:
+    # Convert numpy scalars to their python equivalents so their types are preserved when loaded
+    return value.item() if isinstance(value, np.generic) else str(value)
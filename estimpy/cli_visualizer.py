@@ -9,12 +9,20 @@ Usage:
 """
 
 import argparse
+import concurrent.futures
+import contextlib
+import io
 import logging
+import multiprocessing
+import os
 import sys
+import tempfile
 import tkinter as tk
 import tkinter.filedialog
 
 import estimpy as es
+import matplotlib
+import tqdm
 
 
 def main():
@@ -41,8 +49,14 @@ def main():
     parser.add_argument('-y', '--yes', action='store_true',
                         help='Answers yes to all interactive prompts (overwrites existing output files by default).')
 
+    parser.add_argument('-j', '--jobs', default=1, type=int,
+                        help='Number of files to process in parallel. Only relevant for the write-image, write-metadata, and write-video actions. Output of each file is shown when it is complete, and existing output files are skipped unless --yes is specified.')
+
     args = vars(parser.parse_args())
 
+    if args['jobs'] < 1:
+        parser.error(f'argument -j/--jobs: must be at least 1 (got {args["jobs"]})')
+
     es.utils.handle_parser_arguments(args)
 
     input_files = args['input_files']
@@ -71,29 +85,173 @@ def main():
     # Get list of input files
     files = es.utils.get_file_list(file_patterns=input_files)
 
-    # Main loop
+    # Probe all files before loading any of them to skip invalid files and plan the work
+    file_infos = {}
     for file in files:
-        spinner = es.utils.Spinner(f'Loading file {file}... ')
-        es_audio = es.audio.Audio(file=file)
-        spinner.stop()
+        try:
+            file_infos[file] = es.audio.probe(file)
+        except Exception as e:
+            print(e)
+
+    files = [file for file in files if file in file_infos]
+
+    if actions['write-video'] and files:
+        video_length_total = sum(es.export.get_video_length(file_info.length) for file_info in file_infos.values())
+        video_segments_total = sum(len(es.export.get_video_segment_ids(file_info.length))
+                                   for file_info in file_infos.values())
+        print(f'Writing {es.utils.seconds_to_string(video_length_total)} of video in {video_segments_total} '
+              f'segment(s) from {len(files)} file(s).')
+
+    # Only the write actions can be processed in parallel (and only if there is more than one file)
+    write_actions = {action_name: action for action_name, action in actions.items() if action_name != 'show-image'}
+    jobs = min(args['jobs'], len(files)) if any(write_actions.values()) else 1
+
+    if jobs > 1:
+        _process_files_parallel(files=files, file_infos=file_infos, actions=write_actions, jobs=jobs,
+                                resume_frame=resume_frame, resume_segment=resume_segment)
+
+        # Images are shown after all other actions are complete since they can't be shown in worker processes
+        actions = {'show-image': actions['show-image']}
+
+    if jobs == 1 or actions['show-image']:
+        # Main loop
+        for file in files:
+            _process_file(file=file, file_info=file_infos[file], actions=actions,
+                          resume_frame=resume_frame, resume_segment=resume_segment)
+
+
+def _initialize_worker(cfg: dict) -> None:
+    logging.getLogger().setLevel(logging.ERROR)
+
+    # Worker processes are headless, so use a non-interactive backend
+    matplotlib.use('Agg')
+
+    # Use the configuration of the main process (including options set from the command line),
+    # then regenerate the derived configuration values
+    es.cfg.update(cfg)
+    es.trigger_event('config.updated')
+
+    # Workers can't prompt, so existing output files are skipped unless overwriting by default
+    es.cfg['files.output.overwrite-prompt'] = False
+
+
+def _process_file(file: str, file_info: es.audio.AudioInfo, actions: dict,
+                  resume_frame: int = None, resume_segment: int = None) -> bool:
+    """Loads a file and performs actions with it
+    :param str file: The path to the audio file
+    :param es.audio.AudioInfo file_info: The probed properties of the file
+    :param dict actions: Whether to perform each action
+    :param int resume_frame: The frame on which to resume video encoding
+    :param int resume_segment: The segment on which to resume video encoding
+    :return bool: Whether all actions succeeded
+    """
+    # If only a video is written, only the audio which will be encoded in the video needs to be decoded
+    video_length = es.export.get_video_length(file_info.length)
+    duration = video_length if actions.get('write-video') and video_length < file_info.length and \
+        not any(action for action_name, action in actions.items() if action_name != 'write-video') else None
+
+    spinner = es.utils.Spinner(f'Loading file {file}... ')
+    es_audio = es.audio.Audio(file=file, duration=duration)
+    spinner.stop()
+
+    image_file = None
 
-        image_file = None
+    try:
+        if actions.get('write-image'):
+            image_file = es.export.write_image(es_audio=es_audio)
+
+        if actions.get('write-metadata'):
+            es.metadata.write_metadata(es_audio=es_audio, image_file=image_file)
+
+        if actions.get('write-video'):
+            es.export.write_video(es_audio=es_audio, image_file=image_file,
+                frame_start=resume_frame, segment_start=resume_segment)
+
+        if actions.get('show-image'):
+            es.visualization.show_image(es_audio=es_audio)
+    except Exception as e:
+        print(e)
+        return False
+
+    return True
+
+
+def _process_file_worker(file: str, file_info: es.audio.AudioInfo, actions: dict,
+                         resume_frame: int = None, resume_segment: int = None) -> tuple[bool, str]:
+    """Processes a file in a worker process (see _process_file()) and collects its output
+    :return tuple[bool, str]: Whether all actions succeeded and the output of processing the file
+    """
+    output = io.StringIO()
+
+    # Subprocesses (e.g. ffmpeg) write to the standard error of the process rather than sys.stderr, so it is redirected
+    # to a temporary file while the file is processed. Their output is collected with the output of the file instead
+    # of being written over the progress bar of the main process.
+    with tempfile.TemporaryFile() as stderr_file:
+        stderr_fd = os.dup(2)
+        os.dup2(stderr_file.fileno(), 2)
 
         try:
-            if actions['write-image']:
-                image_file = es.export.write_image(es_audio=es_audio)
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                try:
+                    success = _process_file(file=file, file_info=file_info, actions=actions,
+                                            resume_frame=resume_frame, resume_segment=resume_segment)
+                except Exception as e:
+                    print(e)
+                    success = False
+        finally:
+            os.dup2(stderr_fd, 2)
+            os.close(stderr_fd)
 
-            if actions['write-metadata']:
-                es.metadata.write_metadata(es_audio=es_audio, image_file=image_file)
+        stderr_file.seek(0)
+        output.write(stderr_file.read().decode(errors='ignore'))
 
-            if actions['write-video']:
-                es.export.write_video(es_audio=es_audio, image_file=image_file,
-                    frame_start=resume_frame, segment_start=resume_segment)
+    return success, output.getvalue()
 
-            if actions['show-image']:
-                es.visualization.show_image(es_audio=es_audio)
-        except Exception as e:
-            print(e)
+
+def _process_files_parallel(files: list, file_infos: dict, actions: dict, jobs: int,
+                            resume_frame: int = None, resume_segment: int = None) -> None:
+    """Processes files in a pool of worker processes. The output of each file is shown when it is complete,
+    with a single progress bar for all files.
+    """
+    failed_files = []
+
+    # Only pass the configuration options which are not derived (derived values may not be picklable)
+    cfg = {key: es.cfg[key] for key in es.base_cfg}
+
+    # Share the CPUs between the workers rather than having each one use all of them. The analysis and video export
+    # of each file run one after another, and each divides its threads between its own processes, so limiting the
+    # processes and threads of each to its share of the CPUs limits the total of all jobs to the number of CPUs.
+    job_cpus = max(1, (os.cpu_count() or 1) // jobs)
+
+    for key in ['analysis.spectrogram.workers', 'analysis.processes', 'visualization.video.export.processes']:
+        cfg[key] = job_cpus if cfg[key] is None else min(cfg[key], job_cpus)
+
+    # Spawn workers so they don't inherit the state of the GUI backend or any threads of the main process
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_initialize_worker, initargs=(cfg,)) as executor:
+        futures = {executor.submit(_process_file_worker, file, file_infos[file], actions,
+                                   resume_frame, resume_segment): file for file in files}
+
+        with tqdm.tqdm(total=len(files), desc=f'Processing files ({jobs} jobs)', unit='file') as progress_bar:
+            for future in concurrent.futures.as_completed(futures):
+                file = futures[future]
+
+                try:
+                    success, output = future.result()
+                except Exception as e:
+                    # The worker process failed (e.g. it ran out of memory)
+                    success, output = False, f'{e}\n'
+
+                if not success:
+                    failed_files.append(file)
+
+                progress_bar.write(f'[{file}]\n{output.rstrip()}\n')
+                progress_bar.update()
+
+    print(f'Processed {len(files) - len(failed_files)}/{len(files)} file(s) successfully.')
+
+    for file in sorted(failed_files):
+        print(f'Failed: {file}')
 
 
 if __name__ == '__main__':
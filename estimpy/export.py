@@ -1,10 +1,14 @@
+import concurrent.futures
 import datetime
+import logging
 import math
+import multiprocessing
 
 import matplotlib
 import matplotlib.pyplot
 import os
 import subprocess
+import tempfile
 import time
 import tqdm
 
@@ -12,6 +16,48 @@ import estimpy as es
 
 _DPI = 8
 
+# Number of seconds between updates of the progress of segments encoded in worker processes
+_SEGMENT_PROGRESS_INTERVAL = 0.5
+
+# Arguments of _write_video_segment() which are the same for all segments, in a worker process of
+# _write_video_segments_parallel() (see _initialize_video_worker())
+_video_worker_segment_args = {}  # type: dict
+
+
+def get_video_length(length: float) -> float:
+    """Returns the length of the video which is encoded for audio of a given length
+    :param float length: The length of the audio (in seconds), e.g. from es.audio.probe() before the audio is loaded
+    :return float: The length of the video (in seconds), limited by visualization.video.export.video-length-max
+    """
+    return float(es.cfg['visualization.video.export.video-length-max']) if \
+        es.cfg['visualization.video.export.video-length-max'] is not None else length
+
+
+def get_video_segment_ids(length: float) -> list:
+    """Returns the ids of the segments which are encoded for a video of audio of a given length
+    :param float length: The length of the audio (in seconds), e.g. from es.audio.probe() before the audio is loaded
+    :return list: The segment ids in the order they are encoded ('preview' followed by numbered segments)
+    """
+    fps = es.cfg['visualization.video.export.fps']
+    seconds_total = get_video_length(length)
+    frames_total = math.floor(seconds_total * fps)
+    frames_per_segment = es.cfg['visualization.video.export.segment-length'] * fps
+
+    video_segment_ids = []
+
+    if es.cfg['visualization.video.export.preview.enabled']:
+        video_segment_ids.append('preview')
+        preview_frames = min(es.cfg['visualization.video.export.preview.length'], seconds_total) * fps
+    else:
+        preview_frames = 0
+
+    # Create segment ids for all remaining segments (without an empty segment if the frames after the preview are
+    # an exact multiple of the segment length)
+    video_segment_ids.extend(
+        [str(i) for i in range(1, math.ceil((frames_total - preview_frames) / frames_per_segment) + 1)])
+
+    return video_segment_ids
+
 
 def write_image(es_audio: es.audio.Audio, output_path: str = None, image_format: str = None,
                 width: int = None, height: int = None, overwrite: bool = None) -> str | None:
@@ -84,8 +130,11 @@ def write_video(es_audio: es.audio.Audio, output_path: str = None, video_format:
     image_format = es.cfg['visualization.image.export.format']
 
     # Set the total length of the video
-    seconds_total = float(es.cfg['visualization.video.export.video-length-max']) if \
-        es.cfg['visualization.video.export.video-length-max'] is not None else es_audio.length
+    seconds_total = get_video_length(es_audio.length)
+
+    # Only the part of the audio which will be encoded needs to be analyzed and rendered.
+    # The slice shares the audio buffers, so no audio data is copied.
+    es_audio_video = es_audio.slice(end=seconds_total) if seconds_total < es_audio.length else es_audio
 
     # Set the total number of frames
     frames_total = math.floor(seconds_total * es.cfg['visualization.video.export.fps'])
@@ -103,15 +152,15 @@ def write_video(es_audio: es.audio.Audio, output_path: str = None, video_format:
         segment_start = max(math.floor((frame_start - preview_frames) / frames_per_segment) + 1, 1)
 
     # Generate list of video segments
-    video_segment_ids = []
-
-    if es.cfg['visualization.video.export.preview.enabled']:
-        video_segment_ids.append('preview')
-
-    # Create segment ids for all remaining segments
-    numeric_video_segments = [str(i) for i in range(1, math.floor((frames_total - preview_frames) / frames_per_segment) + 2)]
-    numeric_segments_total = len(numeric_video_segments)
-    video_segment_ids.extend(numeric_video_segments)
+    video_segment_ids = get_video_segment_ids(es_audio.length)
+    numeric_segments_total = len([video_segment_id for video_segment_id in video_segment_ids
+                                  if video_segment_id != 'preview'])
+
+    # Resuming from a segment after the last one would otherwise write the video from only the segments before it
+    if segment_start > 1 and segment_start > numeric_segments_total:
+        print(f'Error: Could not resume writing video, segment {segment_start} is after the last segment '
+              f'({numeric_segments_total}).')
+        return None
 
     # Get the total number of video segments
     segments_total = len(video_segment_ids)
@@ -176,19 +225,28 @@ def write_video(es_audio: es.audio.Audio, output_path: str = None, video_format:
                 if arg_value != '':
                     ffmpeg_extra_args.append(str(arg_value))
 
-    # Store start time of encoding
-    encoding_time_start = time.time()
+    # Run the analysis which is needed to render the video once, rather than for each segment
+    spinner = es.utils.Spinner(f'Analyzing audio for video visualization... ')
+    analysis_results = es.analysis.analyze(
+        es_audio=es_audio_video,
+        stages=[es.analysis.AnalysisStages.ENVELOPE_PYRAMID, es.analysis.AnalysisStages.SPECTROGRAM])
+    envelope_pyramid = analysis_results[es.analysis.AnalysisStages.ENVELOPE_PYRAMID]
+    spectrogram = analysis_results[es.analysis.AnalysisStages.SPECTROGRAM]
+    del analysis_results
+    spinner.stop()
 
-    # Create animation
-    for video_segment_id in video_segment_ids:
-        #segment_time_start = time.time()
+    preview_image_file = None
+
+    # Determine the frames of each segment
+    video_segments = []
 
+    for video_segment_id in video_segment_ids:
         if video_segment_id == 'preview':
             print(f'Creating video preview image...')
 
             # Generate preview image file
             preview_image_file = write_image(
-                es_audio=es_audio,
+                es_audio=es_audio_video,
                 output_path=es.utils.get_temp_file_path(
                     temp_file_name=f'{video_file_base}-videopreview.{image_format}'
                 ),
@@ -225,96 +283,69 @@ def write_video(es_audio: es.audio.Audio, output_path: str = None, video_format:
             # Define the segment number and label to use for the progress bar
             segment_label = f'Segment {video_segment_number}/{numeric_segments_total}'
 
-        spinner = es.utils.Spinner(f'Preparing video visualization for {segment_label.lower()}... ')
+        video_segments.append((video_segment_id, segment_frame_start, frame_count, segment_label))
 
-        visualization = es.visualization.VideoVisualization(
-            es_audio=es_audio,
-            fps=fps,
-            frames=range(segment_frame_start, segment_frame_start + frame_count))
+    # Arguments to render and encode each segment
+    segment_args = {
+        'video_file_base': video_file_base,
+        'video_format': video_format,
+        'fps': fps,
+        'width': width,
+        'height': height,
+        'ffmpeg_extra_args': ffmpeg_extra_args,
+        'preview_image_file': preview_image_file,
+        'preview_seconds': preview_seconds,
+        'fade_seconds': fade_seconds
+    }
 
-        visualization.make_figure()
-        visualization.resize_figure(width=width, height=height, dpi=_DPI)
-        spinner.stop()
+    processes = es.cfg['visualization.video.export.processes']
 
-        # Get temporary file name to use during encoding
-        # This is necessary to ensure proper handling of resuming if encoding is stopped or crashes
-        video_segment_encoding_file = es.utils.get_temp_file_path(
-            temp_file_name=f'{video_file_base}_{video_segment_id}-encoding.{video_format}'
-        )
-        # Get file name to use for segment once encoding is complete (still a temporary file)
-        video_segment_file = es.utils.get_temp_file_path(
-            temp_file_name=f'{video_file_base}_{video_segment_id}.{video_format}'
-        )
+    if processes is None:
+        processes = os.cpu_count() or 1
 
-        segment_length = frame_count * es.cfg["visualization.video.export.fps"]
-
-        # The last frame of the segment must be a keyframe to allow concatenation without re-encoding
-        ffmpeg_keyframe_args = [
-            '-force_key_frames',
-            f'expr:gte(t,{segment_length - 1 / es.cfg["visualization.video.export.fps"]})'
-        ]
+    processes = min(processes, len(video_segments))
 
-        # Initialize progress bar
-        frames_progress_bar = tqdm.tqdm(total=frame_count, desc=segment_label, unit='frame')
+    # Store start time of encoding
+    encoding_time_start = time.time()
 
-        def progress_callback(i, n):
-            frames_progress_bar.update(i - frames_progress_bar.n)  # Update based on the difference from the current count
+    if processes > 1:
+        encoded_segment_files = _write_video_segments_parallel(
+            es_audio=es_audio_video, video_segments=video_segments, processes=processes,
+            envelope_pyramid=envelope_pyramid, spectrogram=spectrogram, segment_args=segment_args)
 
-        visualization.animation.save(
-            video_segment_encoding_file,
-            writer='ffmpeg',
-            fps=es.cfg['visualization.video.export.fps'],
-            codec=es.cfg['visualization.video.export.codec'],
-            extra_args=ffmpeg_extra_args + ffmpeg_keyframe_args,
-            progress_callback=progress_callback)
+        for video_segment_file in encoded_segment_files:
+            video_segment_files.append(video_segment_file)
+            es.utils.add_temp_file(video_segment_file)
 
-        # Update the progress bar for the last frame since the callback is not called when save() completes.
-        frames_progress_bar.update(1)
-        frames_progress_bar.close()
+        encoded_frames = sum(frame_count for _, _, frame_count, _ in video_segments)
+        print(f'{encoded_frames} frames encoded in {es.utils.seconds_to_string(time.time() - encoding_time_start)}.')
+    else:
+        for video_segment_id, segment_frame_start, frame_count, segment_label in video_segments:
+            # Initialize progress bar (disabled if the output is not a terminal, e.g. when processing files in parallel)
+            frames_progress_bar = tqdm.tqdm(total=frame_count, desc=segment_label, unit='frame', disable=None)
+            segment_encoding_time_start = time.time()
 
-        # Move the temporary encoding file to the segment file name
-        if os.path.exists(video_segment_file):
-            os.remove(video_segment_file)
-        os.rename(video_segment_encoding_file, video_segment_file)
+            def progress_callback(i, n):
+                frames_progress_bar.update(i - frames_progress_bar.n)  # Update based on the difference from the current count
 
-        encoded_frames = segment_frame_start + frame_count
-        encoded_time = time.time() - encoding_time_start
-        encoding_fps = frame_count / (time.time() - frames_progress_bar.start_t)
-        estimated_time_remaining = (frames_total - encoded_frames) / encoding_fps
+            video_segment_file = _write_video_segment(
+                es_audio=es_audio_video, video_segment_id=video_segment_id, segment_frame_start=segment_frame_start,
+                frame_count=frame_count, envelope_pyramid=envelope_pyramid, spectrogram=spectrogram,
+                progress_callback=progress_callback, **segment_args)
 
-        print(f'{encoded_frames}/{frames_total} frames encoded in {es.utils.seconds_to_string(encoded_time)}. Estimated time remaining: {es.utils.seconds_to_string(seconds=estimated_time_remaining)}')
+            # Update the progress bar for the last frame since the callback is not called when the segment is complete.
+            frames_progress_bar.update(1)
+            frames_progress_bar.close()
 
-        video_segment_files.append(video_segment_file)
-        es.utils.add_temp_file(video_segment_file)
+            encoded_frames = segment_frame_start + frame_count
+            encoded_time = time.time() - encoding_time_start
+            encoding_fps = frame_count / (time.time() - segment_encoding_time_start)
+            estimated_time_remaining = (frames_total - encoded_frames) / encoding_fps
 
-        # Additional processing for preview segment
-        if video_segment_id == 'preview':
-            video_file_temp_with_preview = es.utils.get_temp_file_path(
-                temp_file_name=f'{video_file_base}_{video_segment_id}-withfade.{video_format}'
-            )
+            print(f'{encoded_frames}/{frames_total} frames encoded in {es.utils.seconds_to_string(encoded_time)}. Estimated time remaining: {es.utils.seconds_to_string(seconds=estimated_time_remaining)}')
 
-            ffmpeg_command = [
-                'ffmpeg',
-                '-i', video_segment_file,
-                '-loop', '1', '-t', str(preview_seconds), '-i', preview_image_file,
-                '-filter_complex',
-                f'[1:v]fade=t=out:st={preview_seconds - fade_seconds}:d={fade_seconds}:alpha=1[faded]; '
-                f'[0:v][faded]overlay=0:0:enable=\'between(t,0,{preview_seconds})\'[output]',
-                '-map', '[output]',
-                '-r', str(es.cfg['visualization.video.export.fps']),
-                '-c:v', es.cfg['visualization.video.export.codec'],
-                *(ffmpeg_extra_args + ffmpeg_keyframe_args),
-                video_file_temp_with_preview
-            ]
-
-            # Debug print for constructed command
-            #print("FFmpeg command:", ' '.join(ffmpeg_command))
-
-            # Add the preview image using ffmpeg
-            subprocess.run(ffmpeg_command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-            # Replace the first segment with the updated version
-            os.replace(src=video_file_temp_with_preview, dst=video_segment_file)
+            video_segment_files.append(video_segment_file)
+            es.utils.add_temp_file(video_segment_file)
 
     # Prepare final video file
 
@@ -338,12 +369,17 @@ def write_video(es_audio: es.audio.Audio, output_path: str = None, video_format:
 
     # Only apply length arguments if the desired duration is shorter than the total audio file.
     # This could avoid rounding errors with the argument potentially resulting in unintended truncation of the audio
-    length_args = [] if seconds_total == es_audio.length else ['-t', str(seconds_total)]
+    length_args = [] if seconds_total == es_audio.length and not es_audio.is_partial() else \
+        ['-t', str(seconds_total)]
+
+    # If only part of the file was loaded, start the audio track at the same time as the visualization
+    offset_args = ['-ss', str(es_audio.time_offset)] if es_audio.time_offset > 0 else []
 
     ffmpeg_command = [
         'ffmpeg',
         '-f', 'concat', '-safe', '0',  # "-safe 0" allows for absolute paths to files
         '-i', video_segment_list_file,
+        *offset_args,
         '-i', es_audio.file,
         '-c:v', concat_video_codec,
         '-c:a', 'copy', '-strict', '-1',  # "-strict -1" allows for non-standard sample rates
@@ -368,7 +404,9 @@ def write_video(es_audio: es.audio.Audio, output_path: str = None, video_format:
     # Render an image to use as album art in the video metadata
     if image_file is None:
         print(f'Creating album art image... ')
-        image_file = write_image(es_audio=es_audio, output_path=es.utils.get_temp_file_path())
+        # The album art is of the whole file, even if only part of it was loaded for the video
+        es_audio_image = es.audio.Audio(file=es_audio.file) if es_audio.is_partial() and es_audio.file else es_audio
+        image_file = write_image(es_audio=es_audio_image, output_path=es.utils.get_temp_file_path())
         es.utils.add_temp_file(image_file)
     image_data = open(image_file, 'rb').read()
 
@@ -386,3 +424,296 @@ def write_video(es_audio: es.audio.Audio, output_path: str = None, video_format:
     print()
 
     return video_file
+
+
+def _initialize_video_worker(cfg: dict, segment_args: dict) -> None:
+    """Initializes a worker process of _write_video_segments_parallel()
+    :param dict cfg: The configuration of the main process
+    :param dict segment_args: The arguments of _write_video_segment() which are the same for all segments (e.g. the
+                              audio and its analysis), so they are only passed to each worker once
+    :return None:
+    """
+    global _video_worker_segment_args
+
+    logging.getLogger().setLevel(logging.ERROR)
+
+    # Worker processes are headless, so use a non-interactive backend
+    matplotlib.use('Agg')
+
+    # Use the configuration of the main process, then regenerate the derived configuration values
+    es.cfg.update(cfg)
+    es.trigger_event('config.updated')
+
+    _video_worker_segment_args = segment_args
+
+
+def _write_video_frames(visualization: es.visualization.VideoVisualization, video_file: str, fps: float, codec: str,
+                        extra_args: list = None, renderer: es.visualization.VideoRenderers = None,
+                        progress_callback=None) -> None:
+    """Writes the frames of a video visualization to a video file by rendering them (see
+    es.visualization.VideoVisualization.draw_frame() and composite_frame()) and piping the raw pixels to ffmpeg
+    :param es.visualization.VideoVisualization visualization: The video visualization, with its figure made and sized
+    :param str video_file: The path to the video file
+    :param float fps: Frames per second of the video
+    :param str codec: Codec to encode the video (passed to ffmpeg)
+    :param list extra_args: Extra arguments to pass to ffmpeg
+    :param es.visualization.VideoRenderers renderer: The renderer of the frames. If not specified, uses
+                                                     visualization.video.export.renderer from the configuration.
+    :param progress_callback: Function called with the index of each frame and the number of frames once it is written
+    """
+    renderer = es.visualization.VideoRenderers(
+        renderer if renderer is not None else es.cfg['visualization.video.export.renderer'])
+    render_frame = visualization.composite_frame if renderer == es.visualization.VideoRenderers.NUMPY \
+        else visualization.draw_frame
+
+    frames = visualization.frames
+
+    if len(frames) == 0:
+        raise Exception(f'Error encoding "{video_file}": The video has no frames.')
+
+    pixels = render_frame(frames[0])
+    height, width = pixels.shape[:2]
+
+    ffmpeg_command = [
+        'ffmpeg',
+        '-nostats',
+        '-f', 'rawvideo', '-vcodec', 'rawvideo',
+        '-s', f'{width}x{height}', '-pix_fmt', 'rgb24',
+        '-framerate', str(fps),
+        '-i', 'pipe:',
+        '-vcodec', codec,
+        *(extra_args if extra_args is not None else []),
+        video_file
+    ]
+
+    # The output of ffmpeg is written to a temporary file rather than a pipe, since a pipe isn't read until all
+    # frames are written and ffmpeg would block once it is full (e.g. if extra_args increase the log level)
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(ffmpeg_command, stdin=subprocess.PIPE, stderr=stderr_file) as process:
+            try:
+                for i, frame in enumerate(frames):
+                    # The first frame was already rendered to get the size of the video
+                    if i > 0:
+                        pixels = render_frame(frame)
+
+                    process.stdin.write(pixels.tobytes())
+
+                    if progress_callback is not None:
+                        progress_callback(i, len(frames))
+            except BrokenPipeError:
+                # ffmpeg exited early, so its error is reported below
+                pass
+
+            process.communicate()
+
+        if process.returncode != 0:
+            stderr_file.seek(0)
+            raise Exception(f'Error encoding "{video_file}": {stderr_file.read().decode(errors="ignore").strip()}')
+
+
+def _write_video_segment(es_audio: es.audio.Audio, video_file_base: str, video_format: str, video_segment_id: str,
+                         segment_frame_start: int, frame_count: int, fps: float, width: int, height: int,
+                         ffmpeg_extra_args: list, preview_image_file: str = None, preview_seconds: float = 0,
+                         fade_seconds: float = 0, envelope_pyramid: es.analysis.EnvelopePyramid = None,
+                         spectrogram: es.analysis.Spectrogram = None, progress_callback=None) -> str:
+    """Renders and encodes a segment of a video to a temporary file. The segment is encoded to a file with an
+    "-encoding" suffix which is renamed once the segment is complete, so only complete segments are used when resuming.
+    :param es.audio.Audio es_audio: The audio of the video (its data is not needed if the analysis is specified)
+    :param str video_segment_id: The id of the segment ('preview' or the segment number)
+    :param int segment_frame_start: The first frame of the segment
+    :param int frame_count: The number of frames of the segment
+    :param str preview_image_file: The preview image to fade from at the start of the preview segment
+    :param es.analysis.EnvelopePyramid envelope_pyramid: The envelope pyramid of the audio
+    :param es.analysis.Spectrogram spectrogram: The spectrogram of the audio
+    :param progress_callback: Function called with the index of each frame and the number of frames once it is written
+    :return str: The path of the segment file
+    """
+    visualization = es.visualization.VideoVisualization(
+        es_audio=es_audio,
+        fps=fps,
+        frames=range(segment_frame_start, segment_frame_start + frame_count),
+        envelope_pyramid=envelope_pyramid,
+        spectrogram=spectrogram)
+
+    visualization.make_figure()
+    visualization.resize_figure(width=width, height=height, dpi=_DPI)
+
+    # Get temporary file name to use during encoding
+    # This is necessary to ensure proper handling of resuming if encoding is stopped or crashes
+    video_segment_encoding_file = es.utils.get_temp_file_path(
+        temp_file_name=f'{video_file_base}_{video_segment_id}-encoding.{video_format}'
+    )
+    # Get file name to use for segment once encoding is complete (still a temporary file)
+    video_segment_file = es.utils.get_temp_file_path(
+        temp_file_name=f'{video_file_base}_{video_segment_id}.{video_format}'
+    )
+
+    segment_length = frame_count * es.cfg["visualization.video.export.fps"]
+
+    # The last frame of the segment must be a keyframe to allow concatenation without re-encoding
+    ffmpeg_keyframe_args = [
+        '-force_key_frames',
+        f'expr:gte(t,{segment_length - 1 / es.cfg["visualization.video.export.fps"]})'
+    ]
+
+    _write_video_frames(
+        visualization=visualization,
+        video_file=video_segment_encoding_file,
+        fps=es.cfg['visualization.video.export.fps'],
+        codec=es.cfg['visualization.video.export.codec'],
+        extra_args=ffmpeg_extra_args + ffmpeg_keyframe_args,
+        progress_callback=progress_callback)
+
+    # Move the temporary encoding file to the segment file name
+    if os.path.exists(video_segment_file):
+        os.remove(video_segment_file)
+    os.rename(video_segment_encoding_file, video_segment_file)
+
+    # Additional processing for preview segment
+    if video_segment_id == 'preview':
+        video_file_temp_with_preview = es.utils.get_temp_file_path(
+            temp_file_name=f'{video_file_base}_{video_segment_id}-withfade.{video_format}'
+        )
+
+        ffmpeg_command = [
+            'ffmpeg',
+            '-i', video_segment_file,
+            '-loop', '1', '-t', str(preview_seconds), '-i', preview_image_file,
+            '-filter_complex',
+            f'[1:v]fade=t=out:st={preview_seconds - fade_seconds}:d={fade_seconds}:alpha=1[faded]; '
+            f'[0:v][faded]overlay=0:0:enable=\'between(t,0,{preview_seconds})\'[output]',
+            '-map', '[output]',
+            '-r', str(es.cfg['visualization.video.export.fps']),
+            '-c:v', es.cfg['visualization.video.export.codec'],
+            *(ffmpeg_extra_args + ffmpeg_keyframe_args),
+            video_file_temp_with_preview
+        ]
+
+        # Debug print for constructed command
+        #print("FFmpeg command:", ' '.join(ffmpeg_command))
+
+        # Add the preview image using ffmpeg
+        subprocess.run(ffmpeg_command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        # Replace the first segment with the updated version
+        os.replace(src=video_file_temp_with_preview, dst=video_segment_file)
+
+    return video_segment_file
+
+
+def _write_video_segment_worker(progress_queue, **kwargs) -> str:
+    """Renders and encodes a segment of a video in a worker process (see _write_video_segment()), reporting the
+    number of frames which are written about once per second of video
+    :param progress_queue: The queue to which to put the number of frames written since the last report
+    :param kwargs: The arguments of _write_video_segment() which are specific to the segment (the others are passed
+                   to the worker by _initialize_video_worker())
+    :return str: The path of the segment file
+    """
+    frames_reported = 0
+    frames_per_report = max(1, math.floor(es.cfg['visualization.video.export.fps']))
+
+    def progress_callback(i, n):
+        nonlocal frames_reported
+
+        if i - frames_reported >= frames_per_report:
+            progress_queue.put(i - frames_reported)
+            frames_reported = i
+
+    video_segment_file = _write_video_segment(progress_callback=progress_callback, **_video_worker_segment_args,
+                                              **kwargs)
+    progress_queue.put(kwargs['frame_count'] - frames_reported)
+
+    return video_segment_file
+
+
+def _write_video_segments_parallel(es_audio: es.audio.Audio, video_segments: list, processes: int,
+                                   envelope_pyramid: es.analysis.EnvelopePyramid,
+                                   spectrogram: es.analysis.Spectrogram, segment_args: dict) -> list:
+    """Renders and encodes segments of a video concurrently in a pool of worker processes, each with its own headless
+    figure (see _write_video_segment()). The workers share the spectrogram read-only (see
+    es.analysis.Spectrogram.share()), and the audio and its analysis are passed to each worker once rather than with
+    each segment.
+    :param es.audio.Audio es_audio: The audio of the video
+    :param list video_segments: The id, first frame, number of frames and label of each segment
+    :param int processes: The number of worker processes
+    :param es.analysis.EnvelopePyramid envelope_pyramid: The envelope pyramid of the audio
+    :param es.analysis.Spectrogram spectrogram: The spectrogram of the audio
+    :param dict segment_args: The other arguments of _write_video_segment()
+    :return list: The segment files in the order of the segments
+    """
+    # Only pass the configuration options which are not derived (derived values may not be picklable)
+    cfg = {key: es.cfg[key] for key in es.base_cfg}
+    cfg['analysis.processes'] = 1
+
+    # Share the spectrogram threads (all CPUs if not specified) between the workers rather than having each one use all
+    # of them, so the number of threads does not multiply with the number of processes
+    spectrogram_workers = cfg['analysis.spectrogram.workers'] or os.cpu_count() or 1
+    cfg['analysis.spectrogram.workers'] = max(1, spectrogram_workers // processes)
+
+    # The workers only need the properties of the audio, since the analysis is passed to them
+    es_audio_properties = es_audio.with_data_raw(None)
+    shared_spectrogram = spectrogram.share()
+
+    video_segment_files = {}
+    segment_exception = None
+
+    # Spawn workers so they don't inherit the state of the GUI backend or any threads of this process
+    mp_context = multiprocessing.get_context('spawn')
+
+    try:
+        with mp_context.Manager() as manager, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=mp_context,
+                                                       initializer=_initialize_video_worker,
+                                                       initargs=(cfg, {'es_audio': es_audio_properties,
+                                                                       'envelope_pyramid': envelope_pyramid,
+                                                                       'spectrogram': shared_spectrogram,
+                                                                       **segment_args})) as executor:
+            progress_queue = manager.Queue()
+
+            futures = {executor.submit(_write_video_segment_worker, progress_queue,
+                                       video_segment_id=video_segment_id, segment_frame_start=segment_frame_start,
+                                       frame_count=frame_count): (video_segment_id, segment_label)
+                       for video_segment_id, segment_frame_start, frame_count, segment_label in video_segments}
+
+            # Progress bar is disabled if the output is not a terminal, e.g. when processing files in parallel
+            with tqdm.tqdm(total=sum(frame_count for _, _, frame_count, _ in video_segments),
+                           desc=f'Encoding {len(video_segments)} segment(s) ({processes} processes)', unit='frame',
+                           disable=None) as frames_progress_bar:
+                pending_futures = set(futures)
+
+                while pending_futures:
+                    done_futures, pending_futures = concurrent.futures.wait(
+                        pending_futures, timeout=_SEGMENT_PROGRESS_INTERVAL,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+
+                    while not progress_queue.empty():
+                        frames_progress_bar.update(progress_queue.get())
+
+                    for future in done_futures:
+                        if future.cancelled():
+                            continue
+
+                        video_segment_id, segment_label = futures[future]
+
+                        try:
+                            video_segment_files[video_segment_id] = future.result()
+                            frames_progress_bar.write(f'{segment_label} encoded.')
+                        except Exception as e:
+                            frames_progress_bar.write(f'Error encoding {segment_label.lower()}.')
+
+                            if segment_exception is None:
+                                segment_exception = e
+
+                    # Segments which haven't started are cancelled after a failure (complete segments are kept, so
+                    # encoding can be resumed)
+                    if segment_exception is not None:
+                        for future in pending_futures:
+                            future.cancel()
+    finally:
+        shared_spectrogram.unshare()
+
+    # The exception of the first segment which failed is raised once the segments which were running are complete
+    if segment_exception is not None:
+        raise segment_exception
+
+    return [video_segment_files[video_segment_id] for video_segment_id, _, _, _ in video_segments]
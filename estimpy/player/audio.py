@@ -98,8 +98,6 @@ def play(audio_time: float = 0):
         pause_unpause()
         return
 
-    sample_time = _es_audio.time_to_data_index(audio_time)
-
     pygame.mixer.init(frequency=_es_audio.sample_rate, size=-_es_audio.bit_depth, channels=2)
 
     loops = -1 if es.cfg['player.repeat'] else 0
@@ -109,13 +107,16 @@ def play(audio_time: float = 0):
     # _is_playing must be set to true so that the set_volume() calls for each channel work correctly
     _is_playing = True
 
+    # Only the audio from the playback position is needed (shares the loaded buffers without copying)
+    es_audio_playback = _es_audio.slice(start=audio_time)
+
     # Prepare Sound objects
     for channel in range(_es_audio.channels):
         _channels.append(pygame.mixer.Channel(channel))
 
         # Even though we are playing through just one channel, Sound() buffer expects interleaved stereo audio
         # data, so we have to duplicate every sample.
-        sound = pygame.mixer.Sound(buffer=np.repeat(_es_audio.data_raw[channel, sample_time:], 2).tobytes())
+        sound = pygame.mixer.Sound(buffer=np.repeat(es_audio_playback.data_raw[channel], 2).tobytes())
 
         # Having a very short fade should ensure the volume is at or near 0
         # until the volume can be explicitly set to 0
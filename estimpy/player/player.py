@@ -7,15 +7,15 @@ import estimpy as es
 class Player:
     def __init__(self, audio_files: list, width: int = None, height: int = None):
         self._current_file = 0
-        self._audio_files = audio_files
+        self._audio_files = list(audio_files)
         self._es_audio = None
         self._visualization = None
 
-        if not self._audio_files:
-            return
-
         # Estim audio of current file
-        self._es_audio = es.audio.Audio(file=self._audio_files[self._current_file]) #  type: es.audio.Audio
+        self._es_audio = self._load_file(self._current_file) #  type: es.audio.Audio
+
+        if self._es_audio is None:
+            return
 
         self._channel_muted = [False] * self._es_audio.channels  # type: typing.List[bool]
         self._channel_volumes = [es.cfg['player.volume-start']] * self._es_audio.channels  # type: typing.List[float]
@@ -108,10 +108,12 @@ class Player:
             self._es_audio = es_audio
             self._current_file = None
         elif -len(self._audio_files) <= file_index < len(self._audio_files):
-            es_audio = es.audio.Audio(file=self._audio_files[file_index])
+            file_index %= len(self._audio_files)
+            # If the file can't be read, continue in the direction of the playlist the file was selected in
+            step = -1 if self._current_file is not None and file_index < self._current_file else 1
+            es_audio = self._load_file(file_index, step=step)
             if es_audio:
                 self._es_audio = es_audio
-                self._current_file = file_index
 
         es.player.audio.load(es_audio=self._es_audio)
         self._visualization.load(es_audio=self._es_audio)
@@ -210,4 +212,34 @@ class Player:
             self._channel_muted[channel] = False
 
         if self._visualization:
-            self._visualization.unmute(channel)
\ No newline at end of file
+            self._visualization.unmute(channel)
+
+    def _load_file(self, file_index: int, step: int = 1) -> es.audio.Audio | None:
+        """Loads a file of the playlist. Files are only read when they are loaded, so a file which can't be read is
+        removed from the playlist with a warning, and the next file in the direction of step is loaded instead.
+        :param int file_index: The index of the file in the playlist
+        :param int step: 1 to load the following file if the file can't be read, or -1 to load the preceding file
+        :return es.audio.Audio | None: The audio of the loaded file, or None if no file could be loaded
+        """
+        while 0 <= file_index < len(self._audio_files):
+            audio_file = self._audio_files[file_index]
+
+            try:
+                es_audio = es.audio.Audio(file=audio_file)
+            except Exception as e:
+                print(f'Warning: Could not load "{audio_file}", removing it from the playlist: {e}')
+                del self._audio_files[file_index]
+
+                # Keep the index of the current file pointing to the same file
+                if self._current_file is not None and file_index < self._current_file:
+                    self._current_file -= 1
+
+                # The following files moved back into the index of the removed file
+                file_index += min(step, 0)
+                continue
+
+            self._current_file = file_index
+
+            return es_audio
+
+        return None
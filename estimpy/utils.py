@@ -30,6 +30,8 @@ class Spinner:
 
         self.running = threading.Event()
         self.thread = None
+        # Only animate the spinner in a terminal (e.g. not when output is redirected or captured)
+        self.animate = sys.stdout.isatty()
 
         if autostart:
             self.start()
@@ -42,6 +44,10 @@ class Spinner:
                 sys.stdout.flush()
                 time.sleep(self.rate)
 
+        if not self.animate:
+            self.running.set()
+            return
+
         if not self.thread or not self.thread.is_alive():
             self.running.set()
             self.thread = threading.Thread(target=run_spinner, daemon=True)
@@ -49,7 +55,10 @@ class Spinner:
 
     def stop(self, stop_message: str = ''):
         """Stop the spinner."""
-        if self.running.is_set():
+        if self.running.is_set() and not self.animate:
+            self.running.clear()
+            sys.stdout.write(f"{self.message}{stop_message}\n")
+        elif self.running.is_set():
             self.running.clear()
             self.thread.join()
             sys.stdout.write(f"\r{self.message}{stop_message} \n")  # Clear spinner character
@@ -6,12 +6,23 @@ import estimpy as es
 import functools
 import matplotlib
 import matplotlib.animation
+import matplotlib.colors
+import matplotlib.image
+import matplotlib.lines
+import matplotlib.patches
 import matplotlib.patheffects
 import matplotlib.pyplot
 import matplotlib.widgets
+import numpy as np
 
 _DPI = 100
 
+# Maximum number of frames per pixel of width with which to render memory mapped spectrograms of whole files
+_SPECTROGRAM_FRAMES_PER_PIXEL = 4
+
+# Number of window widths of the colormapped spectrogram strip of videos to render at a time
+_SPECTROGRAM_STRIP_WINDOWS = 8
+
 class AxisScaleText(enum.Enum):
     BOTTOM = {
         'va': 'bottom',
@@ -51,17 +62,31 @@ class PlaybackIcons(enum.StrEnum):
     UNMUTED = '\U0001F50A'
 
 
+class VideoRenderers(enum.StrEnum):
+    MATPLOTLIB = 'matplotlib'
+    NUMPY = 'numpy'
+
+
 class VisualizationMode(enum.IntEnum):
     DISPLAY = 0,
     EXPORT = 1
 
 
 class Visualization:
-    def __init__(self, es_audio: es.audio.Audio = None, mode: VisualizationMode = VisualizationMode.DISPLAY):
+    def __init__(self, es_audio: es.audio.Audio = None, mode: VisualizationMode = VisualizationMode.DISPLAY,
+                 envelope_pyramid: es.analysis.EnvelopePyramid = None, spectrogram: es.analysis.Spectrogram = None):
+        """
+        :param es.audio.Audio es_audio: The audio to visualize
+        :param VisualizationMode mode: Whether the visualization is displayed or exported
+        :param es.analysis.EnvelopePyramid envelope_pyramid: The envelope pyramid of the audio, if it was already
+                                                              calculated (e.g. in another process)
+        :param es.analysis.Spectrogram spectrogram: The spectrogram of the audio, if it was already calculated
+        """
         self._es_audio = es_audio
         self._envelopes = {}
+        self._envelope_pyramid = envelope_pyramid
         self._mode = mode
-        self._spectrogram = None
+        self._spectrogram = spectrogram
         self._handles = {}
 
         self._initialize_handles()
@@ -74,12 +99,15 @@ class Visualization:
         return self._es_audio
 
     @property
-    def peak_envelope(self) -> es.analysis.Envelope:
-        if es.analysis.EnvelopeModes.PEAK not in self._envelopes:
-            self._envelopes[es.analysis.EnvelopeModes.PEAK] = es.analysis.peak_envelope(
-                es_audio=self.es_audio, padding=1)
+    def envelope_pyramid(self) -> es.analysis.EnvelopePyramid:
+        if self._envelope_pyramid is None:
+            self._envelope_pyramid = es.analysis.envelope_pyramid(es_audio=self.es_audio)
+
+        return self._envelope_pyramid
 
-        return self._envelopes[es.analysis.EnvelopeModes.PEAK]
+    @property
+    def peak_envelope(self) -> es.analysis.Envelope:
+        return self._get_envelope(es.analysis.EnvelopeModes.PEAK)
 
     @property
     def spectrogram(self) -> es.analysis.Spectrogram:
@@ -90,11 +118,7 @@ class Visualization:
 
     @property
     def rms_envelope(self) -> es.analysis.Envelope:
-        if es.analysis.EnvelopeModes.RMS not in self._envelopes:
-            self._envelopes[es.analysis.EnvelopeModes.RMS] = es.analysis.rms_envelope(
-                es_audio=self.es_audio, padding=1)
-
-        return self._envelopes[es.analysis.EnvelopeModes.RMS]
+        return self._get_envelope(es.analysis.EnvelopeModes.RMS)
 
     def i_amplitude(self, t_i):
         return math.floor(
@@ -110,6 +134,7 @@ class Visualization:
 
         self._es_audio = es_audio
         self._envelopes = {}
+        self._envelope_pyramid = None
         self._spectrogram = None
 
         # Preserve the figure while removing all other elements and handles
@@ -118,7 +143,7 @@ class Visualization:
         self._initialize_handles()
         self._handles['figure'] = figure
 
-        self._handles['figure'].canvas.manager.window.setWindowTitle(self.es_audio.get_string())
+        self._set_window_title()
 
         # Regenerate the contents of the figure
         self._make_figure_subplots()
@@ -134,7 +159,7 @@ class Visualization:
         self._handles['figure'].set_size_inches(es.cfg['visualization.image.display.width'] / _DPI,
                                                 es.cfg['visualization.image.display.height'] / _DPI)
 
-        self._handles['figure'].canvas.manager.window.setWindowTitle(self.es_audio.get_string())
+        self._set_window_title()
         self._make_figure_subplots()
 
         self._add_time_text()
@@ -175,6 +200,8 @@ class Visualization:
         self._handles['figure'].set_size_inches(width / dpi, height / dpi)
         self._handles['figure'].set_dpi(dpi)
 
+        self._update_envelope_fills()
+
         return width_scale_factor, height_scale_factor
 
     def show_figure(self):
@@ -195,12 +222,9 @@ class Visualization:
 
         ax.set_facecolor(axes_style_cfg['background-color'])
 
-        ax.fill(self.peak_envelope.times, self.peak_envelope.envelope_data[channel_id, :],
-                color=axes_style_cfg['peak-color'])
-
-        if es.cfg['visualization.style.amplitude.show-rms']:
-            ax.fill(self.rms_envelope.times, self.rms_envelope.envelope_data[channel_id, :],
-                    color=axes_style_cfg['rms-color'])
+        self._handles['envelope_fills'].append(
+            (ax, channel_id, self._fill_amplitude(ax=ax, channel_id=channel_id, start=0, end=self.es_audio.length,
+                                                  points=self._get_envelope_points(ax))))
 
     def _add_figure_subplots(self, gridspec: matplotlib.gridspec.GridSpec) -> int:
         i_subplot = 0
@@ -254,11 +278,15 @@ class Visualization:
 
         axes_style_cfg = self._get_spectrogram_style_cfg(channel_id)
 
-        ax.imshow(self.spectrogram.spectrogram_data[channel_id, :, :], aspect='auto', origin='lower',
+        # Memory mapped spectrograms of long audio are reduced to a few frames per pixel so they aren't read into memory
+        spectrogram_data = self.spectrogram.get_channel_data(
+            channel=channel_id, frame_count_max=_SPECTROGRAM_FRAMES_PER_PIXEL * self._get_envelope_points(ax))
+
+        ax.imshow(spectrogram_data, aspect='auto', origin='lower',
                   cmap=axes_style_cfg['color-map'],
                   extent=[self.spectrogram.times.min(), self.spectrogram.times.max(),
                           self.spectrogram.frequency_min, self.spectrogram.frequency_max],
-                  vmin=-es.cfg['visualization.style.spectrogram.dynamic-range'], vmax=0)
+                  vmin=self.spectrogram.vmin, vmax=self.spectrogram.vmax)
 
     def _add_title_subplot(self, gridspec: matplotlib.gridspec.GridSpec):
         if self._handles['figure'] is None:
@@ -284,10 +312,47 @@ class Visualization:
         self._handles['text'].append(title_text_handle)
         self._set_text_path_effects(title_text_handle)
 
+    def _analyze(self) -> None:
+        """Runs the analysis which is needed to render the figure concurrently (see es.analysis.analyze())
+        :return None:
+        """
+        stages = []
+
+        if self._envelope_pyramid is None:
+            stages.append(es.analysis.AnalysisStages.ENVELOPE_PYRAMID)
+
+        if self._spectrogram is None:
+            stages.append(es.analysis.AnalysisStages.SPECTROGRAM)
+
+        if self.es_audio is None or not stages:
+            return
+
+        results = es.analysis.analyze(es_audio=self.es_audio, stages=stages)
+
+        self._envelope_pyramid = results.get(es.analysis.AnalysisStages.ENVELOPE_PYRAMID, self._envelope_pyramid)
+        self._spectrogram = results.get(es.analysis.AnalysisStages.SPECTROGRAM, self._spectrogram)
+
+    def _fill_amplitude(self, ax, channel_id: int, start: float, end: float, points: int) -> list:
+        """Fills the peak and RMS amplitude envelopes of a time range at the resolution needed for the number of points
+        :return list: The handles of the filled polygons
+        """
+        axes_style_cfg = self._get_amplitude_style_cfg(channel_id)
+        colors = [axes_style_cfg['peak-color'], axes_style_cfg['rms-color']]
+
+        handles = []
+
+        for vertices, color in zip(self._get_amplitude_vertices(channel_id=channel_id, start=start, end=end,
+                                                                points=points), colors):
+            handles += ax.fill(vertices[:, 0], vertices[:, 1], color=color)
+
+        return handles
+
     def _format_spectrogram_axes(self, ax, invert=False):
         ax.set_facecolor('black')
         ax.xaxis.set_visible(False)
         ax.set_xlim([0, self.es_audio.length])
+        # The panels span the whole width of the figure, so their tick labels would be drawn outside of it
+        ax.tick_params(axis='y', labelleft=False)
         ax.set_ylim([self.spectrogram.frequency_min, self.spectrogram.frequency_max])
 
         if es.cfg['visualization.style.spectrogram.axes.enabled']:
@@ -334,6 +399,8 @@ class Visualization:
         ax.spines.bottom.set_visible(False)
         ax.spines.top.set_visible(False)
         ax.set_xlim([0, self.es_audio.length])
+        # The panels span the whole width of the figure, so their tick labels would be drawn outside of it
+        ax.tick_params(axis='y', labelleft=False)
         # Add padding above envelope
         ax.set_ylim([0, 1 + es.cfg['visualization.style.amplitude.padding']])
 
@@ -396,6 +463,41 @@ class Visualization:
 
         return gridspec_params
 
+    def _get_envelope(self, mode: es.analysis.EnvelopeModes) -> es.analysis.Envelope:
+        if mode not in self._envelopes:
+            # The peak and RMS envelopes are calculated together since they are used together
+            self._envelopes.update(es.analysis.envelopes(
+                es_audio=self.es_audio, modes=[es.analysis.EnvelopeModes.PEAK, es.analysis.EnvelopeModes.RMS],
+                padding=1))
+
+        return self._envelopes[mode]
+
+    def _get_amplitude_vertices(self, channel_id: int, start: float, end: float, points: int) -> list:
+        """Gets the polygons of the peak and RMS amplitude envelopes of a time range at the resolution needed for the
+        number of points
+        :return list: The vertices of the peak polygon and the RMS polygon (if it is shown)
+        """
+        times, minimums, maximums, rms = self.envelope_pyramid.get_envelope(start=start, end=end, points=points)
+
+        # Pad the envelopes with zeros at the start and end of the range to close the filled polygons
+        times = np.concatenate(([start], times, [end]))
+
+        vertices = [np.column_stack((times, es.analysis.Envelope.pad_envelope_data(
+            np.maximum(maximums[channel_id, :], -minimums[channel_id, :]))))]
+
+        if es.cfg['visualization.style.amplitude.show-rms']:
+            vertices.append(np.column_stack((times, es.analysis.Envelope.pad_envelope_data(rms[channel_id, :]))))
+
+        return vertices
+
+    def _get_envelope_points(self, ax) -> int:
+        """
+        :param ax: The axes in which the envelopes are rendered
+        :return int: The number of points at which to render amplitude envelopes spanning the width of the axes (one
+                     per column of pixels)
+        """
+        return max(1, round(ax.bbox.width))
+
     def _get_time_text(self) -> str:
         return es.utils.seconds_to_string(self.es_audio.length)
 
@@ -405,9 +507,14 @@ class Visualization:
             'axes': {},  # type: typing.Dict[matplotlib.pyplot.Axes]
             'text': [],  # type: typing.List[matplotlib.pyplot.Text]
             'time': None,  # type: matplotlib.pyplot.Text
+            # Filled envelopes of the whole audio with their axes and channel, which are rendered again when the figure
+            # is resized
+            'envelope_fills': [],  # type: typing.List[typing.Tuple[matplotlib.pyplot.Axes, int, list]]
         }
 
     def _make_figure_subplots(self):
+        self._analyze()
+
         gridspec_params = self._get_gridspec_params()
 
         # Generate the gridspec for the figure
@@ -419,13 +526,6 @@ class Visualization:
 
         matplotlib.pyplot.subplots_adjust(left=0, bottom=0, right=1, top=1, wspace=0, hspace=0)
 
-    def _remove_elements(self, handle_list):
-        for handle in handle_list:
-            if isinstance(handle, list):
-                self._remove_elements(handle)
-            else:
-                handle.remove()
-
     def _set_text_path_effects(self, text_handle):
         if hasattr(text_handle, 'set_path_effects') and callable(getattr(text_handle, 'set_path_effects')):
             text_handle.set_path_effects([
@@ -434,6 +534,22 @@ class Visualization:
                     foreground=es.cfg['visualization.style.font.text.border-color'])
             ])
 
+    def _update_envelope_fills(self):
+        """Renders the filled envelopes of the whole audio again with one point per column of pixels of their axes
+        (e.g. after the figure is resized)
+        """
+        for ax, channel_id, amplitude_fills in self._handles['envelope_fills']:
+            for amplitude_fill, vertices in zip(amplitude_fills, self._get_amplitude_vertices(
+                    channel_id=channel_id, start=0, end=self.es_audio.length, points=self._get_envelope_points(ax))):
+                amplitude_fill.set_xy(vertices)
+
+    def _set_window_title(self):
+        # Headless backends (e.g. in worker processes) don't have a window
+        window = getattr(self._handles['figure'].canvas.manager, 'window', None)
+
+        if window is not None:
+            window.setWindowTitle(self.es_audio.get_string())
+
     @classmethod
     def _get_amplitude_style_cfg(cls, channel_id: int) -> typing.Dict:
         return es.cfg['visualization.style.amplitude.channels'][channel_id] \
@@ -484,8 +600,9 @@ class Visualization:
 
 
 class VideoVisualization(Visualization):
-    def __init__(self, es_audio: es.audio.Audio = None, fps: float = None, frames: range = None):
-        super().__init__(es_audio=es_audio)
+    def __init__(self, es_audio: es.audio.Audio = None, fps: float = None, frames: range = None,
+                 envelope_pyramid: es.analysis.EnvelopePyramid = None, spectrogram: es.analysis.Spectrogram = None):
+        super().__init__(es_audio=es_audio, envelope_pyramid=envelope_pyramid, spectrogram=spectrogram)
 
         self._animation = None  # type: matplotlib.animation.FuncAnimation | None
         self._fps = es.cfg['visualization.video.export.fps'] if fps is None else fps
@@ -497,10 +614,6 @@ class VideoVisualization(Visualization):
         self._window_padding_factor = 1.1
         self._window_length = es.cfg['visualization.video.export.window-length']
 
-        self.__amplitude_window_length = None
-        self.__spectrogram_window_length = None
-
-
     @property
     def animation(self) -> matplotlib.animation.FuncAnimation | None:
         if self._animation is None:
@@ -516,21 +629,71 @@ class VideoVisualization(Visualization):
     def frames(self) -> range:
         return self._frames
 
-    @property
-    def _amplitude_window_length(self):
-        if self.__amplitude_window_length is None:
-            self.__amplitude_window_length = self.i_amplitude(
-                self._window_padding_factor * self._window_length)
+    def composite_frame(self, frame: int) -> np.ndarray | None:
+        """Renders a frame with NumPy by compositing the artists which change with each frame (updated by make_frame())
+        onto cached layers of the rest of the figure, instead of drawing the figure with matplotlib
+        :param int frame: The frame to render
+        :return np.ndarray: The RGB pixels of the frame with the top row first. The array is reused for each frame.
+        """
+        if self._handles['figure'] is None:
+            return None
 
-        return self.__amplitude_window_length
+        self.make_frame(frame)
 
-    @property
-    def _spectrogram_window_length(self):
-        if self.__spectrogram_window_length is None:
-            self.__spectrogram_window_length = self.i_spectrogram(
-                self._window_padding_factor * self._window_length)
+        layers = self._get_composite_layers()
+        pixels = layers['frame']
+
+        np.copyto(pixels, layers['background'])
+
+        for amplitude_fills in self._handles['amplitude_fills'].values():
+            for amplitude_fill in amplitude_fills:
+                self._composite_amplitude_fill(pixels=pixels, amplitude_fill=amplitude_fill)
+
+        for spectrogram_image in self._handles['spectrogram_images'].values():
+            self._composite_spectrogram_image(pixels=pixels, spectrogram_image=spectrogram_image)
+
+        for position_line in self._handles['position_lines']:
+            self._composite_position_line(pixels=pixels, position_line=position_line)
+
+        _blend_pixels(pixels, *layers['foreground'])
+
+        if self._handles['time'] is not None and self._handles['time'].get_text():
+            _blend_pixels(pixels, *self._get_time_text_layer(layers))
 
-        return self.__spectrogram_window_length
+        return pixels
+
+    def draw_frame(self, frame: int) -> np.ndarray | None:
+        """Renders a frame with matplotlib by drawing the artists which change with each frame (updated by make_frame())
+        over a cached background of the rest of the figure, instead of drawing the entire figure
+        :param int frame: The frame to render
+        :return np.ndarray: The RGB pixels of the frame with the top row first (a view of the buffer of the canvas,
+                            which is reused for each frame)
+        """
+        if self._handles['figure'] is None:
+            return None
+
+        self.make_frame(frame)
+
+        figure = self._handles['figure']
+        size = tuple(figure.bbox.size)
+        animated_artists = self._get_animated_artists()
+
+        # The background is drawn for the first frame, when the figure has been resized, or when an artist which changes
+        # with each frame has been created since it was drawn
+        if self._handles['frame_background'] is None or self._handles['frame_background']['size'] != size or \
+                not all(artist.get_animated() for artist in animated_artists):
+            for artist in animated_artists:
+                artist.set_animated(True)
+
+            figure.canvas.draw()
+            self._handles['frame_background'] = {'size': size,
+                                                 'region': figure.canvas.copy_from_bbox(figure.bbox)}
+        else:
+            figure.canvas.restore_region(self._handles['frame_background']['region'])
+
+        self._draw_animated_artists()
+
+        return np.asarray(figure.canvas.buffer_rgba())[:, :, :3]
 
     def load(self, es_audio: es.audio.Audio):
         if es_audio is None:
@@ -552,9 +715,6 @@ class VideoVisualization(Visualization):
         self._frame = frame
         t = self._frame_to_time(frame)
 
-        self._remove_elements(self._handles['video_frame'])
-        self._handles['video_frame'].clear()
-
         for position_line in self._handles['position_lines']:
             position_line.set_xdata([t])
 
@@ -563,56 +723,58 @@ class VideoVisualization(Visualization):
             total_length=self.es_audio.length,
             window_length=self._window_length)
 
-        i_amplitude_min, i_amplitude_max = self._get_window_range(
-            t=self.i_amplitude(t),
-            total_length=len(self.peak_envelope.times) - 1,
-            window_length=self._amplitude_window_length,
-            round_bounds=True)
+        amplitude_min, amplitude_max = self._get_window_range(
+            t=t,
+            total_length=self.es_audio.length,
+            window_length=self._window_padding_factor * self._window_length)
 
         # Update the amplitude
         for channel_id in range(self.es_audio.channels):
-            axes_style_cfg = self._get_amplitude_style_cfg(channel_id)
-
             axes_key = self._get_axis_handle_id(type=AxisTypes.AMPLITUDE, channel=channel_id)
 
             self._handles['axes'][axes_key].set_xlim(axes_xlim)
-            self._handles['video_frame'].append(
-                self._handles['axes'][axes_key].fill(
-                    self.peak_envelope.times[i_amplitude_min:i_amplitude_max],
-                    es.analysis.Envelope.pad_envelope_data(
-                        self.peak_envelope.envelope_data[channel_id, (i_amplitude_min + 1):(i_amplitude_max - 1)]),
-                    color=axes_style_cfg['peak-color']))
-
-            if es.cfg['visualization.style.amplitude.show-rms']:
-                self._handles['video_frame'].append(
-                    self._handles['axes'][axes_key].fill(
-                        self.rms_envelope.times[i_amplitude_min:i_amplitude_max],
-                        es.analysis.Envelope.pad_envelope_data(
-                            self.rms_envelope.envelope_data[channel_id, (i_amplitude_min + 1):(i_amplitude_max - 1)]),
-                        color=axes_style_cfg['rms-color']))
-
-        i_spectrogram_min, i_spectrogram_max = self._get_window_range(
-            t=self.i_spectrogram(t),
-            total_length=len(self.spectrogram.times) - 1,
-            window_length=self._spectrogram_window_length,
-            round_bounds=True)
 
-        for channel_id in range(self.es_audio.channels):
-            axes_style_cfg = self._get_spectrogram_style_cfg(channel_id)
+            points = math.ceil(self._window_padding_factor *
+                               self._get_envelope_points(self._handles['axes'][axes_key]))
+
+            # The filled envelopes are created for the first frame, then only their vertices are updated
+            if channel_id not in self._handles['amplitude_fills']:
+                self._handles['amplitude_fills'][channel_id] = self._fill_amplitude(
+                    ax=self._handles['axes'][axes_key], channel_id=channel_id,
+                    start=amplitude_min, end=amplitude_max, points=points)
+            else:
+                for amplitude_fill, vertices in zip(self._handles['amplitude_fills'][channel_id],
+                                                    self._get_amplitude_vertices(channel_id=channel_id,
+                                                                                 start=amplitude_min,
+                                                                                 end=amplitude_max, points=points)):
+                    amplitude_fill.set_xy(vertices)
 
+        for channel_id in range(self.es_audio.channels):
             axes_key = self._get_axis_handle_id(type=AxisTypes.SPECTROGRAM, channel=channel_id)
 
             self._handles['axes'][axes_key].set_xlim(axes_xlim)
-            self._handles['video_frame'].append(
-                self._handles['axes'][axes_key].imshow(
-                    self.spectrogram.spectrogram_data[channel_id, :, i_spectrogram_min:i_spectrogram_max],
-                    aspect='auto', origin='lower',
-                    cmap=axes_style_cfg['color-map'],
-                    extent=[self.spectrogram.times[i_spectrogram_min],
-                            self.spectrogram.times[i_spectrogram_max],
-                            self.spectrogram.frequency_min,
-                            self.spectrogram.frequency_max],
-                    vmin=-es.cfg['visualization.style.spectrogram.dynamic-range'], vmax=0))
+
+            spectrogram_pixels = self._get_spectrogram_pixels(channel_id=channel_id)
+
+            # The pixels are already colormapped at the resolution of the axes, so the image is drawn without
+            # interpolation with its pixels aligned to the pixels of the axes, from the bottom left corner with the
+            # bottom row first (the same as composite_frame()). The image is created for the first frame, then only
+            # its pixels and extent are updated.
+            ax = self._handles['axes'][axes_key]
+            _, row_max, column_min, _ = self._get_axes_pixel_bounds(ax)
+            image_y0 = self._handles['figure'].bbox.height - row_max
+            (extent_left, extent_bottom), (extent_right, extent_top) = ax.transData.inverted().transform(
+                [(column_min, image_y0),
+                 (column_min + spectrogram_pixels.shape[1], image_y0 + spectrogram_pixels.shape[0])])
+            spectrogram_extent = (extent_left, extent_right, extent_bottom, extent_top)
+
+            if channel_id not in self._handles['spectrogram_images']:
+                self._handles['spectrogram_images'][channel_id] = ax.imshow(
+                    spectrogram_pixels, origin='lower', interpolation='none', aspect='auto',
+                    extent=spectrogram_extent, clip_on=False)
+            else:
+                self._handles['spectrogram_images'][channel_id].set_data(spectrogram_pixels)
+                self._handles['spectrogram_images'][channel_id].set_extent(spectrogram_extent)
 
         self._update_time_text()
 
@@ -646,13 +808,10 @@ class VideoVisualization(Visualization):
         # If rendering a video, only render the amplitude envelope here if making a scrub subplot
         # since otherwise it the contents will change with each frame
         if scrub:
-            ax.set_xlim(self.peak_envelope.times[0], self.peak_envelope.times[len(self.peak_envelope.times) - 1])
-            ax.fill(self.peak_envelope.times, self.peak_envelope.envelope_data[channel_id, :],
-                    color=axes_style_cfg['peak-color'])
-
-            if es.cfg['visualization.style.amplitude.show-rms']:
-                ax.fill(self.rms_envelope.times, self.rms_envelope.envelope_data[channel_id, :],
-                        color=axes_style_cfg['rms-color'])
+            ax.set_xlim(0, self.es_audio.length)
+            self._handles['envelope_fills'].append(
+                (ax, channel_id, self._fill_amplitude(ax=ax, channel_id=channel_id, start=0, end=self.es_audio.length,
+                                                      points=self._get_envelope_points(ax))))
 
         self._handles['position_lines'].append(
             ax.axvline(x=0, lw=1, color=es.cfg['visualization.style.video.position-line-color']))
@@ -680,9 +839,201 @@ class VideoVisualization(Visualization):
         self._handles['position_lines'].append(
             ax.axvline(x=0, lw=1, color=es.cfg['visualization.style.video.position-line-color']))
 
+    def _composite_amplitude_fill(self, pixels: np.ndarray, amplitude_fill: matplotlib.patches.Polygon) -> None:
+        """Rasterizes a filled amplitude envelope, with each pixel blended by the fraction of it which the envelope
+        covers (as matplotlib antialiases polygons)
+        """
+        ax = amplitude_fill.axes
+        row_min, row_max, column_min, column_max = self._get_axes_pixel_bounds(ax)
+        figure_height = pixels.shape[0]
+
+        # The vertices of the envelope without the closing vertex (in display coordinates). The first and last
+        # vertices are on the baseline, which closes the polygon.
+        vertices = ax.transData.transform(amplitude_fill.get_xy()[:-1])
+        columns, rows = vertices[:, 0] - column_min, figure_height - vertices[:, 1] - row_min
+        baseline_row = figure_height - ax.transData.transform((0, 0))[1] - row_min
+
+        # The envelope is filled with ax.fill(), which also strokes the edge of the polygon with the fill color, so the
+        # area is expanded by half the width of the edge
+        if amplitude_fill.get_edgecolor()[3] > 0 and amplitude_fill.get_linewidth() > 0:
+            columns, rows, baseline_row = _dilate_polyline_area(
+                columns=columns, rows=rows, baseline_row=baseline_row,
+                distance=amplitude_fill.get_linewidth() * self._handles['figure'].dpi / 72 / 2)
+
+        _fill_polyline_area(pixels[row_min:row_max, column_min:column_max], columns=columns, rows=rows,
+                            baseline_row=baseline_row, color=amplitude_fill.get_facecolor())
+
+    def _composite_position_line(self, pixels: np.ndarray, position_line: matplotlib.lines.Line2D) -> None:
+        ax = position_line.axes
+        row_min, row_max, column_min, column_max = self._get_axes_pixel_bounds(ax)
+
+        line_width = position_line.get_linewidth() * self._handles['figure'].dpi / 72
+        x = ax.transData.transform((position_line.get_xdata()[0], 0))[0]
+
+        # Lines are snapped to the pixel grid as they are when matplotlib draws them
+        x = round(x) + (0.5 if round(line_width) % 2 else 0)
+
+        line_min = min(max(x - line_width / 2, column_min), column_max)
+        line_max = min(max(x + line_width / 2, column_min), column_max)
+        i_line_min, i_line_max = math.floor(line_min), math.ceil(line_max)
+
+        # The line is filled as the rows of the transposed pixels it covers
+        _fill_pixel_columns(np.swapaxes(pixels[row_min:row_max, i_line_min:i_line_max], 0, 1),
+                            top_rows=line_min - i_line_min, bottom_rows=line_max - i_line_min,
+                            color=position_line.get_color())
+
+    def _composite_spectrogram_image(self, pixels: np.ndarray,
+                                     spectrogram_image: matplotlib.image.AxesImage) -> None:
+        _, _, column_min, _ = self._get_axes_pixel_bounds(spectrogram_image.axes)
+        figure_height = pixels.shape[0]
+
+        # The image is drawn from the bottom left corner of the axes with the bottom row first (see make_frame())
+        image_pixels = spectrogram_image.get_array()[::-1]
+        row_max = min(figure_height, round(figure_height - spectrogram_image.axes.bbox.y0))
+        row_min = max(0, row_max - image_pixels.shape[0])
+        column_max = min(pixels.shape[1], column_min + image_pixels.shape[1])
+
+        image_pixels = image_pixels[image_pixels.shape[0] - (row_max - row_min):, :column_max - column_min]
+        image_region = pixels[row_min:row_max, column_min:column_max]
+
+        # Transparent pixels of the image (i.e. silence) show the pixels under it, as they do when matplotlib draws it
+        if np.all(image_pixels[:, :, 3] == 255):
+            image_region[...] = image_pixels[:, :, :3]
+        else:
+            alphas = image_pixels[:, :, 3:] / 255
+            image_region[...] = image_region * (1 - alphas) + image_pixels[:, :, :3] * alphas + 0.5
+
+    def _draw_figure_pixels(self, hidden_artists: list) -> np.ndarray:
+        """Draws the figure with matplotlib without some of its artists. The background of the figure is transparent
+        if its patch is hidden.
+        :param list hidden_artists: The artists to hide
+        :return np.ndarray: The RGBA pixels of the figure with the top row first
+        """
+        visible_artists = [artist for artist in hidden_artists if artist.get_visible()]
+        # Artists excluded from the figure by the matplotlib renderer (see draw_frame()) are drawn unless hidden
+        animated_artists = [artist for artist in self._get_animated_artists() if artist.get_animated()]
+
+        for artist in visible_artists:
+            artist.set_visible(False)
+
+        for artist in animated_artists:
+            artist.set_animated(False)
+
+        try:
+            self._handles['figure'].canvas.draw()
+            return np.array(self._handles['figure'].canvas.buffer_rgba())
+        finally:
+            for artist in visible_artists:
+                artist.set_visible(True)
+
+            for artist in animated_artists:
+                artist.set_animated(True)
+
+    def _draw_animated_artists(self) -> None:
+        canvas = self._handles['figure'].canvas
+        spectrogram_images = list(self._handles['spectrogram_images'].values())
+
+        # The pixels of the spectrogram images are already at the resolution of their axes, so they are copied into the
+        # buffer of the canvas (the same as composite_frame()) instead of being resampled by matplotlib
+        canvas_pixels = np.asarray(canvas.buffer_rgba())[:, :, :3] if hasattr(canvas, 'buffer_rgba') else None
+
+        for artist in self._get_animated_artists():
+            if canvas_pixels is not None and artist in spectrogram_images:
+                self._composite_spectrogram_image(pixels=canvas_pixels, spectrogram_image=artist)
+            else:
+                self._handles['figure'].draw_artist(artist)
+
     def _frame_to_time(self, frame):
         return frame / self.fps
 
+    def _get_animated_artists(self) -> list:
+        """
+        :return list: The artists which are drawn over the background of the figure for each frame, in the order in
+                      which they are drawn with the figure. Artists of a windowed panel (e.g. its ticks) which extend
+                      past its edge are covered by the panels drawn after it, so the amplitude, spectrogram and scrub
+                      panels after the first windowed panel are drawn entirely (except their time axis, which is
+                      always covered).
+        """
+        figure = self._handles['figure']
+        panel_axes = [self._handles['axes'][self._get_axis_handle_id(type=axis_type, channel=channel_id)]
+                      for axis_type in (AxisTypes.AMPLITUDE, AxisTypes.SPECTROGRAM, AxisTypes.AMPLITUDE_SCRUB)
+                      for channel_id in range(self.es_audio.channels)]
+        window_axes = panel_axes[:2 * self.es_audio.channels]
+
+        i_axes_start = min(figure.axes.index(ax) for ax in window_axes)
+
+        animated_artists = []
+
+        for ax in figure.axes[i_axes_start:]:
+            if ax not in panel_axes:
+                continue
+
+            if ax.axison and ax.get_frame_on():
+                animated_artists.append(ax.patch)
+
+            animated_artists += sorted((artist for artist in ax.get_children()
+                                        if artist is not ax.patch and artist is not ax.xaxis),
+                                       key=lambda artist: artist.get_zorder())
+
+        animated_artists += [self._handles['time']] if self._handles['time'] is not None else []
+
+        return animated_artists
+
+    def _get_axes_pixel_bounds(self, ax) -> typing.Tuple[int, int, int, int]:
+        """
+        :return typing.Tuple[int, int, int, int]: The first and last (exclusive) rows from the top of the figure and
+                                                  columns of the pixels of the axes
+        """
+        figure_height = self._handles['figure'].bbox.height
+        x0, y0, x1, y1 = ax.bbox.extents
+
+        return round(figure_height - y1), round(figure_height - y0), round(x0), round(x1)
+
+    def _get_composite_layers(self) -> dict:
+        """Gets the layers onto which frames are composited (see composite_frame()), which are drawn with matplotlib
+        when the first frame is composited or the figure has been resized:
+        - background: The figure without the artists which change with each frame
+        - foreground: The pixels drawn over the windowed amplitude and spectrogram panels (e.g. their ticks and scale
+          text) as flat indices, colors and alpha levels (see _blend_pixels())
+        """
+        figure = self._handles['figure']
+        size = tuple(figure.bbox.size)
+
+        if self._handles['composite_layers'] is not None and self._handles['composite_layers']['size'] == size:
+            return self._handles['composite_layers']
+
+        frame_artists = [amplitude_fill for amplitude_fills in self._handles['amplitude_fills'].values()
+                         for amplitude_fill in amplitude_fills]
+        frame_artists += list(self._handles['spectrogram_images'].values())
+        frame_artists += self._handles['position_lines']
+        frame_artists += [self._handles['time']] if self._handles['time'] is not None else []
+
+        window_axes = [self._handles['axes'][self._get_axis_handle_id(type=axis_type, channel=channel_id)]
+                       for axis_type in (AxisTypes.AMPLITUDE, AxisTypes.SPECTROGRAM)
+                       for channel_id in range(self.es_audio.channels)]
+
+        background = self._draw_figure_pixels(hidden_artists=frame_artists)[:, :, :3]
+        # Each windowed panel is drawn by itself and only the pixels within it are used, since anything outside of it
+        # (e.g. the ticks of its time axis) is covered by the other panels when the whole figure is drawn
+        foreground = np.zeros((*background.shape[:2], 4), dtype=np.uint8)
+        for ax in window_axes:
+            row_min, row_max, column_min, column_max = self._get_axes_pixel_bounds(ax)
+            foreground[row_min:row_max, column_min:column_max] = self._draw_figure_pixels(
+                hidden_artists=frame_artists + [figure.patch, ax.patch] +
+                               [other_ax for other_ax in figure.axes if other_ax is not ax]
+            )[row_min:row_max, column_min:column_max]
+
+        self._handles['composite_layers'] = {
+            'size': size,
+            'background': background,
+            'foreground': _get_layer_pixels(foreground),
+            'frame': np.empty_like(background),
+            'time_text': None,
+            'time_text_pixels': None
+        }
+
+        return self._handles['composite_layers']
+
     def _get_gridspec_params(self):
         gridspec_params = super()._get_gridspec_params()
 
@@ -704,18 +1055,68 @@ class VideoVisualization(Visualization):
 
         return gridspec_params
 
+    def _get_spectrogram_pixels(self, channel_id: int) -> np.ndarray:
+        """Gets the pixels of the spectrogram of a channel in the current window of its axes as a slice of a strip of
+        the colormapped spectrogram at the pixel resolution of the axes. The strip is rendered a number of windows at a
+        time, so it is only rendered again when the window moves past the end of the strip or the axes are resized.
+        :param int channel_id: The channel of the spectrogram
+        :return np.ndarray: The RGBA pixels of the window, with the size of the axes
+        """
+        ax = self._handles['axes'][self._get_axis_handle_id(type=AxisTypes.SPECTROGRAM, channel=channel_id)]
+
+        width, height = round(ax.bbox.width), round(ax.bbox.height)
+        window_min, window_max = ax.get_xlim()
+        pixels_per_second = width / (window_max - window_min)
+
+        column_min = round(window_min * pixels_per_second)
+
+        strip = self._handles['spectrogram_strips'].get(channel_id)
+
+        if strip is None or strip['resolution'] != (width, height, pixels_per_second) or \
+                not strip['column_min'] <= column_min <= strip['column_min'] + strip['pixels'].shape[1] - width:
+            column_count = max(width, min(_SPECTROGRAM_STRIP_WINDOWS * width,
+                                          math.ceil(self.es_audio.length * pixels_per_second) - column_min))
+
+            strip = {
+                'resolution': (width, height, pixels_per_second),
+                'column_min': column_min,
+                'pixels': self._make_spectrogram_strip(channel_id=channel_id, column_min=column_min,
+                                                       column_count=column_count, height=height,
+                                                       pixels_per_second=pixels_per_second,
+                                                       invert=ax.yaxis_inverted())
+            }
+
+            self._handles['spectrogram_strips'][channel_id] = strip
+
+        i_column = column_min - strip['column_min']
+
+        return strip['pixels'][:, i_column:i_column + width]
+
     def _get_time_text(self) -> str:
         return es.utils.seconds_to_string(self._frame_to_time(self._frame)) + ' / ' \
             + es.utils.seconds_to_string(self.es_audio.length)
 
-    def _get_window_range(self, t, total_length, window_length, round_bounds: bool = False):
+    def _get_time_text_layer(self, layers: dict) -> tuple:
+        """Gets the pixels of the time text, which are drawn with matplotlib when the text changes
+        :param dict layers: The composite layers (see _get_composite_layers())
+        :return tuple: The flat indices, colors and alpha levels of the pixels of the text (see _blend_pixels())
+        """
+        time_text = self._handles['time'].get_text()
+
+        if layers['time_text'] != time_text:
+            figure = self._handles['figure']
+
+            # The time text is the only artist of the figure which isn't in its axes
+            layers['time_text_pixels'] = _get_layer_pixels(
+                self._draw_figure_pixels(hidden_artists=[figure.patch] + figure.axes))
+            layers['time_text'] = time_text
+
+        return layers['time_text_pixels']
+
+    def _get_window_range(self, t, total_length, window_length):
         # Calculate half the window length
         half_window_length = window_length / 2
 
-        # If rounding the bounds, floor the half width
-        if round_bounds:
-            half_window_length = math.floor(half_window_length)
-
         # Ensure the min is not less than 0 or greater than one full window length from the end of the data
         window_min = max(0, min(total_length - window_length, t - half_window_length))
         # Ensure the max doesn't run past the end of the data
@@ -727,7 +1128,53 @@ class VideoVisualization(Visualization):
         super()._initialize_handles()
 
         self._handles['position_lines'] = []
-        self._handles['video_frame'] = []
+        # Artists which are updated with each frame
+        self._handles['amplitude_fills'] = {}
+        self._handles['spectrogram_images'] = {}
+        # Colormapped spectrograms from which the spectrogram images are sliced
+        self._handles['spectrogram_strips'] = {}
+        # Cached layers of the figure onto which frames are composited
+        self._handles['composite_layers'] = None
+        # Rendered figure without the artists which change with each frame, over which frames are drawn
+        self._handles['frame_background'] = None
+
+    def _make_spectrogram_strip(self, channel_id: int, column_min: int, column_count: int, height: int,
+                                pixels_per_second: float, invert: bool = False) -> np.ndarray:
+        """Colormaps the spectrogram of a channel at a pixel resolution. Each column shows the spectrogram frame at its
+        center and each row shows the average of the frequency bins it spans.
+        :param int channel_id: The channel of the spectrogram
+        :param int column_min: The first column to render (the column at time 0 is column 0)
+        :param int column_count: The number of columns to render
+        :param int height: The number of rows to render
+        :param float pixels_per_second: The number of columns per second of audio
+        :param bool invert: Whether the lowest frequency is at the top
+        :return np.ndarray: The RGBA pixels of the strip with the bottom row first
+        """
+        times = self.spectrogram.times
+        frame_length = (times[-1] - times[0]) / (len(times) - 1) if len(times) > 1 else 1
+
+        # Each frame is shown from its time until the time of the next frame
+        column_times = (np.arange(column_min, column_min + column_count) + 0.5) / pixels_per_second
+        i_frames = np.clip(np.floor((column_times - times[0]) / frame_length).astype(int), 0, len(times) - 1)
+
+        spectrogram_data = self.spectrogram.spectrogram_data[channel_id][:, i_frames].astype(np.float32)
+
+        # Average the bins spanned by each row. If there are fewer bins than rows, rows show the bin at their center.
+        bin_count = spectrogram_data.shape[0]
+        i_row_bins = np.arange(height) * bin_count // height if bin_count >= height else \
+            (2 * np.arange(height) + 1) * bin_count // (2 * height)
+        row_bin_counts = np.maximum(np.diff(i_row_bins, append=bin_count), 1).astype(np.float32)
+
+        spectrogram_data = np.add.reduceat(spectrogram_data, i_row_bins, axis=0) / row_bin_counts[:, np.newaxis]
+
+        if invert:
+            spectrogram_data = spectrogram_data[::-1]
+
+        # Values which are not finite (i.e. silence) are transparent as they would be with imshow
+        color_map = matplotlib.colormaps[self._get_spectrogram_style_cfg(channel_id)['color-map']]
+        norm = matplotlib.colors.Normalize(vmin=self.spectrogram.vmin, vmax=self.spectrogram.vmax)
+
+        return color_map(norm(np.ma.masked_invalid(spectrogram_data)), bytes=True)
 
     def _set_animation(self):
         if self._handles['figure'] is None:
@@ -766,6 +1213,8 @@ class VideoPlayerVisualization(VideoVisualization):
         super().__init__(es_audio=es_audio)
 
         self._frame = 0  # type: int
+        # Renders frames while playing (see _start_timer())
+        self._timer = None  # type: matplotlib.backend_bases.TimerBase | None
 
         self._window_length = es.cfg['visualization.video.display.window-length']
 
@@ -784,6 +1233,11 @@ class VideoPlayerVisualization(VideoVisualization):
         if es_audio is None:
             return
 
+        # Stop rendering frames of the previous file (a new timer is started when it is played)
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+
         super().load(es_audio=es_audio)
 
     def make_figure(self):
@@ -793,8 +1247,10 @@ class VideoPlayerVisualization(VideoVisualization):
         self._handles['figure'].canvas.manager.toolbar.setVisible(False)
 
         self._handles['figure'].canvas.mpl_connect('button_press_event', self._on_button_press)
+        self._handles['figure'].canvas.mpl_connect('draw_event', self._on_draw)
         self._handles['figure'].canvas.mpl_connect('key_press_event', self._on_key_press)
         self._handles['figure'].canvas.mpl_connect('motion_notify_event', self._on_motion_notify)
+        self._handles['figure'].canvas.mpl_connect('resize_event', self._on_resize)
 
     def make_frame(self, frame: int = 0):
         if self._handles['figure'] is None:
@@ -817,11 +1273,17 @@ class VideoPlayerVisualization(VideoVisualization):
 
         self._handles['clock'].set_text(self._get_time_text())
 
-        # Update the volume sliders to reflect the true playback volume without triggering the on_changed event
+        # Update the volume sliders to reflect the true playback volume without triggering the on_changed event.
+        # Sliders redraw the whole figure when their value is set, so they are only set when the volume has changed.
         for channel in range(self.es_audio.channels):
-            ui_updating = self._ui_updating(True)
-            self._handles['volume_slider'][channel].set_val(es.player.audio.get_volume(channel))
-            self._ui_updating(ui_updating)
+            volume = es.player.audio.get_volume(channel)
+
+            if self._handles['volume_slider'][channel].val != volume:
+                ui_updating = self._ui_updating(True)
+                self._handles['volume_slider'][channel].set_val(volume)
+                self._ui_updating(ui_updating)
+
+        self._blit_frame()
 
         return self._handles['figure']
 
@@ -839,8 +1301,8 @@ class VideoPlayerVisualization(VideoVisualization):
         self._set_button_active(self._handles['buttons'][button_id])
 
     def pause(self):
-        if self.animation is not None:
-            self.animation.pause()
+        if self._timer is not None:
+            self._timer.stop()
 
         self._set_button_label_text(self._handles['buttons']['play-pause'], PlaybackIcons.PLAY)
 
@@ -851,10 +1313,10 @@ class VideoPlayerVisualization(VideoVisualization):
         # if self.time >= self.es_audio.length:
         #    self._time = 0
 
-        if self.animation is None:
-            self._set_animation()
+        if self._timer is None:
+            self._start_timer()
         else:
-            self.animation.resume()
+            self._timer.start()
 
         self._handles['buttons']['play-pause'].label.set_text(PlaybackIcons.PAUSE)
         self._set_button_inactive(self._handles['buttons']['stop'])
@@ -882,13 +1344,13 @@ class VideoPlayerVisualization(VideoVisualization):
 
     def show_figure(self):
         if es.cfg['player.autoplay']:
-            self._set_animation()
+            self._start_timer()
 
         super().show_figure()
 
     def stop(self):
-        if self.animation is not None:
-            self.animation.pause()
+        if self._timer is not None:
+            self._timer.stop()
 
         self.set_time(0)
 
@@ -898,6 +1360,9 @@ class VideoPlayerVisualization(VideoVisualization):
         self._handles['figure'].canvas.draw()
 
     def toggle_full_screen(self):
+        # The background of frames must be cached again at the new size of the figure
+        self._handles['background'] = None
+
         manager = matplotlib.pyplot.get_current_fig_manager()
         if self.player.is_full_screen():
             manager.window.showNormal()
@@ -1140,6 +1605,19 @@ class VideoPlayerVisualization(VideoVisualization):
         current_left -= 0.75 * button_padding
         ax.axvline(x=current_left, color='k', lw=0.5)
 
+    def _blit_frame(self) -> None:
+        """Draws the artists which change with each frame over the cached background of the rest of the figure"""
+        canvas = self._handles['figure'].canvas
+
+        if self._handles['background'] is None:
+            # The background is cached when the figure has been drawn
+            canvas.draw_idle()
+            return
+
+        canvas.restore_region(self._handles['background'])
+        self._draw_animated_artists()
+        canvas.blit(self._handles['figure'].bbox)
+
     def _event_handler(self, event, event_data=None, channel=None):
         if event == 'play-pause':
             self.player.toggle_playing()
@@ -1171,6 +1649,10 @@ class VideoPlayerVisualization(VideoVisualization):
             button_handle.label.set_fontname(button_font_name)
             button_handle.label.set_fontsize(16)
 
+    def _get_animated_artists(self) -> list:
+        return super()._get_animated_artists() + \
+            ([self._handles['clock']] if self._handles['clock'] is not None else [])
+
     def _get_time_text(self):
         return es.utils.seconds_to_string(self.player.get_time()) + ' / ' \
             + es.utils.seconds_to_string(self.es_audio.length)
@@ -1186,6 +1668,8 @@ class VideoPlayerVisualization(VideoVisualization):
     def _initialize_handles(self):
         super()._initialize_handles()
 
+        # Rendered figure without the animated artists, which is restored before drawing each frame
+        self._handles['background'] = None
         self._handles['buttons'] = {}
         self._handles['clock'] = None
         self._handles['volume_slider'] = {}  # type: typing.Dict[matplotlib.widgets.Slider]
@@ -1202,6 +1686,21 @@ class VideoPlayerVisualization(VideoVisualization):
                 elif axes_handle.find(AxisTypes.AMPLITUDE_SCRUB) >= 0:
                     self.player.set_time(event.xdata)
 
+    def _on_draw(self, event):
+        animated_artists = self._get_animated_artists()
+
+        # Animated artists are excluded when the figure is drawn. If any artists were drawn as part of the figure
+        # (e.g. if they were created since it was last drawn), it must be drawn again without them.
+        if not all(artist.get_animated() for artist in animated_artists):
+            for artist in animated_artists:
+                artist.set_animated(True)
+
+            self._handles['figure'].canvas.draw_idle()
+            return
+
+        self._handles['background'] = self._handles['figure'].canvas.copy_from_bbox(self._handles['figure'].bbox)
+        self._draw_animated_artists()
+
     def _on_key_press(self, event):
         if event.key.isspace():
             self._event_handler('play-pause')
@@ -1233,12 +1732,10 @@ class VideoPlayerVisualization(VideoVisualization):
             if self._handles['axes'][axes_handle] == event.inaxes and axes_handle.find(AxisTypes.AMPLITUDE_SCRUB) != -1:
                 self.player.set_time(event.xdata)
 
-    def _set_animation(self):
-        if self._handles['figure'] is None:
-            return
-
-        self._animation = matplotlib.animation.FuncAnimation(fig=self._handles['figure'], func=self.make_frame,
-                                                             repeat=False, cache_frame_data=False)
+    def _on_resize(self, event):
+        # The background of frames must be cached again at the new size of the figure
+        self._handles['background'] = None
+        self._update_envelope_fills()
 
     def _set_button_active(self, button_handle) -> None:
         if button_handle:
@@ -1257,6 +1754,16 @@ class VideoPlayerVisualization(VideoVisualization):
             button_handle.label.set_text(label_text)
             self._handles['figure'].canvas.draw()
 
+    def _start_timer(self):
+        if self._handles['figure'] is None:
+            return
+
+        # Frames are blitted over the cached background of the figure instead of drawing the entire figure
+        # (see _blit_frame()), so they are rendered by a timer rather than a FuncAnimation which would draw it
+        self._timer = self._handles['figure'].canvas.new_timer(interval=math.floor(1000 / self.fps))
+        self._timer.add_callback(self.make_frame)
+        self._timer.start()
+
     def _ui_updating(self, ui_updating: bool = None) -> bool:
         # We will want to return the value of _ui_updating *before* potentially updating it to allow nesting
         prev_ui_updating = self.__ui_updating
@@ -1305,6 +1812,216 @@ def _alpha_color(color, bg_color, alpha) -> str:
     return '#' + ''.join(f'{i:02X}' for i in [round(255 * x) for x in alpha_rgb])
 
 
+def _blend_pixels(pixels: np.ndarray, indices: np.ndarray, colors: np.ndarray, alphas: np.ndarray) -> None:
+    """Blends colors over some of the pixels of an image
+    :param np.ndarray pixels: The RGB pixels of the image
+    :param np.ndarray indices: The flat indices of the pixels to blend
+    :param np.ndarray colors: The RGB colors to blend over each pixel (from 0 to 255)
+    :param np.ndarray alphas: The alpha level of each color (from 0 to 1) as a column
+    """
+    flat_pixels = pixels.reshape(-1, 3)
+    flat_pixels[indices] = flat_pixels[indices] * (1 - alphas) + colors * alphas + 0.5
+
+
+def _dilate_polyline_area(columns: np.ndarray, rows: np.ndarray, baseline_row: float,
+                          distance: float) -> typing.Tuple[np.ndarray, np.ndarray, float]:
+    """Expands the area between a polyline and a horizontal baseline (see _fill_polyline_area()) by a distance in all
+    directions. The area is expanded by a square rather than a circle, which is indistinguishable for the fractions of
+    a pixel by which the edges of polygons are stroked.
+    :param np.ndarray columns: The (fractional) columns of the vertices of the polyline, in increasing order
+    :param np.ndarray rows: The (fractional) rows of the vertices of the polyline, which are all on the same side of
+                            the baseline
+    :param float baseline_row: The row of the baseline
+    :param float distance: The distance (in pixels) by which to expand the area
+    :return typing.Tuple[np.ndarray, np.ndarray, float]: The columns and rows of the vertices of the polyline and the
+                                                         row of the baseline of the expanded area
+    """
+    # The heights of the vertices away from the baseline
+    direction = -1 if np.mean(rows) <= baseline_row else 1
+    heights = (rows - baseline_row) * direction
+
+    # The height of the expanded polyline at each column is the maximum height of the polyline within the distance,
+    # which is at either end of that range or at a vertex within it
+    dilated_columns = np.union1d(columns - distance, columns + distance)
+    dilated_heights = np.maximum(np.interp(dilated_columns - distance, columns, heights),
+                                 np.interp(dilated_columns + distance, columns, heights))
+
+    i_vertex_starts = np.searchsorted(columns, dilated_columns - distance, side='left')
+    i_vertex_ends = np.searchsorted(columns, dilated_columns + distance, side='right')
+
+    for i in range(np.max(i_vertex_ends - i_vertex_starts, initial=0)):
+        within = i_vertex_starts + i < i_vertex_ends
+        dilated_heights[within] = np.maximum(dilated_heights[within], heights[i_vertex_starts[within] + i])
+
+    return dilated_columns, baseline_row + direction * (dilated_heights + distance), \
+        baseline_row - direction * distance
+
+
+def _fill_pixel_columns(pixels: np.ndarray, top_rows: np.ndarray | float, bottom_rows: np.ndarray | float,
+                        color) -> None:
+    """Fills each column of an image between fractional rows. The pixels at the ends of each column are blended with
+    the color by the fraction of them which is covered.
+    :param np.ndarray pixels: The RGB pixels of the image
+    :param top_rows: The row at which to start filling each column (e.g. 2.5 starts halfway through row 2)
+    :param bottom_rows: The row at which to stop filling each column
+    :param color: The color to fill with (a matplotlib color)
+    """
+    color = 255 * np.array(matplotlib.colors.to_rgb(color), dtype=np.float32)
+    columns = np.arange(pixels.shape[1])
+    top_rows = np.broadcast_to(top_rows, columns.shape)
+    bottom_rows = np.broadcast_to(bottom_rows, columns.shape)
+
+    rows = np.arange(pixels.shape[0])[:, np.newaxis]
+    pixels[(rows >= np.ceil(top_rows)) & (rows + 1 <= np.floor(bottom_rows))] = color
+
+    i_top_rows = np.floor(top_rows).astype(int)
+    i_bottom_rows = np.floor(bottom_rows).astype(int)
+
+    for i_rows, coverages in ((i_top_rows, np.minimum(bottom_rows, i_top_rows + 1) - top_rows),
+                              (i_bottom_rows, np.where(i_bottom_rows > i_top_rows, bottom_rows - i_bottom_rows, 0))):
+        partial = (coverages > 0) & (coverages < 1) & (i_rows >= 0) & (i_rows < pixels.shape[0])
+        i_partial_rows, partial_columns = i_rows[partial], columns[partial]
+        partial_coverages = coverages[partial, np.newaxis]
+
+        pixels[i_partial_rows, partial_columns] = \
+            pixels[i_partial_rows, partial_columns] * (1 - partial_coverages) + color * partial_coverages + 0.5
+
+
+def _fill_polyline_area(pixels: np.ndarray, columns: np.ndarray, rows: np.ndarray, baseline_row: float,
+                        color) -> None:
+    """Fills the area of an image between a polyline and a horizontal baseline. Each pixel is blended with the color
+    by the exact fraction of its area which is covered, as the Agg renderer of matplotlib antialiases polygons.
+    :param np.ndarray pixels: The RGB pixels of the image
+    :param np.ndarray columns: The (fractional) columns of the vertices of the polyline, in increasing order
+    :param np.ndarray rows: The (fractional) rows of the vertices of the polyline
+    :param float baseline_row: The row of the baseline
+    :param color: The color to fill with (a matplotlib color)
+    """
+    height, width = pixels.shape[:2]
+
+    # The polyline and the baseline are clipped to the image (e.g. the baseline of an envelope is at the edge of its
+    # axes, which may be a fraction of a pixel outside of the pixels of the axes)
+    baseline_row = min(max(baseline_row, 0), height)
+
+    # Split the part of the polyline within the image into pieces which are each within a single column
+    column_start, column_end = max(columns[0], 0), min(columns[-1], width)
+
+    if column_end <= column_start:
+        return
+
+    piece_columns = np.union1d(
+        np.concatenate(([column_start, column_end],
+                        columns[(columns > column_start) & (columns < column_end)])),
+        np.arange(math.ceil(column_start), math.floor(column_end) + 1))
+    piece_rows = np.clip(np.interp(piece_columns, columns, rows), 0, height)
+
+    piece_widths = np.diff(piece_columns)
+    piece_column_ids = np.minimum(np.floor(piece_columns[:-1]).astype(int), width - 1)
+    rows_start, rows_end = piece_rows[:-1], piece_rows[1:]
+
+    piece_row_min = np.floor(np.minimum(rows_start, rows_end)).astype(int)
+    piece_row_max = np.maximum(np.ceil(np.maximum(rows_start, rows_end)).astype(int), piece_row_min + 1)
+
+    # The rows of each column which the polyline crosses (its band). Columns which are only partly covered by the
+    # polyline (at its ends) are computed down to the baseline, since the rest of the fill covers them entirely.
+    column_widths = np.bincount(piece_column_ids, weights=piece_widths, minlength=width)
+    band_row_min = np.full(width, height)
+    band_row_max = np.zeros(width, dtype=int)
+    np.minimum.at(band_row_min, piece_column_ids, piece_row_min)
+    np.maximum.at(band_row_max, piece_column_ids, piece_row_max)
+
+    partial_columns = (column_widths > 0) & (column_widths < 1 - 1e-9)
+    band_row_min[partial_columns] = np.minimum(band_row_min[partial_columns], math.floor(baseline_row))
+    band_row_max[partial_columns] = np.maximum(band_row_max[partial_columns], math.ceil(baseline_row))
+    band_row_min = np.clip(band_row_min, 0, height)
+    band_row_max = np.clip(band_row_max, band_row_min, height)
+
+    # Pixels between the band and the baseline are entirely covered
+    above_baseline = band_row_max <= baseline_row
+    below_baseline = band_row_min >= baseline_row
+    _fill_pixel_columns(pixels,
+                        top_rows=np.where(above_baseline, band_row_max, np.where(below_baseline, baseline_row, 0)),
+                        bottom_rows=np.where(above_baseline, baseline_row, np.where(below_baseline, band_row_min, 0)),
+                        color=color)
+
+    # The pixels of the bands are stored consecutively by column
+    band_heights = band_row_max - band_row_min
+    band_offsets = np.cumsum(band_heights) - band_heights
+    band_size = band_offsets[-1] + band_heights[-1]
+    band_columns = np.repeat(np.arange(width), band_heights)
+    band_rows = band_row_min[band_columns] + np.arange(band_size) - band_offsets[band_columns]
+
+    def get_band_indices(piece_ids, piece_rows):
+        column_ids = piece_column_ids[piece_ids]
+        return band_offsets[column_ids] + piece_rows - band_row_min[column_ids]
+
+    # The area of each pixel below the polyline (i.e. between the polyline and the bottom of the image) is
+    # accumulated from the pieces of its column. Pixels entirely below a piece get its whole width, which is added
+    # once at the row below the piece and accumulated down the band.
+    below = piece_row_max < band_row_max[piece_column_ids]
+    below_areas = np.bincount(get_band_indices(np.flatnonzero(below), piece_row_max[below]),
+                              weights=piece_widths[below], minlength=band_size)
+    areas = np.cumsum(below_areas, dtype=np.float64)
+    areas -= np.repeat(areas[band_offsets] - below_areas[band_offsets], band_heights)
+
+    # The pixels which a piece crosses get the integral of their coverage over the width of the piece
+    piece_row_counts = np.minimum(piece_row_max, height) - piece_row_min
+    piece_ids = np.repeat(np.arange(len(piece_widths)), piece_row_counts)
+    crossed_rows = piece_row_min[piece_ids] + np.arange(len(piece_ids)) - \
+        np.repeat(np.cumsum(piece_row_counts) - piece_row_counts, piece_row_counts)
+
+    # The coverage of a pixel is linear along the piece between the rows at which it is clipped, so its integral
+    # is exact
+    coverages_start = crossed_rows + 1 - rows_start[piece_ids]
+    coverages_end = crossed_rows + 1 - rows_end[piece_ids]
+    areas += np.bincount(get_band_indices(piece_ids, crossed_rows),
+                         weights=piece_widths[piece_ids] * _get_mean_clipped_coverage(coverages_start, coverages_end),
+                         minlength=band_size)
+
+    # The area between the polyline and the baseline is the difference from the area below the baseline
+    coverages = np.abs(areas - np.clip(band_rows + 1 - baseline_row, 0, 1) * column_widths[band_columns])
+
+    color = 255 * np.array(matplotlib.colors.to_rgb(color), dtype=np.float32)
+
+    covered = coverages >= 1 - 0.5 / 255
+    pixels[band_rows[covered], band_columns[covered]] = color
+
+    partial = (coverages >= 0.5 / 255) & ~covered
+    partial_rows, partial_columns = band_rows[partial], band_columns[partial]
+    partial_coverages = coverages[partial][:, np.newaxis]
+    pixels[partial_rows, partial_columns] = \
+        pixels[partial_rows, partial_columns] * (1 - partial_coverages) + color * partial_coverages + 0.5
+
+
+def _get_mean_clipped_coverage(coverages_start: np.ndarray, coverages_end: np.ndarray) -> np.ndarray:
+    """
+    :param np.ndarray coverages_start: The unclipped coverage at the start of linear segments
+    :param np.ndarray coverages_end: The unclipped coverage at the end of the segments
+    :return np.ndarray: The mean of the coverage clipped between 0 and 1 along each segment
+    """
+    def integral(coverages):
+        # Antiderivative of the clipped coverage
+        return np.where(coverages <= 0, 0, np.where(coverages >= 1, coverages - 0.5, coverages ** 2 / 2))
+
+    differences = coverages_end - coverages_start
+    flat = np.abs(differences) < 1e-9
+
+    return np.where(flat, np.clip(coverages_start, 0, 1),
+                    (integral(coverages_end) - integral(coverages_start)) / np.where(flat, 1, differences))
+
+
+def _get_layer_pixels(layer: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Gets the pixels of an RGBA image with a transparent background which aren't transparent
+    :return typing.Tuple[np.ndarray, np.ndarray, np.ndarray]: The flat indices, colors and alpha levels of the pixels
+                                                              (see _blend_pixels())
+    """
+    flat_layer = layer.reshape(-1, 4)
+    indices = np.flatnonzero(flat_layer[:, 3])
+
+    return (indices, flat_layer[indices, :3].astype(np.float32),
+            flat_layer[indices, 3:].astype(np.float32) / 255)
+
+
 def _on_config_updated():
     # Configuration
 
@@ -0,0 +1,34 @@
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import estimpy as es
+import numpy as np
+import pytest
+import scipy.io.wavfile
+
+
+@pytest.fixture(autouse=True)
+def cfg(tmp_path):
+    """Restores the configuration after each test, and stores cached data in a temporary directory"""
+    cfg = dict(es.cfg)
+    es.cfg['cache.path'] = str(tmp_path / 'cache')
+
+    yield es.cfg
+
+    es.cfg.clear()
+    es.cfg.update(cfg)
+
+
+@pytest.fixture
+def audio_data() -> np.ndarray:
+    """10 seconds of stereo 16-bit noise at 8 kHz"""
+    return np.random.default_rng(0).integers(-2 ** 15, 2 ** 15, (2, 80000), dtype=np.int16)
+
+
+@pytest.fixture
+def wav_file(tmp_path, audio_data) -> str:
+    file = str(tmp_path / 'audio.wav')
+    scipy.io.wavfile.write(file, 8000, audio_data.T)
+
+    return file
@@ -0,0 +1,263 @@
+import os
+import pickle
+
+import estimpy as es
+import numpy as np
+import pytest
+
+# The reduction of each window of audio data normalized to float64 (how envelopes were calculated before they were
+# vectorized)
+_WINDOW_FUNCTIONS = {
+    es.analysis.EnvelopeModes.MAX: np.max,
+    es.analysis.EnvelopeModes.MEAN: np.mean,
+    es.analysis.EnvelopeModes.MIN: np.min,
+    es.analysis.EnvelopeModes.PEAK: lambda window: np.max(np.abs(window)),
+    es.analysis.EnvelopeModes.RMS: lambda window: np.sqrt(np.mean(np.square(window))),
+}
+
+
+@pytest.fixture
+def es_audio(audio_data):
+    return es.audio.Audio(audio_data=audio_data, sample_rate=8000, bit_depth=16)
+
+
+def get_envelope_data(es_audio: es.audio.Audio, mode: es.analysis.EnvelopeModes, start: int, end: int,
+                      window_size: int, step_size: int) -> np.ndarray:
+    audio_data = np.divide(es_audio.data_raw, 2 ** (es_audio.bit_depth - 1))
+
+    return np.array([[_WINDOW_FUNCTIONS[mode](audio_data[channel, i:i + window_size])
+                      for i in range(start, end, step_size)]
+                     for channel in range(es_audio.channels)])
+
+
+@pytest.mark.parametrize('mode', list(es.analysis.EnvelopeModes))
+@pytest.mark.parametrize('window_size, step_size', [(2048, 1024), (1000, 300), (64, 64), (100, 7)])
+def test_envelope_matches_windows(es_audio, mode, window_size, step_size):
+    envelope = es.analysis.Envelope(es_audio=es_audio, mode=mode, window_size=window_size, step_size=step_size)
+
+    assert envelope.envelope_data.dtype == np.float64
+    assert np.array_equal(envelope.envelope_data, get_envelope_data(
+        es_audio, mode=mode, start=0, end=es_audio.sample_count, window_size=window_size, step_size=step_size))
+
+
+def test_envelope_range_matches_windows(es_audio):
+    envelope = es.analysis.Envelope(es_audio=es_audio, mode=es.analysis.EnvelopeModes.RMS, start=5000, end=70000,
+                                    window_size=2048, step_size=1024)
+
+    assert np.array_equal(envelope.envelope_data, get_envelope_data(
+        es_audio, mode=es.analysis.EnvelopeModes.RMS, start=5000, end=70000, window_size=2048, step_size=1024))
+
+
+def test_envelopes_match_envelope(es_audio):
+    modes = list(es.analysis.EnvelopeModes)
+    envelopes = es.analysis.envelopes(es_audio=es_audio, modes=modes, padding=1)
+
+    for mode in modes:
+        envelope = es.analysis.Envelope(es_audio=es_audio, mode=mode, padding=1)
+
+        assert np.array_equal(envelopes[mode].envelope_data, envelope.envelope_data)
+        assert np.array_equal(envelopes[mode].times, envelope.times)
+
+
+@pytest.mark.parametrize('frequency_max_frames', [8192, 16])
+def test_autoscaled_spectrogram_keeps_bins_at_sample_rate(cfg, monkeypatch, frequency_max_frames):
+    # A tone with quiet noise, so the autoscaled maximum frequency is below the nyquist frequency
+    sample_rate = 8000
+    times = np.arange(10 * sample_rate) / sample_rate
+    audio_data = np.sin(2 * np.pi * 500 * times) * 8000 + np.random.default_rng(0).normal(0, 10, times.size)
+    es_audio = es.audio.Audio(audio_data=audio_data.astype(np.int16).reshape(1, -1), sample_rate=sample_rate,
+                              bit_depth=16)
+
+    monkeypatch.setattr(es.analysis, '_FREQUENCY_MAX_FRAMES', frequency_max_frames)
+    cfg['analysis.spectrogram.frequency-max'] = None
+    spectrogram = es.analysis.Spectrogram(es_audio=es_audio)
+
+    assert spectrogram.frequency_max < sample_rate / 2
+
+    frequencies, _, spectrogram_data = es.analysis.Spectrogram.generate_spectrogram_data(
+        audio_data=es_audio.get_data(), sample_rate=sample_rate, frequency_max=spectrogram.frequency_max)
+
+    assert np.array_equal(spectrogram.frequencies, frequencies)
+    assert np.array_equal(spectrogram.spectrogram_data, spectrogram_data)
+
+
+@pytest.mark.parametrize('quantization', list(es.analysis.SpectrogramQuantization))
+def test_autoscaled_spectrogram_is_memory_mapped(cfg, es_audio, quantization):
+    cfg['analysis.spectrogram.frequency-max'] = None
+    cfg['analysis.spectrogram.quantization'] = quantization
+    spectrogram = es.analysis.Spectrogram(es_audio=es_audio)
+
+    cfg['cache.enabled'] = False
+    cfg['analysis.spectrogram.memory-max'] = spectrogram.spectrogram_data.nbytes / 2 ** 20 / 4
+    memory_mapped_spectrogram = es.analysis.Spectrogram(es_audio=es_audio)
+
+    assert not spectrogram.memory_mapped
+    assert memory_mapped_spectrogram.memory_mapped
+    assert np.array_equal(memory_mapped_spectrogram.spectrogram_data, spectrogram.spectrogram_data)
+
+
+def test_analyze_workers_match_single_process(cfg, monkeypatch, wav_file):
+    es_audio = es.audio.Audio(file=wav_file)
+    monkeypatch.setattr(es.analysis, '_ANALYSIS_PROCESSES_SAMPLES_MIN', 0)
+
+    results = es.analysis.analyze(es_audio=es_audio, processes=1)
+    cfg['cache.enabled'] = False
+    worker_results = es.analysis.analyze(es_audio=es_audio, processes=4)
+
+    for mode, envelope in results[es.analysis.AnalysisStages.ENVELOPES].items():
+        assert np.array_equal(worker_results[es.analysis.AnalysisStages.ENVELOPES][mode].envelope_data,
+                              envelope.envelope_data)
+
+    pyramid = results[es.analysis.AnalysisStages.ENVELOPE_PYRAMID]
+    worker_pyramid = worker_results[es.analysis.AnalysisStages.ENVELOPE_PYRAMID]
+    for worker_data, data in zip(worker_pyramid.get_envelope(0, es_audio.length, 100),
+                                 pyramid.get_envelope(0, es_audio.length, 100)):
+        assert np.array_equal(worker_data, data)
+
+    assert np.array_equal(worker_results[es.analysis.AnalysisStages.SPECTROGRAM].spectrogram_data,
+                          results[es.analysis.AnalysisStages.SPECTROGRAM].spectrogram_data)
+
+
+@pytest.mark.parametrize('memory_mapped', [False, True])
+def test_shared_spectrogram_is_read_from_file(cfg, es_audio, memory_mapped):
+    cfg['cache.enabled'] = False
+    spectrogram = es.analysis.Spectrogram(es_audio=es_audio)
+
+    if memory_mapped:
+        cfg['analysis.spectrogram.memory-max'] = spectrogram.spectrogram_data.nbytes / 2 ** 20 / 4
+        spectrogram = es.analysis.Spectrogram(es_audio=es_audio)
+
+    spectrogram_data = np.array(spectrogram.spectrogram_data)
+    shared_spectrogram = spectrogram.share()
+    shared_file = shared_spectrogram._shared_spectrogram_data.__getstate__()['file']
+
+    # A memory mapped spectrogram is shared from the file of its tiles rather than copied
+    assert isinstance(shared_spectrogram._shared_spectrogram_data, es.analysis._MappedFileArray) == memory_mapped
+    assert spectrogram.memory_mapped == memory_mapped
+
+    unpickled_spectrogram = pickle.loads(pickle.dumps(shared_spectrogram))
+    assert np.array_equal(unpickled_spectrogram.spectrogram_data, spectrogram_data)
+
+    del unpickled_spectrogram
+    shared_spectrogram.unshare()
+
+    # Only a copy is removed, and the spectrogram which was shared can still be used
+    assert os.path.exists(shared_file) == memory_mapped
+    assert np.array_equal(spectrogram.spectrogram_data, spectrogram_data)
+
+
+def get_decibels(spectrogram: es.analysis.Spectrogram) -> np.ndarray:
+    """Converts the data of a spectrogram back to decibels using its values at the edges of the dynamic range"""
+    dynamic_range = es.cfg['visualization.style.spectrogram.dynamic-range']
+    spectrogram_data = spectrogram.spectrogram_data.astype(np.float64)
+
+    return (spectrogram_data - spectrogram.vmin) / (spectrogram.vmax - spectrogram.vmin) * dynamic_range - \
+        dynamic_range
+
+
+@pytest.mark.parametrize('quantization', [es.analysis.SpectrogramQuantization.FLOAT16,
+                                          es.analysis.SpectrogramQuantization.UINT8])
+def test_quantized_spectrogram_matches_float32(cfg, es_audio, quantization):
+    dynamic_range = cfg['visualization.style.spectrogram.dynamic-range']
+    decibels = es.analysis.Spectrogram(es_audio=es_audio).spectrogram_data
+
+    cfg['analysis.spectrogram.quantization'] = quantization
+    spectrogram = es.analysis.Spectrogram(es_audio=es_audio)
+
+    assert decibels.dtype == np.float32
+    assert spectrogram.spectrogram_data.dtype == np.dtype(str(quantization))
+
+    if quantization == es.analysis.SpectrogramQuantization.UINT8:
+        # The spectrogram is clipped to the dynamic range, and rounded to the nearest of 256 levels spanning it
+        error_max = dynamic_range / 255 / 2 + 1e-3
+        decibels = np.clip(decibels, -dynamic_range, 0)
+    else:
+        # float16 has an 11-bit significand
+        error_max = np.abs(decibels) * 2 ** -11 + 1e-6
+
+    assert np.all(np.abs(get_decibels(spectrogram) - decibels) <= error_max)
+
+
+@pytest.mark.parametrize('quantization', list(es.analysis.SpectrogramQuantization))
+def test_quantized_decibels_at_edges_of_dynamic_range(cfg, es_audio, quantization):
+    dynamic_range = cfg['visualization.style.spectrogram.dynamic-range']
+    decibels = np.array([-np.inf, -dynamic_range - 10, -dynamic_range, -dynamic_range / 2, 0], dtype=np.float32)
+
+    cfg['analysis.spectrogram.quantization'] = quantization
+    spectrogram = es.analysis.Spectrogram(es_audio=es_audio)
+    quantized_decibels = es.analysis._quantize_decibels(decibels, quantization=quantization)
+
+    # The bottom and top of the dynamic range are quantized to vmin and vmax
+    assert quantized_decibels[2] == spectrogram.vmin
+    assert quantized_decibels[4] == spectrogram.vmax
+
+    if quantization == es.analysis.SpectrogramQuantization.UINT8:
+        assert list(quantized_decibels) == [0, 0, 0, 128, 255]
+    else:
+        # Values outside of the dynamic range are kept
+        assert np.array_equal(quantized_decibels, decibels)
+
+
+def get_spectral_edge_index(spectrogram_data: np.ndarray) -> int:
+    """Finds the spectral edge frequency index with a loop over each time bin (how it was found before it was
+    vectorized)
+    :param np.ndarray spectrogram_data: A linear spectrogram with channels as the first dimension
+    """
+    # Append all channels onto the first
+    spectrogram_data = spectrogram_data.transpose(1, 0, 2).reshape(spectrogram_data.shape[1], -1)
+    frequency_max_index = spectrogram_data.shape[0] - 1
+
+    spectral_cumsum = np.cumsum(spectrogram_data, axis=0)
+    spectral_cumsum = np.delete(spectral_cumsum, np.where(spectral_cumsum[frequency_max_index, :] == 0), axis=1)
+
+    sorted_times = np.argsort(spectral_cumsum[frequency_max_index, :])
+    spectral_cumsum = np.delete(spectral_cumsum, sorted_times[range(int(0.1 * spectral_cumsum.shape[1]))], axis=1)
+
+    edge80_indices = np.zeros(spectral_cumsum.shape[1])
+    edge95_indices = np.zeros(spectral_cumsum.shape[1])
+
+    for i_t in range(spectral_cumsum.shape[1]):
+        edge80_indices[i_t] = np.argmax(spectral_cumsum[:, i_t] >= 0.8 * spectral_cumsum[frequency_max_index, i_t])
+        edge95_indices[i_t] = np.argmax(spectral_cumsum[:, i_t] >= 0.95 * spectral_cumsum[frequency_max_index, i_t])
+
+    return max(int(np.percentile(edge80_indices, 95)), int(np.percentile(edge95_indices, 50)))
+
+
+@pytest.fixture
+def spectrogram_data() -> np.ndarray:
+    """A linear spectrogram of 2 channels whose spectra decay at different rates, with some silent time bins"""
+    rng = np.random.default_rng(0)
+    decay = rng.uniform(0.005, 0.1, (2, 1, 1000))
+    spectrogram_data = rng.exponential(1, (2, 513, 1000)) * np.exp(-decay * np.arange(513)[:, np.newaxis])
+    spectrogram_data *= rng.uniform(0, 1, (2, 1, 1000))
+    spectrogram_data[:, :, rng.choice(1000, 50, replace=False)] = 0
+
+    return spectrogram_data
+
+
+@pytest.mark.parametrize('channels', [1, 2])
+def test_spectral_edge_matches_time_bin_loop(spectrogram_data, channels):
+    spectrogram_data = spectrogram_data[:channels]
+    spectral_edge_estimator = es.analysis.SpectralEdgeEstimator()
+    spectral_edge_estimator.add(spectrogram_data if channels > 1 else spectrogram_data[0])
+
+    assert spectral_edge_estimator.get_frequency_index() == get_spectral_edge_index(spectrogram_data)
+
+
+@pytest.mark.parametrize('block_frames', [1, 7, 256])
+def test_spectral_edge_of_blocks_matches_whole_spectrogram(spectrogram_data, block_frames):
+    spectral_edge_estimator = es.analysis.SpectralEdgeEstimator()
+    spectral_edge_estimator.add(spectrogram_data)
+
+    block_spectral_edge_estimator = es.analysis.SpectralEdgeEstimator()
+    for i_start in range(0, spectrogram_data.shape[-1], block_frames):
+        block_spectral_edge_estimator.add(spectrogram_data[:, :, i_start:i_start + block_frames])
+
+    assert block_spectral_edge_estimator.get_frequency_index() == spectral_edge_estimator.get_frequency_index()
+
+
+def test_spectral_edge_of_silence():
+    spectral_edge_estimator = es.analysis.SpectralEdgeEstimator()
+    spectral_edge_estimator.add(np.zeros((513, 100)))
+
+    assert spectral_edge_estimator.get_frequency_index() is None
@@ -0,0 +1,276 @@
+import struct
+
+import estimpy as es
+import numpy as np
+import pytest
+import scipy.io.wavfile
+import scipy.signal
+
+
+@pytest.fixture
+def es_audio(audio_data):
+    return es.audio.Audio(audio_data=audio_data, sample_rate=8000, bit_depth=16)
+
+
+def test_slice_views_audio_data(es_audio):
+    es_audio_slice = es_audio.slice(start=1, end=2.5)
+
+    assert es_audio_slice.sample_count == 12000
+    assert es_audio_slice.length == 1.5
+    assert es_audio_slice.time_offset == 1
+    assert es_audio_slice.is_partial()
+    assert not es_audio.is_partial()
+    assert np.shares_memory(es_audio_slice.data_raw, es_audio.data_raw)
+    assert np.array_equal(es_audio_slice.data_raw, es_audio.data_raw[:, 8000:20000])
+    assert np.array_equal(es_audio_slice.data, es_audio.data[:, 8000:20000])
+
+
+def test_slice_of_slice(es_audio):
+    es_audio_slice = es_audio.slice(start=1).slice(start=0.5, end=1)
+
+    assert es_audio_slice.time_offset == 1.5
+    assert np.array_equal(es_audio_slice.data_raw, es_audio.data_raw[:, 12000:16000])
+
+
+@pytest.mark.parametrize('start, end, sample_start, sample_end', [
+    (0, None, 0, 80000),
+    (-1, 20, 0, 80000),
+    (9, 20, 72000, 80000),
+    (5, 4, 40000, 40000),
+])
+def test_slice_is_clamped_to_audio(es_audio, start, end, sample_start, sample_end):
+    es_audio_slice = es_audio.slice(start=start, end=end)
+
+    assert es_audio_slice.sample_count == sample_end - sample_start
+    assert np.array_equal(es_audio_slice.data_raw, es_audio.data_raw[:, sample_start:sample_end])
+
+
+@pytest.mark.parametrize('time, start', [(5, 4), (0.5, 0), (9.5, 8)])
+def test_window_is_centered_within_audio(es_audio, time, start):
+    es_audio_window = es_audio.window(time=time, length=2)
+
+    assert es_audio_window.time_offset == start
+    assert es_audio_window.length == 2
+    assert np.array_equal(es_audio_window.data_raw, es_audio.data_raw[:, start * 8000:(start + 2) * 8000])
+
+
+def test_slice_of_file_views_audio_data(wav_file, audio_data):
+    es_audio = es.audio.Audio(file=wav_file)
+    es_audio_slice = es_audio.slice(start=2, end=3)
+
+    assert np.shares_memory(es_audio_slice.data_raw, es_audio.data_raw)
+    assert np.array_equal(es_audio_slice.data_raw, audio_data[:, 16000:24000])
+
+
+@pytest.fixture(params=['memory-map', 'ffmpeg'])
+def decoding(request, cfg):
+    """Decodes files by memory mapping them, or with ffmpeg (which selects channels with its pan filter and the time
+    range with -ss and -t)"""
+    cfg['audio.memory-map'] = request.param == 'memory-map'
+    cfg['audio.decoder'] = 'ffmpeg'
+
+    return request.param
+
+
+def test_file_is_decoded_entirely_by_default(decoding, wav_file, audio_data):
+    es_audio = es.audio.Audio(file=wav_file)
+
+    assert not es_audio.is_partial()
+    assert es_audio.time_offset == 0
+    assert np.array_equal(es_audio.data_raw, audio_data)
+
+
+@pytest.mark.parametrize('start, duration, sample_start, sample_end', [
+    (2, 1.5, 16000, 28000),
+    (2, None, 16000, 80000),
+    (0, 3, 0, 24000),
+    (9, 5, 72000, 80000),
+])
+def test_file_time_range_matches_slice(decoding, wav_file, audio_data, start, duration, sample_start, sample_end):
+    es_audio = es.audio.Audio(file=wav_file, start=start, duration=duration)
+
+    assert es_audio.is_partial()
+    assert es_audio.time_offset == start
+    assert es_audio.sample_count == sample_end - sample_start
+    assert np.array_equal(es_audio.data_raw, audio_data[:, sample_start:sample_end])
+
+
+@pytest.mark.parametrize('source_channels', [[1], [1, 0], [0, 0]])
+def test_file_source_channels_match_selected_rows(decoding, wav_file, audio_data, source_channels):
+    es_audio = es.audio.Audio(file=wav_file, source_channels=source_channels)
+
+    assert es_audio.channels == len(source_channels)
+    assert np.array_equal(es_audio.data_raw, audio_data[source_channels])
+
+
+def test_file_source_channels_and_time_range(decoding, wav_file, audio_data):
+    es_audio = es.audio.Audio(file=wav_file, source_channels=[1], start=1, duration=2)
+
+    assert es_audio.is_partial()
+    assert np.array_equal(es_audio.data_raw, audio_data[[1], 8000:24000])
+
+
+def test_file_invalid_source_channels(decoding, wav_file):
+    with pytest.raises(Exception, match='Invalid channel selection'):
+        es.audio.Audio(file=wav_file, source_channels=[2])
+
+
+def write_wav_file(file: str, audio_data: np.ndarray, sample_rate: int, riff_id: bytes = b'RIFF',
+                   extensible: bool = False, data_size: int = None) -> None:
+    """Writes a WAV file with the chunks of its header written explicitly
+    :param np.ndarray audio_data: The samples (channels as rows)
+    :param bytes riff_id: RIFF, or RF64 or BW64 to store the size of the data chunk in a ds64 chunk
+    :param bool extensible: Whether to use the WAVE_FORMAT_EXTENSIBLE format
+    :param int data_size: The size of the data chunk to write in the header, if not the size of the samples
+    """
+    channels, frame_count = audio_data.shape
+    bytes_per_sample = audio_data.dtype.itemsize
+    data = audio_data.T.astype(audio_data.dtype.newbyteorder('<')).tobytes()
+    data_size = data_size if data_size is not None else len(data)
+
+    fmt_chunk = struct.pack('<HHIIHH', 0xFFFE if extensible else 1, channels, sample_rate,
+                            sample_rate * channels * bytes_per_sample, channels * bytes_per_sample, 8 * bytes_per_sample)
+    if extensible:
+        # The sub format GUID starts with the format tag of PCM
+        fmt_chunk += struct.pack('<HHI', 22, 8 * bytes_per_sample, 0) + struct.pack('<H', 1) + bytes(14)
+
+    chunks = b''
+    if riff_id != b'RIFF':
+        chunks += b'ds64' + struct.pack('<IQQQI', 28, 0, data_size, frame_count, 0)
+    chunks += b'fmt ' + struct.pack('<I', len(fmt_chunk)) + fmt_chunk
+    chunks += b'LIST' + struct.pack('<I', 3) + b'abc\x00'
+    chunks += b'data' + struct.pack('<I', data_size if riff_id == b'RIFF' else 0xFFFFFFFF) + data
+
+    with open(file, 'wb') as file_handle:
+        file_handle.write(riff_id + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks)
+
+
+@pytest.mark.parametrize('riff_id', [b'RIFF', b'RF64', b'BW64'])
+@pytest.mark.parametrize('extensible', [False, True])
+def test_probe_reads_wav_header(tmp_path, audio_data, riff_id, extensible):
+    file = str(tmp_path / 'audio.wav')
+    write_wav_file(file, audio_data, sample_rate=8000, riff_id=riff_id, extensible=extensible)
+
+    audio_info = es.audio.probe(file)
+
+    assert (audio_info.sample_rate, audio_info.channels, audio_info.bit_depth, audio_info.sample_count) == \
+        (8000, 2, 16, 80000)
+    assert audio_info.length == 10
+    assert audio_info.format == 'wav'
+
+
+def test_probe_matches_loaded_audio(wav_file):
+    audio_info = es.audio.probe(wav_file)
+    es_audio = es.audio.Audio(file=wav_file)
+
+    assert (audio_info.sample_rate, audio_info.channels, audio_info.bit_depth, audio_info.sample_count) == \
+        (es_audio.sample_rate, es_audio.channels, es_audio.bit_depth, es_audio.sample_count)
+
+
+def test_probe_reports_loaded_bit_depth_of_24_bit_audio(tmp_path):
+    file = str(tmp_path / 'audio.wav')
+    write_wav_file(file, np.zeros((1, 100), dtype='<i2'), sample_rate=48000)
+
+    # Rewrite the format as 24-bit samples (3 bytes per sample), which are loaded as 32-bit integers
+    with open(file, 'r+b') as file_handle:
+        file_handle.seek(20)
+        file_handle.write(struct.pack('<HHIIHH', 1, 1, 48000, 48000 * 3, 3, 24))
+
+    audio_info = es.audio.probe(file)
+
+    assert audio_info.bit_depth == 32
+    assert audio_info.sample_count == 200 // 3
+
+
+def test_probe_ignores_data_size_past_end_of_file(tmp_path, audio_data):
+    file = str(tmp_path / 'audio.wav')
+    write_wav_file(file, audio_data, sample_rate=8000, data_size=2 ** 31)
+
+    assert es.audio.probe(file).sample_count == 80000
+
+
+def get_tones(sample_rate: int, length: float) -> np.ndarray:
+    """
+    :return np.ndarray: Stereo tones below 2 kHz, which are in the passband of all the tested sample rates
+    """
+    times = np.arange(round(sample_rate * length)) / sample_rate
+
+    return np.stack([np.sin(2 * np.pi * 500 * times) + 0.5 * np.sin(2 * np.pi * 1500 * times),
+                     np.sin(2 * np.pi * 1000 * times + 1)])
+
+
+@pytest.mark.parametrize('sample_rate, new_sample_rate', [(44100, 48000), (44100, 22050), (44100, 9000),
+                                                          (8000, 44100)])
+@pytest.mark.parametrize('chunk_size', [1000, 2 ** 20])
+def test_resample_matches_resample_poly(sample_rate, new_sample_rate, chunk_size):
+    audio_data = get_tones(sample_rate, length=2)
+    up, down = es.audio.get_resample_factors(sample_rate, new_sample_rate)
+
+    # These ratios are resampled in a single polyphase stage with the filter of resample_poly(), so chunking the
+    # audio doesn't change the result
+    assert len(es.audio._get_resample_stages(up, down)) == 1
+    assert np.array_equal(
+        es.audio.resample_audio_data(audio_data, sample_rate, new_sample_rate, chunk_size=chunk_size),
+        scipy.signal.resample_poly(audio_data, up, down, axis=1))
+
+
+@pytest.mark.parametrize('sample_rate, new_sample_rate', [(44100, 4000), (44100, 8999), (48000, 4000)])
+@pytest.mark.parametrize('chunk_size', [1000, 2 ** 20])
+def test_multistage_resample_approximates_resample_poly(sample_rate, new_sample_rate, chunk_size):
+    audio_data = get_tones(sample_rate, length=2)
+    up, down = es.audio.get_resample_factors(sample_rate, new_sample_rate)
+
+    assert len(es.audio._get_resample_stages(up, down)) > 1
+
+    resampled_data = es.audio.resample_audio_data(audio_data, sample_rate, new_sample_rate, chunk_size=chunk_size)
+    baseline_data = scipy.signal.resample_poly(audio_data, up, down, axis=1)
+
+    assert resampled_data.shape == baseline_data.shape
+
+    # The stages use different filters, whose transients at the edges of the audio differ
+    edge = new_sample_rate // 20
+    assert np.abs(resampled_data - baseline_data)[:, edge:-edge].max() < 2e-3
+
+
+@pytest.mark.parametrize('new_sample_rate', [22050, 8000])
+def test_file_sample_rate_matches_resampled_file(tmp_path, new_sample_rate):
+    file = str(tmp_path / 'tones.wav')
+    audio_data = np.rint(get_tones(44100, length=2) * 2 ** 14).astype(np.int16)
+    scipy.io.wavfile.write(file, 44100, audio_data.T)
+
+    # Resampling is always done by the decoder, even for files which could be memory mapped
+    es_audio = es.audio.Audio(file=file, sample_rate=new_sample_rate, source_channels=[1], start=0.5, duration=1)
+    baseline_data = es.audio.resample_audio_data(es.audio.Audio(file=file).data_raw[[1], 22050:66150], 44100,
+                                                 new_sample_rate)
+
+    assert es_audio.sample_rate == new_sample_rate
+    assert es_audio.bit_depth == 16
+    assert es_audio.data_raw.shape == baseline_data.shape
+
+    # ffmpeg resamples with its own filter, whose transients at the edges of the audio differ
+    edge = new_sample_rate // 20
+    assert np.abs(es_audio.data_raw - baseline_data)[:, edge:-edge].max() < 2 ** 15 * 1e-3
+
+
+def test_resample_integer_audio_data(audio_data):
+    resampled_data = es.audio.resample_audio_data(audio_data, 8000, 4000)
+
+    assert resampled_data.dtype == np.float32
+    assert resampled_data.shape == (2, 40000)
+    assert np.allclose(resampled_data, scipy.signal.resample_poly(audio_data.astype(np.float64), 1, 2, axis=1),
+                       rtol=1e-4, atol=1e-2)
+
+
+def test_resample_to_same_rate_copies_audio_data(audio_data):
+    resampled_data = es.audio.resample_audio_data(audio_data, 8000, 8000)
+
+    assert not np.shares_memory(resampled_data, audio_data)
+    assert np.array_equal(resampled_data, audio_data)
+
+
+def test_resample_factors_within_tolerance():
+    assert es.audio.get_resample_factors(44100, 8999) == (8999, 44100)
+    up, down = es.audio.get_resample_factors(44100, 8999, tolerance=0.01)
+
+    assert down < 44100
+    assert 8999 <= 44100 * up / down <= 8999 * 1.01
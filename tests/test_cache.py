@@ -0,0 +1,53 @@
+import estimpy as es
+import pytest
+
+
+@pytest.fixture
+def es_audio(cfg, wav_file):
+    cfg['cache.enabled'] = True
+
+    return es.audio.Audio(file=wav_file)
+
+
+def test_analysis_key_is_stable(es_audio):
+    assert es.cache.get_analysis_key(es_audio, 'envelope', mode='peak') == \
+           es.cache.get_analysis_key(es_audio, 'envelope', mode='peak')
+
+
+@pytest.mark.parametrize('key, value', [
+    ('analysis.processes', 7),
+    ('analysis.spectrogram.workers', 3),
+    ('analysis.spectrogram.memory-max', 1),
+])
+def test_analysis_key_ignores_execution_options(cfg, es_audio, key, value):
+    analysis_key = es.cache.get_analysis_key(es_audio, 'spectrogram')
+    cfg[key] = value
+
+    assert es.cache.get_analysis_key(es_audio, 'spectrogram') == analysis_key
+
+
+@pytest.mark.parametrize('key, value', [
+    ('analysis.window-size', 4096),
+    ('analysis.window-overlap', 512),
+    ('analysis.spectrogram.frequency-max', 1000),
+    ('analysis.spectrogram.quantization', 'uint8'),
+    ('audio.resample.tolerance', 0.5),
+])
+def test_analysis_key_changes_with_result_options(cfg, es_audio, key, value):
+    analysis_key = es.cache.get_analysis_key(es_audio, 'spectrogram')
+    cfg[key] = value
+
+    assert es.cache.get_analysis_key(es_audio, 'spectrogram') != analysis_key
+
+
+def test_analysis_key_changes_with_params_and_slices(es_audio):
+    analysis_key = es.cache.get_analysis_key(es_audio, 'envelope', mode='peak')
+
+    assert es.cache.get_analysis_key(es_audio, 'envelope', mode='rms') != analysis_key
+    assert es.cache.get_analysis_key(es_audio.slice(1), 'envelope', mode='peak') != analysis_key
+
+
+def test_analysis_key_is_none_when_disabled(cfg, es_audio):
+    cfg['cache.enabled'] = False
+
+    assert es.cache.get_analysis_key(es_audio, 'envelope') is None
@@ -0,0 +1,75 @@
+import estimpy as es
+import matplotlib
+import matplotlib.pyplot
+import numpy as np
+import pytest
+
+# Draw the figures without displaying them
+matplotlib.use('Agg')
+
+# The DPI at which videos are exported (see es.export)
+_DPI = 8
+
+
+@pytest.fixture
+def es_audio() -> es.audio.Audio:
+    """10 seconds of stereo 16-bit noise and tones at 22.05 kHz with amplitudes which change over time, with a silent
+    gap"""
+    sample_rate = 22050
+    rng = np.random.default_rng(0)
+    times = np.arange(sample_rate * 10) / sample_rate
+
+    amplitudes = np.stack([0.5 + 0.4 * np.sin(2 * np.pi * times / 7), 0.5 + 0.4 * np.cos(2 * np.pi * times / 3)])
+    amplitudes[:, (times > 4) & (times < 5)] = 0
+
+    audio_data = amplitudes * (0.5 * np.sin(2 * np.pi * np.array([[440], [1000]]) * times) +
+                               0.3 * rng.uniform(-1, 1, amplitudes.shape))
+
+    return es.audio.Audio(audio_data=np.round(audio_data * 32767).astype(np.int16), sample_rate=sample_rate,
+                          bit_depth=16)
+
+
+def draw_figure(visualization: es.visualization.VideoVisualization, frame: int) -> np.ndarray:
+    """Draws the whole figure of a frame with matplotlib
+    :return np.ndarray: The RGB pixels of the figure
+    """
+    figure = matplotlib.pyplot.gcf()
+
+    # The matplotlib renderer excludes the artists which change with each frame from the drawn figure, so they are
+    # included again to draw the whole figure
+    animated_artists = visualization._get_animated_artists()
+    for artist in animated_artists:
+        artist.set_animated(False)
+
+    try:
+        visualization.make_frame(frame)
+        figure.canvas.draw()
+        return np.asarray(figure.canvas.buffer_rgba())[:, :, :3].astype(int)
+    finally:
+        for artist in animated_artists:
+            artist.set_animated(True)
+
+
+# Sizes with axes at fractions of pixels
+@pytest.mark.parametrize('width, height', [(480, 270), (320, 180)])
+def test_video_renderers_match_drawn_figure(es_audio, width, height):
+    visualization = es.visualization.VideoVisualization(es_audio=es_audio, fps=es.cfg['visualization.video.export.fps'])
+    visualization.make_figure()
+    visualization.resize_figure(width=width, height=height, dpi=_DPI)
+
+    try:
+        # The start and end of the envelopes are in the window of the first and last frames
+        for frame in [0, len(visualization.frames) // 2, len(visualization.frames) - 1]:
+            composited_pixels = visualization.composite_frame(frame).astype(int)
+            blitted_pixels = visualization.draw_frame(frame).astype(int)
+            drawn_pixels = draw_figure(visualization, frame)
+
+            assert np.array_equal(blitted_pixels, drawn_pixels)
+
+            # The NumPy renderer only differs at the antialiased edges of the amplitude envelopes
+            differences = np.abs(composited_pixels - drawn_pixels)
+            assert differences.max() <= 40
+            assert differences.mean() <= 0.15
+            assert np.mean(differences > 16) <= 1e-3
+    finally:
+        matplotlib.pyplot.close('all')